@@ -5,7 +5,7 @@ from casaconfig.private.get_argparser import get_argparser
 parser = get_argparser(add_help=True)
 
 # get_argparser supplies configfile, noconfig, nositeconfig
-# add measurespath, pull-data, data-update, measures-update, update-all, reference-testing, current-data
+# add measurespath, pull-data, data-update, measures-update, update-all, reference-testing, current-data, serve
 
 parser.prog = "casaconfig"
 
@@ -29,6 +29,16 @@ parser.add_argument( "--summary", dest='summary', action='store_const', const=Tr
                      help="print out a summary of casaconfig data handling and the exit")
 parser.add_argument("--force", dest='force', action='store_const', const=True, default=False,
                     help="force an update using the force=True option to update_all, data_update, and measures_update")
+parser.add_argument("--staging-dir", dest='stagingdir', default=None,
+                    help="download and extract the tarballs in this directory on fast local storage before publishing them to measurespath (see config.staging_dir)")
+parser.add_argument("--serve", dest='serve', action='store_const', const=True, default=False,
+                    help="run a mirror of the casarundata and measures for other casaconfig clients (see config.data_mirror_url) and ignore any other options")
+parser.add_argument("--serve-port", dest='serveport', type=int, default=8080,
+                    help="the port used by --serve (default 8080)")
+parser.add_argument("--serve-host", dest='servehost', default='',
+                    help="the address used by --serve (default all interfaces)")
+parser.add_argument("--serve-dir", dest='servedir', default=None,
+                    help="where --serve keeps the tarballs (default the 'mirror' directory in cachedir)")
 
 # initialize the configuration to be used
 flags,args = parser.parse_known_args(sys.argv)
@@ -43,6 +53,16 @@ if flags.measurespath is None:
 else:
     config.measurespath = flags.measurespath
 
+# the updates use config.staging_dir
+if flags.stagingdir is not None:
+    config.staging_dir = flags.stagingdir
+
+# the mirror does not use measurespath
+if flags.serve:
+    from casaconfig.private.serve import serve
+    serve(flags.servedir, flags.servehost, flags.serveport)
+    sys.exit(0)
+
 # watch for measurespath of None, that likely means that casasiteconfig.py is in use and this has not been set. It can't be used then.
 try:
     if flags.measurespath is None:
@@ -0,0 +1,289 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+asyncio versions of the casaconfig update functions.
+
+   import asyncio
+   from casaconfig import aio
+
+   async def main():
+       await asyncio.gather(aio.update_all('/data/pipeline1', lock_timeout=600),
+                            aio.update_all('/data/pipeline2', lock_timeout=600))
+
+   asyncio.run(main())
+
+Each function here takes the same arguments as the casaconfig function of the same
+name, plus lock_timeout, and raises the same exceptions. The work is split in three:
+
+   - the casarundata or measures tarball that the update would install (as decided by the same checks that the update uses) is downloaded into the archive cache without holding the lock on path, exactly as casaconfig downloads it (resuming any partial download, in byte ranges fetched concurrently when config.download_segments is more than 1, and moving between the configured locations when a download fails or slows down)
+   - the wait for the lock on path is done by the event loop, which looks at the lock (without taking it) every second or so until it is no longer held
+   - the update itself (which must hold the lock on path while it changes path) then takes the lock and finds that tarball in the archive cache
+
+The download and the update are the blocking casaconfig functions, each is run in a
+thread of its own (not the event loop's executor, so the number of concurrent updates
+is not limited by the size of that executor). Many paths can be updated concurrently
+from a single event loop. A tarball being used by more than one of those updates is
+kept in the archive cache until the last of them has finished with it.
+
+The lock_timeout argument is the maximum time, in seconds, to wait for the lock on
+path. If the lock can not be obtained within that time then casaconfig.LockTimeout is
+raised (or the update is skipped when config.data_lock_policy is 'skip'). The default
+(None) uses config.data_lock_wait. update_all takes the lock twice (for the casarundata
+and then for the measures), the event loop only waits for the first of these.
+
+Cancelling one of these functions (e.g. with asyncio.Task.cancel or asyncio.wait_for)
+stops a wait for the lock at once. A download is stopped at once as well (any stream
+waiting for data is aborted), keeping the partial download so that a later attempt
+resumes it. Once an update has started changing path it is always allowed to finish
+(so that path and the lock file are left in a consistent state) before
+asyncio.CancelledError is raised.
+"""
+
+import asyncio
+
+async def _run(fn, *args, lock_timeout=None, prefetch=True, **kwargs):
+    """
+    Run fn(*args, **kwargs) in a thread of its own with the given call controls (see
+    call_controls.py). If this is cancelled then the thread is told to stop at its next
+    opportunity (a download waiting for data is aborted) and this waits for it to do so
+    before raising asyncio.CancelledError.
+    """
+    import threading
+    from .private.call_controls import controls, Cancelled, CancelEvent
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    cancel = CancelEvent()
+
+    def finish(result, exc):
+        if future.done():
+            return
+        if exc is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exc)
+
+    def call():
+        try:
+            with controls(lock_timeout=lock_timeout, cancel_event=cancel, prefetch=prefetch):
+                outcome = (fn(*args, **kwargs), None)
+        except BaseException as exc:
+            outcome = (None, exc)
+        try:
+            loop.call_soon_threadsafe(finish, *outcome)
+        except RuntimeError:
+            # the event loop is gone, no one is waiting for this
+            pass
+
+    threading.Thread(target=call, name='casaconfig.aio.%s' % getattr(fn, '__name__', 'call')).start()
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel.set()
+        try:
+            await future
+        except (Exception, Cancelled):
+            pass
+        raise
+
+async def _await_lock(path, lock_timeout, fn_name, logger):
+    """
+    Wait until the lock on path does not appear to be held, for at most the time allowed
+    to wait for it (see get_data_lock), without holding a thread. Returns what is left of
+    that time (None for no limit), the update then takes the lock itself.
+    """
+    import os
+    import time
+    from . import config as _config
+    from .private.lock_info import lock_holder
+    from .private.print_log_messages import print_log_messages
+
+    timeout = lock_timeout
+    if timeout is None:
+        timeout = _config.data_lock_wait
+        if timeout is None and _config.data_lock_policy == 'skip':
+            timeout = 0
+
+    if path is None:
+        path = _config.measurespath
+    if path is None or not os.path.isdir(os.path.expanduser(path)):
+        # there is nothing to wait for, the update reports any problem with path
+        return timeout
+    path = os.path.expanduser(path)
+
+    start = time.monotonic()
+    reported = None
+    delay = 0.05
+    while True:
+        holder = lock_holder(path)
+        elapsed = time.monotonic() - start
+        if holder is None or (timeout is not None and elapsed >= timeout):
+            break
+        if reported is None:
+            print_log_messages('%s waiting for the lock on %s held by %s' % (fn_name, path, holder), logger)
+            reported = time.monotonic()
+        elif (time.monotonic() - reported) >= 60:
+            print_log_messages('%s still waiting for the lock on %s held by %s' % (fn_name, path, holder), logger, verbose=1)
+            reported = time.monotonic()
+        await asyncio.sleep(delay if timeout is None else min(delay, timeout - elapsed))
+        delay = min(1.0, delay*2)
+
+    return None if timeout is None else max(0, timeout - (time.monotonic() - start))
+
+async def _prefetch(type, logger, target, *args):
+    """
+    Fetch (and pin) the tarball named by target(*args), the tarball that the update would
+    install (see update_target.py). Returns (name, path) where name is None when the update
+    would not install anything (or that could not be decided) and path is None when the
+    tarball was not fetched. Failures are only logged, the update will try again and report
+    any problems.
+    """
+    from .private.archive_cache import pin_archive
+    from .private.fetch_archive import fetch_archive
+    from .private.print_log_messages import print_log_messages
+    from .private.data_urls import casarundata_urls, measures_urls
+
+    name = None
+    try:
+        name = await _run(target, *args)
+        if name is None:
+            return (None, None)
+        url_root = await _run(casarundata_urls if type == 'casarundata' else measures_urls)
+        archive = await _run(fetch_archive, url_root, name, logger)
+        pin_archive(archive)
+        return (name, archive)
+    except Exception as exc:
+        print_log_messages('unable to prefetch %s : %s' % (type, str(exc)), logger, verbose=1)
+        return (name, None)
+
+def _release(archives):
+    import os
+    from .private.archive_cache import unpin_archive, release_archive
+
+    for archive in archives:
+        if archive is not None and unpin_archive(archive) and os.path.exists(archive):
+            release_archive(archive)
+
+async def _update(prefetches, fn, lock_timeout, prefetch=True, **kwargs):
+    # prefetch concurrently, wait for the lock on path, then run the update in a thread of its own
+    try:
+        results = await asyncio.gather(*prefetches)
+    except asyncio.CancelledError:
+        # any that did finish are still pinned, the partial downloads are kept
+        for task in prefetches:
+            if task.done() and not task.cancelled():
+                _release([task.result()[1]])
+        raise
+    archives = [archive for (name, archive) in results]
+    try:
+        # the update only takes the lock when it installs something
+        if any([name is not None for (name, archive) in results]):
+            lock_timeout = await _await_lock(kwargs.get('path'), lock_timeout, fn.__name__, kwargs.get('logger'))
+        return await _run(fn, lock_timeout=lock_timeout, prefetch=prefetch, **kwargs)
+    finally:
+        _release(archives)
+
+async def data_available():
+    """
+    Return the list of available casarundata versions (see casaconfig.data_available).
+    """
+    from .private.data_available import data_available as _data_available
+    return await _run(_data_available)
+
+async def measures_available():
+    """
+    Return the list of available measures versions (see casaconfig.measures_available).
+    """
+    from .private.measures_available import measures_available as _measures_available
+    return await _run(_measures_available)
+
+async def pull_data(path=None, version=None, force=False, logger=None, verbose=None, staging_dir=None, lock_timeout=None):
+    """
+    Pull the casarundata contents from the CASA host and install it in path (see casaconfig.pull_data).
+
+    Parameters
+       - path, version, force, logger, verbose, staging_dir - as for casaconfig.pull_data
+       - lock_timeout (float=None) - the maximum time, in seconds, to wait for the lock on path. None uses config.data_lock_wait.
+
+    Raises
+       - casaconfig.LockTimeout - raised when the lock on path could not be obtained within lock_timeout seconds
+       - the exceptions raised by casaconfig.pull_data
+    """
+    from .private.pull_data import pull_data as _pull_data
+    from .private.update_target import pull_target
+
+    prefetch = asyncio.ensure_future(_prefetch('casarundata', logger, pull_target, path, version, force))
+    return await _update([prefetch], _pull_data, lock_timeout, path=path, version=version, force=force, logger=logger, verbose=verbose,
+                         staging_dir=staging_dir)
+
+async def data_update(path=None, version=None, force=False, logger=None, auto_update_rules=False, verbose=None, staging_dir=None, lock_timeout=None):
+    """
+    Check for updates to the installed casarundata and install the update or change to
+    the requested version when appropriate (see casaconfig.data_update).
+
+    Parameters
+       - path, version, force, logger, auto_update_rules, verbose, staging_dir - as for casaconfig.data_update
+       - lock_timeout (float=None) - the maximum time, in seconds, to wait for the lock on path. None uses config.data_lock_wait.
+
+    Raises
+       - casaconfig.LockTimeout - raised when the lock on path could not be obtained within lock_timeout seconds
+       - the exceptions raised by casaconfig.data_update
+    """
+    from .private.data_update import data_update as _data_update
+    from .private.update_target import update_target
+
+    prefetch = asyncio.ensure_future(_prefetch('casarundata', logger, update_target, path, 'casarundata', version, force, auto_update_rules))
+    return await _update([prefetch], _data_update, lock_timeout, path=path, version=version, force=force, logger=logger,
+                         auto_update_rules=auto_update_rules, verbose=verbose, staging_dir=staging_dir)
+
+async def measures_update(path=None, version=None, force=False, logger=None, auto_update_rules=False, use_astron_obs_table=False, verbose=None, staging_dir=None, lock_timeout=None):
+    """
+    Update the measures data at path (see casaconfig.measures_update).
+
+    Parameters
+       - path, version, force, logger, auto_update_rules, use_astron_obs_table, verbose, staging_dir - as for casaconfig.measures_update
+       - lock_timeout (float=None) - the maximum time, in seconds, to wait for the lock on path. None uses config.data_lock_wait.
+
+    Raises
+       - casaconfig.LockTimeout - raised when the lock on path could not be obtained within lock_timeout seconds
+       - the exceptions raised by casaconfig.measures_update
+    """
+    from .private.measures_update import measures_update as _measures_update
+    from .private.update_target import update_target
+
+    prefetch = asyncio.ensure_future(_prefetch('measures', logger, update_target, path, 'measures', version, force, auto_update_rules))
+    return await _update([prefetch], _measures_update, lock_timeout, path=path, version=version, force=force, logger=logger,
+                         auto_update_rules=auto_update_rules, use_astron_obs_table=use_astron_obs_table, verbose=verbose, staging_dir=staging_dir)
+
+async def update_all(path=None, logger=None, force=False, verbose=None, staging_dir=None, lock_timeout=None):
+    """
+    Update the data contents at path to the most recently released versions of casarundata
+    and measures data (see casaconfig.update_all). The casarundata and measures tarballs are
+    downloaded concurrently.
+
+    Parameters
+       - path, logger, force, verbose, staging_dir - as for casaconfig.update_all
+       - lock_timeout (float=None) - the maximum time, in seconds, to wait for each lock on path. None uses config.data_lock_wait.
+
+    Raises
+       - casaconfig.LockTimeout - raised when the lock on path could not be obtained within lock_timeout seconds
+       - the exceptions raised by casaconfig.update_all
+    """
+    from .private.update_all import update_all as _update_all
+    from .private.update_target import update_target
+
+    prefetches = [asyncio.ensure_future(_prefetch('casarundata', logger, update_target, path, 'casarundata', None, force)),
+                  asyncio.ensure_future(_prefetch('measures', logger, update_target, path, 'measures', None, force))]
+    # the tarballs fetched here are the ones that update_all would prefetch, it does not fetch them again
+    return await _update(prefetches, _update_all, lock_timeout, prefetch=False, path=path, logger=logger, force=force, verbose=verbose, staging_dir=staging_dir)
@@ -45,3 +45,7 @@ class UnsetMeasurespath(Exception):
 class NoNetwork(Exception):
     """Raised when there is no network connection."""
     pass
+
+class LockTimeout(Exception):
+    """Raised when the lock could not be obtained within the time allowed"""
+    pass
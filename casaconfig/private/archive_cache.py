@@ -0,0 +1,303 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Functions to maintain the cache of fetched casarundata and measures tarballs.
+
+Each cached archive is stored under its version name (the filename of the tarball)
+in the archive cache directory along with a small json file (the archive name
++ '.sha256') that records where the archive was downloaded from along with the ETag and
+Last-Modified validators the data host sent for it. A cached archive is only used while
+those validators still match what the data host reports for that url (see fetch_archive),
+so a tarball replaced upstream under the same name is downloaded again.
+
+The json file also records the size, modification time and sha256 checksum of the
+local copy. That checksum is computed from the local copy when it is added to the
+cache and it is only used to tell if that copy has changed since then (e.g. it was
+truncated or overwritten in a shared cache). The modification time of that json file is
+updated each time the archive is used and it determines the order in which archives are
+evicted (least recently used first) when the total size of the cached archives exceeds
+config.archive_cache_size.
+
+The archive cache directory is config.archive_cachedir. A relative value is
+relative to config.cachedir. An absolute value can be used to share one cache
+among all users of a host or of a shared filesystem.
+
+Archives can be pinned while they are in use by more than one caller in this process
+(e.g. concurrent casaconfig.aio updates of different paths to the same version). A pinned
+archive is never removed from the cache.
+
+These functions are intended for internal casaconfig use.
+"""
+
+import threading
+
+# the number of users of each pinned archive, by absolute path
+_pinned = {}
+_pinned_lock = threading.Lock()
+
+def pin_archive(archive):
+    """
+    Keep archive in the cache until it is unpinned, it may be pinned more than once.
+    """
+    import os
+    archive = os.path.abspath(archive)
+    with _pinned_lock:
+        _pinned[archive] = _pinned.get(archive, 0) + 1
+
+def unpin_archive(archive):
+    """
+    Undo one pin_archive. Returns True if archive is no longer pinned.
+    """
+    import os
+    archive = os.path.abspath(archive)
+    with _pinned_lock:
+        count = _pinned.get(archive, 0) - 1
+        if count > 0:
+            _pinned[archive] = count
+            return False
+        _pinned.pop(archive, None)
+        return True
+
+def _is_pinned(archive):
+    import os
+    with _pinned_lock:
+        return os.path.abspath(archive) in _pinned
+
+def archive_cache_dir():
+    """
+    Return the archive cache directory, creating it if necessary.
+
+    Returns
+       - the absolute path to the archive cache directory
+    """
+
+    import os
+    from .. import config as _config
+
+    # an absolute archive_cachedir is used as is
+    cachedir = os.path.join(_config.cachedir, os.path.expanduser(_config.archive_cachedir))
+    cachedir = os.path.abspath(cachedir)
+    os.makedirs(cachedir, exist_ok=True)
+    return cachedir
+
+def _sidecar_path(archive):
+    return archive + '.sha256'
+
+def _checksum(archive):
+    import hashlib
+    sha = hashlib.sha256()
+    with open(archive, 'rb') as fid:
+        while True:
+            chunk = fid.read(4*1024*1024)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def add_archive(archive, validators=None):
+    """
+    Record a newly fetched archive in the archive cache.
+
+    The validators of the download (as returned by download_file) along with the sha256
+    checksum, size, and modification time of the local copy of archive are written to
+    the json file next to it. The json file is written to a temporary file that is then
+    moved into place so that other users of the cache never see a partial record.
+
+    Parameters
+       - archive (str) - the path to the archive in the archive cache directory
+       - validators (dict=None) - the url, etag and last_modified of the download, None if they are not known
+
+    Returns
+       None
+    """
+
+    import os
+    import json
+
+    astat = os.stat(archive)
+    record = {'name':os.path.basename(archive), 'sha256':_checksum(archive), 'size':astat.st_size, 'mtime':astat.st_mtime}
+    validators = validators or {}
+    for key in ['url', 'etag', 'last_modified']:
+        record[key] = validators.get(key)
+    tmp_path = _sidecar_path(archive) + '.%s.tmp' % os.getpid()
+    with open(tmp_path, 'w') as fid:
+        json.dump(record, fid)
+    os.replace(tmp_path, _sidecar_path(archive))
+
+def archive_record(archive):
+    """
+    Return the record of a cached archive (a dictionary with the 'url', 'etag' and
+    'last_modified' of its download and the 'size', 'mtime' and 'sha256' of the local
+    copy) or None if there is no readable record.
+    """
+
+    import json
+
+    try:
+        with open(_sidecar_path(archive), 'r') as fid:
+            return json.load(fid)
+    except (OSError, ValueError):
+        return None
+
+def remove_archive(archive):
+    """
+    Remove an archive and its record from the archive cache.
+    """
+
+    import os
+
+    for p in [_sidecar_path(archive), archive]:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+def cached_archive(name):
+    """
+    Return the path to the cached archive with the given version name or None if it
+    is not in the cache.
+
+    A cached archive is only returned if its size and modification time match what
+    was recorded when it was added to the cache. If the archive has changed since then
+    the checksum is recomputed and it is only returned if that still matches. An archive
+    that does not match its record (or whose record can not be read) is removed from the
+    cache along with its record so that it is downloaded again (download_file would
+    otherwise take the file found there as a complete download). An archive found without
+    a record (a download that completed but was not recorded) is recorded here. The archive
+    is marked as used now for the purposes of eviction.
+
+    Parameters
+       - name (str) - the version name (tarball filename) of the archive
+
+    Returns
+       - the path to the cached archive or None
+    """
+
+    import os
+    import json
+
+    archive = os.path.join(archive_cache_dir(), name)
+    if not os.path.isfile(archive):
+        return None
+
+    sidecar = _sidecar_path(archive)
+    try:
+        if not os.path.exists(sidecar):
+            add_archive(archive)
+        with open(sidecar, 'r') as fid:
+            record = json.load(fid)
+        astat = os.stat(archive)
+        unchanged = astat.st_size == record['size'] and (astat.st_mtime == record['mtime'] or _checksum(archive) == record['sha256'])
+    except FileNotFoundError:
+        # the archive (or its record) disappeared, e.g. evicted by another user of the cache
+        return None
+    except (OSError, ValueError, KeyError, TypeError):
+        # an unreadable record
+        unchanged = False
+
+    if not unchanged:
+        # remove it so that it is fetched again
+        remove_archive(archive)
+        return None
+
+    # this is now the most recently used archive
+    try:
+        os.utime(sidecar)
+    except FileNotFoundError:
+        return None
+
+    return archive
+
+def evict_archives(budget, keep=None):
+    """
+    Remove the least recently used archives until the total size of the archives in
+    the archive cache is no more than budget bytes.
+
+    Partial downloads are not counted and are never removed here. Archives are removed
+    along with their json records. Pinned archives are not removed.
+
+    Parameters
+       - budget (int) - the maximum total size, in bytes, of the cached archives
+       - keep (str=None) - the path to an archive that should not be removed even if that means going over budget
+
+    Returns
+       None
+    """
+
+    import os
+
+    cachedir = archive_cache_dir()
+    entries = []
+    total = 0
+    for f in os.listdir(cachedir):
+        sidecar = os.path.join(cachedir, f)
+        if not f.endswith('.sha256') or not os.path.isfile(sidecar):
+            continue
+        archive = sidecar[:-len('.sha256')]
+        if not os.path.isfile(archive):
+            # the archive is gone, the record is not useful
+            try:
+                os.remove(sidecar)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            size = os.path.getsize(archive)
+            used = os.path.getmtime(sidecar)
+        except FileNotFoundError:
+            # another user of the cache is evicting at the same time
+            continue
+        total += size
+        entries.append((used, size, archive))
+
+    # least recently used first
+    entries.sort()
+    for (used, size, archive) in entries:
+        if total <= budget:
+            break
+        if keep is not None and os.path.abspath(archive) == os.path.abspath(keep):
+            continue
+        if _is_pinned(archive):
+            continue
+        remove_archive(archive)
+        total -= size
+
+def release_archive(archive):
+    """
+    Called once an archive has been installed. The archive is kept in the cache for
+    later installs, subject to the config.archive_cache_size budget. When that budget is
+    0 the archive is removed (unless it is pinned, in which case the last user to unpin it
+    must release it). An archive that is not in the archive cache directory (one used from
+    a local location) is left alone.
+
+    Parameters
+       - archive (str) - the path to the archive
+
+    Returns
+       None
+    """
+
+    import os
+    from .. import config as _config
+
+    if os.path.dirname(os.path.abspath(archive)) != archive_cache_dir():
+        # used where it was found (see fetch_archive), it is not part of the cache
+        return
+
+    if _config.archive_cache_size > 0 or _is_pinned(archive):
+        evict_archives(_config.archive_cache_size, keep=archive)
+    else:
+        # there may not be a record for this archive
+        remove_archive(archive)
+        evict_archives(0)
@@ -0,0 +1,118 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Per-thread controls for the update functions when they are run on behalf of another
+caller (e.g. casaconfig.aio runs them in worker threads).
+
+   - lock_timeout : the maximum time, in seconds, that get_data_lock waits for the lock (None uses config.data_lock_wait)
+   - cancel_event : a CancelEvent that is set when the caller no longer wants the result. The update stops with a Cancelled exception the next time it checks, which only happens while it is waiting for the lock or downloading (before anything in path has been changed). A download waiting for data is stopped at once (see abort_on_cancel).
+   - prefetch : False when the caller has already fetched the tarballs that update_all would prefetch, update_all then leaves that to data_update and measures_update
+
+These functions are intended for internal casaconfig use.
+"""
+
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+class Cancelled(BaseException):
+    """Raised in a thread running an update when the caller has cancelled it"""
+    pass
+
+class CancelEvent(threading.Event):
+    """
+    A threading.Event that also calls the functions registered with on_set (from the
+    thread that sets it) so that a thread blocked on something other than this event can
+    be stopped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks = list(self._callbacks)
+        for fn in callbacks:
+            fn()
+
+    def on_set(self, fn):
+        """Call fn when this is set, at once if it is already set."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def remove(self, fn):
+        """Undo on_set(fn)."""
+        with self._callbacks_lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+@contextmanager
+def controls(lock_timeout=None, cancel_event=None, prefetch=True):
+    """
+    Set the controls for the updates run by this thread within this context.
+    """
+    previous = (getattr(_local, 'lock_timeout', None), getattr(_local, 'cancel_event', None), getattr(_local, 'prefetch', True))
+    _local.lock_timeout = lock_timeout
+    _local.cancel_event = cancel_event
+    _local.prefetch = prefetch
+    try:
+        yield
+    finally:
+        (_local.lock_timeout, _local.cancel_event, _local.prefetch) = previous
+
+def lock_timeout():
+    """The lock timeout for this thread, None if there is no limit."""
+    return getattr(_local, 'lock_timeout', None)
+
+def cancel_event():
+    """The cancel event for this thread, None if this thread can not be cancelled."""
+    return getattr(_local, 'cancel_event', None)
+
+def prefetch():
+    """False if update_all should not prefetch the tarballs in this thread."""
+    return getattr(_local, 'prefetch', True)
+
+@contextmanager
+def abort_on_cancel(stream, event=None):
+    """
+    Within this context stream (a transport response) is aborted if event (defaults
+    to the cancel event for this thread) is set, so that a read waiting for data returns
+    at once rather than when the read times out.
+    """
+    if event is None:
+        event = cancel_event()
+    if not hasattr(event, 'on_set'):
+        yield stream
+        return
+    event.on_set(stream.abort)
+    try:
+        yield stream
+    finally:
+        event.remove(stream.abort)
+
+def check_cancelled(event=None):
+    """
+    Raise Cancelled if event (defaults to the cancel event for this thread) has been set.
+    """
+    if event is None:
+        event = cancel_event()
+    if event is not None and event.is_set():
+        raise Cancelled()
@@ -17,3 +17,9 @@ measurespath = "/path/to/installed/casarundata"
 
 measures_auto_update = False
 data_auto_update = False
+
+# share fetched casarundata and measures tarballs among all users and nodes
+# that see this location, keeping up to 4 GB of tarballs
+
+# archive_cachedir = "/path/to/shared/casaconfig/archives"
+# archive_cache_size = 4*1024*1024*1024
@@ -54,3 +54,105 @@ user_site = False
 
 # verbosity level for casaconfig
 casaconfig_verbose = 1
+
+# number of byte ranges fetched concurrently when downloading casarundata and measures tarballs, 1 uses a single stream
+download_segments = 4
+
+# location of the cache of fetched casarundata and measures tarballs (and any partial downloads)
+# a relative path is relative to cachedir, use an absolute path to share the cache among users
+archive_cachedir = 'archives'
+
+# size budget in bytes for the cached tarballs, least recently used tarballs are removed first when it is exceeded,
+# 0 keeps no tarballs after they are installed (each install then downloads its tarball again)
+archive_cache_size = 4*1024*1024*1024
+
+# number of threads writing files while casarundata and measures tarballs are extracted,
+# 0 chooses 16 when measurespath is on a network filesystem (e.g. NFS, where each file costs several round trips) and 4 otherwise
+extract_writers = 0
+
+# the most bytes of file data read from a tarball that may be waiting for the writers, a file larger than this is written as it is read
+extract_inflight_bytes = 64*1024*1024
+
+# how the files in casarundata and measures tarballs are written : 'pipeline' hands each file to the writers as it is found,
+# 'batched' hands files to the writers in batches and sets their metadata through the open file (faster for many small files)
+extract_engine = 'pipeline'
+
+# how casarundata and measures tarballs are decompressed while they are extracted : 'auto' uses a parallel external tool
+# (xz -T, pzstd, pigz, lbzip2 or pbzip2, and zstd for .zst) when one is found on PATH and otherwise decompresses in a thread,
+# 'python' always decompresses in a thread (.zst tarballs then need the zstandard module), 'external' always uses an external tool
+extract_decompressor = 'auto'
+
+# the number of threads used by an external decompressor, 0 uses all of the available cores
+extract_decompress_threads = 0
+
+# number of threads removing the files of a previously installed casarundata version
+remove_workers = 8
+
+# how casarundata is installed : 'inplace' extracts directly into measurespath,
+# 'copy' extracts into a version directory in measurespath which is then copied into place,
+# 'staged' extracts into a staging directory in measurespath and then renames each top-level directory into place
+# so that other sessions using measurespath never see a partially installed version,
+# 'differential' extracts directly into measurespath but only writes the files that differ from those already installed
+# (by size and checksum, see the install state database) and then removes the files that are no longer part of casarundata
+data_install_mode = 'inplace'
+
+# how the measures data are installed : 'inplace' extracts over the installed tables,
+# 'staged' extracts into a staging directory in measurespath and then renames the tables directories into place
+measures_install_mode = 'inplace'
+
+# a directory on fast local storage (e.g. local NVMe or /dev/shm) where pull_data, data_update, measures_update and update_all
+# download and extract the tarballs before the result is published to measurespath (e.g. when measurespath is on a slow shared filesystem),
+# files already identical in measurespath are not copied again, None extracts directly into measurespath
+staging_dir = None
+
+# number of threads copying files from staging_dir into measurespath
+publish_workers = 8
+
+# the url probed (with a HEAD request) to see if the network is available, a 2xx response means it is
+network_probe_url = 'http://clients3.google.com/generate_204'
+
+# seconds to wait for the network probe to respond before deciding there is no network
+network_probe_timeout = 5
+
+# seconds that the result of the network probe is reused before probing again
+network_probe_ttl = 60
+
+# seconds that the saved lists of available casarundata and measures versions are used before checking with the server for changes
+catalog_ttl = 600
+
+# seconds that pull_data, data_update and measures_update wait for the lock on measurespath while another update holds it
+# None waits as long as necessary (but see data_lock_policy)
+data_lock_wait = None
+
+# what pull_data, data_update and measures_update do when the lock on measurespath is still held by another update after data_lock_wait seconds :
+# 'wait' raises casaconfig.LockTimeout, 'skip' skips the update and continues to use the data already installed at measurespath
+# (a data_lock_wait of None does not wait at all with 'skip', pull_data still raises LockTimeout when nothing is installed yet)
+data_lock_policy = 'wait'
+
+# seconds of the lease recorded in the lock file by the update holding the lock on measurespath, renewed every lease/4 seconds
+# a lock file left by an update whose lease has expired (or whose process is gone) is recovered automatically by the next update
+data_lock_lease = 300
+
+# how the lock on measurespath is held : 'fcntl' (a POSIX lock on the lock file), 'link' (a lock file created with a hard link, for NFS),
+# 'rename' (a lock directory created by a rename, e.g. for Lustre without flock), or 'auto' to choose from the type of filesystem holding measurespath
+data_lock_backend = 'auto'
+
+# the url of a casaconfig mirror (started with python -m casaconfig --serve) to use instead of go.nrao.edu and astron.nl
+# for the casarundata and measures (e.g. 'http://mirrorhost:8080'), None uses those servers directly
+# when this is set the mirror is also used as the network probe
+data_mirror_url = None
+
+# the locations of the casarundata and measures tarballs in order of preference, any of these may be a file:// url or the path to a directory
+# (e.g. a staged copy on a shared filesystem for hosts without network access, the tarballs there are used in place and no network is needed)
+# when there is more than one the one that answers quickest is used first (after data_mirror_url when that is set, it is always used first)
+# and the others are used if a download from it fails or slows down
+casarundata_mirrors = ['https://go.nrao.edu/casarundata']
+measures_mirrors = ['https://www.astron.nl/iers']
+
+# seconds to wait for each of the casarundata_mirrors or measures_mirrors to answer when choosing between them
+mirror_probe_timeout = 5
+
+# a download that is slower than download_min_rate bytes per second over download_rate_window seconds is moved to the
+# next location of that tarball (if there is one), a download_min_rate of 0 never moves a download
+download_min_rate = 65536
+download_rate_window = 30
@@ -15,9 +15,50 @@
 this module will be included in the api
 """
 
+def is_version(value):
+    # only versions starting with casarundata and having '.tar.' somewhere later and not ending in .md5
+    return (value.startswith('casarundata') and (value.rfind('.tar')>11) and (value[-4:] != '.md5'))
+
+def version_stem(version):
+    # the casarundata version without the .tar and compression suffix (e.g. casarundata-x.y.z)
+    return version[:version.rfind('.tar')]
+
+def same_version(version, other):
+    # True if version and other are the same casarundata version, possibly with different compressions (e.g. .tar.xz and .tar.zst)
+    if version == other:
+        return True
+    return is_version(version) and is_version(other) and version_stem(version) == version_stem(other)
+
+def preferred_archive(version, available=None):
+    """
+    Return the name of the tarball to fetch to install version. When the available list
+    (data_available() if None) has the same casarundata version with a different compression
+    then a .tar.zst tarball is preferred if zstd can be decompressed here (see decompressors.py).
+    A version that can not be decompressed here is replaced by one of the same version that
+    can. Otherwise (including any version that is not a casarundata version) version is returned.
+    """
+    from .decompressors import can_decompress, kind_of_name
+
+    if not is_version(version):
+        return version
+    if available is None:
+        try:
+            available = data_available()
+        except Exception:
+            # the list of alternatives is not needed to install version
+            return version
+    usable = [v for v in available if same_version(v, version) and can_decompress(kind_of_name(v))]
+    for v in usable:
+        if kind_of_name(v) == 'zst':
+            return v
+    if len(usable) == 0 or version in usable:
+        return version
+    return usable[-1]
+
 def data_available():
     """
     List available casarundata versions on CASA server at https://go.nrao.edu/casarundata
+    (or the mirror at config.data_mirror_url when that is set).
 
     This returns a list of the casarundata versions available on the CASA
     server. The version parameter of data_update must be one
@@ -27,7 +68,16 @@ def data_available():
     A casarundata version is the filename of the tarball and look 
     like "casarundata.x.y.z.tar.*" (different compressions may be used by CASA without
     changing casaconfig functions that use those tarballs). The full filename is
-    the casarundata version expected in casaconfig functions.
+    the casarundata version expected in casaconfig functions. When the same version is
+    available with more than one compression those are the same version to casaconfig.
+    The .tar.zst tarball is installed when there is one and zstd can be decompressed
+    (by the zstd tool or the zstandard module), since it decompresses faster.
+
+    The list is saved in the catalogs directory in config.cachedir. A list saved less
+    than config.catalog_ttl seconds ago is returned without contacting the server.
+    Otherwise the server is asked if the list has changed since it was saved (which
+    is usually answered without sending the list again). The saved list is returned
+    when there is no network or the server can not be reached.
 
     Parameters
        None
@@ -36,55 +86,24 @@ def data_available():
        list - version names returned as list of strings
 
     Raises
-       - casaconfig.NoNetwork - Raised where there is no network seen, can not continue
-       - casaconfig.RemoteError - Raised when there is an error fetching some remote content for some reason other than no network
+       - casaconfig.NoNetwork - Raised where there is no network seen and there is no saved list, can not continue
+       - casaconfig.RemoteError - Raised when there is an error fetching some remote content for some reason other than no network and there is no saved list
        - Exception - Unexpected exception while getting list of available casarundata versions
 
     """
 
-    import html.parser
-    import urllib.request
-    import urllib.error
-    import ssl
-    import certifi
-
     from casaconfig import RemoteError
     from casaconfig import NoNetwork
 
-    from .have_network import have_network
-
-    if not have_network():
-        raise NoNetwork("No network, can not find the list of available data.")
-    
-    class LinkParser(html.parser.HTMLParser):
-        def reset(self):
-            super().reset()
-            self.rundataList = []
-
-        def handle_starttag(self, tag, attrs):
-            if tag == 'a':
-                for (name, value) in attrs:
-                    # only care if this is an href and the value starts with
-                    # casarundata and has '.tar.' somewhere later and does not end in .md5
-                    if name == 'href' and (value.startswith('casarundata') and (value.rfind('.tar')>11) and (value[-4:] != '.md5')):
-                        # only add it to the list if it's not already there
-                        if (value not in self.rundataList):
-                            self.rundataList.append(value)
+    from .fetch_catalog import fetch_catalog
+    from .data_urls import casarundata_url
 
     try:
-        context = ssl.create_default_context(cafile=certifi.where())
-        with urllib.request.urlopen('https://go.nrao.edu/casarundata/', context=context, timeout=400) as urlstream:
-            parser = LinkParser()
-            encoding = urlstream.headers.get_content_charset() or 'UTF-8'
-            for line in urlstream:
-                parser.feed(line.decode(encoding))
-
-        # return the sorted list, earliest versions are first, newest is last
-        return sorted(parser.rundataList)
-
-    except urllib.error.URLError as urlerr:
-        raise RemoteError("Unable to retrieve list of available casarundata versions : " + str(urlerr)) from None
-        
+        return fetch_catalog('casarundata', casarundata_url() + '/', is_version, 'casarundata versions')
+
+    except (NoNetwork, RemoteError):
+        raise
+
     except Exception as exc:
         msg = "Unexpected exception while getting list of available casarundata versions : " + str(exc)
         raise Exception(msg)
@@ -15,7 +15,7 @@
 this module will be included in the api
 """
 
-def data_update(path=None, version=None, force=False, logger=None, auto_update_rules=False, verbose=None):
+def data_update(path=None, version=None, force=False, logger=None, auto_update_rules=False, verbose=None, staging_dir=None):
     """
     Check for updates to the installed casarundata and install the update or change to
     the requested version when appropriate.
@@ -66,6 +66,11 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
     typically followed by a measures_update to ensure that the most recent measures data
     are installed.
 
+    The casarundata tarball is downloaded before any of the previously installed files
+    are removed. An interrupted download leaves the installed version as it was and
+    the next data_update (or pull_data) of that version resumes the download where
+    it stopped.
+
     A file lock is used to prevent more that one data update (pull_data, measures_update,
     or data_update) from updating any files in path at the same time. When locked, the
     lock file (data_update.lock in path) contains information about the process that
@@ -79,6 +84,9 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
     can be tried again. It may be safest in that case to remove path completely or use a
     different path and use pull_data to install a fresh copy of the desired version.
 
+    A lock file left by an update that was killed is recovered automatically and the wait
+    for a lock held by another update is bounded, see get_data_lock and config.data_lock_policy.
+
     Some of the tables installed by data_update are only read when casatools starts. Use of
     data_update except during CASA startup by the auto update proess  should typically be
     followed by a restart of CASA so that any changes are seen by the tools and tasks that
@@ -101,17 +109,19 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
        - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages. Default None writes messages to the terminal.
        - auto_update_rules (bool=False) - If True then the user must be the owner of path, version must be None, and force must be False.
        - verbose (int) - Level of output, 0 is none, 1 is to logger, 2 is to logger and terminal, defaults to casaconfig_verbose in the config dictionary.
+       - staging_dir (str=None) - A directory on fast local storage (e.g. local NVMe or /dev/shm) where the tarball is downloaded and extracted before it is published to path, copying only the files that are not already identical there. Default None uses config.staging_dir (when that is also None the tarball is extracted directly into path).
 
     Returns
        None
 
     Raises
        - casaconfig.AutoUpdatesNotAllowed - raised when path does not exist as a directory or is not owned by the user
-       - casaconfig.BadLock - raised when the lock file was not empty when an attempt was made to obtain the lock
+       - casaconfig.BadLock - raised when the lock file was not empty when an attempt was made to obtain the lock and it could not be recovered
+       - casaconfig.LockTimeout - raised when the lock on path is held by another update for longer than config.data_lock_wait seconds and config.data_lock_policy is 'wait'
        - casaconfig.BadReadme - raised when the readme.txt file at path did not contain the expected list of installed files or was incorrectly formatted
        - casaconfig.NoReadme - raised when the readme.txt file is not found at path (path also may not exist)
        - casaconfig.NotWritable - raised when the user does not have permission to write to path
-       - casaconfig.RemoteError - raised by data_available when the list of available data versions could not be fetched
+       - casaconfig.RemoteError - raised by data_available when the list of available data versions could not be fetched or when the casarundata tarball could not be downloaded
        - casaconfig.UnsetMeasurespath - raised when path is None and measurespath has not been set in config.
        - Exception - raised when there was an unexpected exception while populating path
 
@@ -122,10 +132,14 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
     from casaconfig import data_available
     from casaconfig import pull_data
     from casaconfig import get_data_info
-    from casaconfig import AutoUpdatesNotAllowed, BadReadme, BadLock, NoReadme, RemoteError, UnsetMeasurespath, NotWritable
+    from casaconfig import AutoUpdatesNotAllowed, BadReadme, BadLock, NoReadme, RemoteError, UnsetMeasurespath, NotWritable, LockTimeout
     from .print_log_messages import print_log_messages
-    from .get_data_lock import get_data_lock
+    from .get_data_lock import get_data_lock, release_data_lock
     from .do_pull_data import do_pull_data
+    from .fetch_archive import fetch_archive
+    from .publish import resolve_staging_dir
+    from .data_available import same_version, preferred_archive
+    from .data_urls import casarundata_urls
 
     if path is None:
         from .. import config as _config
@@ -236,7 +250,7 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
         return
 
     # don't update if force is false and the requested version is already installed
-    if force is False and (currentVersion == requestedVersion):
+    if force is False and same_version(currentVersion, requestedVersion):
         if expectedMeasuresVersion is not None:
             # the 'release' version has been requested, need to check the measures version
             # assume a force is necessary until the measures version is known to be OK
@@ -273,7 +287,7 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
     try:
         print_log_messages('data_update using version %s, acquiring the lock ... ' % requestedVersion, logger)
 
-        lock_fd = get_data_lock(path, 'data_update')
+        lock_fd = get_data_lock(path, 'data_update', logger, type='casarundata')
         # the BadLock exception that may happen here is caught below
 
         do_update = True
@@ -284,7 +298,7 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
             currentDate = dataReadmeInfo['date']
             installedFiles = dataReadmeInfo['manifest']
             ageRecent = dataReadmeInfo['age'] < 1.0
-            if ((currentVersion == requestedVersion) and (not force)):
+            if (same_version(currentVersion, requestedVersion) and (not force)):
                 if expectedMeasuresVersion is not None:
                     # this is a 'release' update request, need to check that the measures version is also now OK
                     measuresReadmeInfo = get_data_info(path, logger, type='measures')
@@ -318,9 +332,13 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
             raise BadReadme('data_update: unexpected problem reading readme.txt file during data update, can not safely update to the requested version')
 
         if do_update:
+            # fetch the tarball first, nothing at path has changed yet so the lock can be cleaned if this fails
+            # an interrupted download is resumed by the next attempt
+            staging_dir = resolve_staging_dir(staging_dir)
+            archive = fetch_archive(casarundata_urls(), preferred_archive(requestedVersion, available_data), logger, download_dir=staging_dir)
             # do not clean the lock file contents at this point unless do_pull_data returns normally
             clean_lock = False
-            do_pull_data(path, requestedVersion, installed_files, currentVersion, currentDate, logger)
+            do_pull_data(path, requestedVersion, installed_files, currentVersion, currentDate, logger, archive, staging_dir=staging_dir)
             clean_lock = True
             if namedVersion:
                 # a specific version has been requested, set the times on the measures readme.txt to now to avoid
@@ -339,6 +357,15 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
         # reraise this
         raise
 
+    except LockTimeout as exc:
+        # nothing at path has changed, the lock was never obtained
+        from .. import config as _config
+        if _config.data_lock_policy == 'skip':
+            print_log_messages('data_update skipped : %s' % str(exc), logger)
+            return
+        print_log_messages(str(exc), logger, True)
+        raise
+
     except BadReadme as exc:
         # something is wrong in the readme after an update was triggered, this shouldn't happen, print more context reraise this
         msgs = [str(exc)]
@@ -356,9 +383,8 @@ def data_update(path=None, version=None, force=False, logger=None, auto_update_r
 
     finally:
         # make sure the lock file is closed and also clean the lock file if safe to do so, this is always executed
+        # a lock file that is not cleaned is marked as failed and it will not be recovered automatically
         if lock_fd is not None and not lock_fd.closed:
-            if clean_lock:
-                lock_fd.truncate(0)
-            lock_fd.close()
+            release_data_lock(lock_fd, clean_lock)
 
     return
@@ -0,0 +1,178 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The locations of the casarundata and measures tarballs and their directory listings.
+
+The candidate locations for each type are, in order, the mirror at config.data_mirror_url
+(if set, e.g. one started with python -m casaconfig --serve, at mirror/casarundata and
+mirror/measures) followed by config.casarundata_mirrors or config.measures_mirrors. Any
+of these may be a file:// url (or the path to a directory) of a copy on a local or shared
+filesystem, e.g. a staged copy for a cluster without outbound network access. The copy
+must use the same names as the data host. The archives in a local copy are used where they
+are, without being copied into the archive cache (see fetch_archive), and no network probe
+is needed when all of the locations of a type are local.
+
+A mirror at config.data_mirror_url is always used first, the other candidates are only
+fallbacks for when it fails. When there is more than one of those other candidates they
+are all probed concurrently (a HEAD request, or a check that the directory exists for a
+file:// url). The candidates that answered are used in order of how quickly they answered,
+followed by any that did not answer (in their configured order) as a last resort. The
+result is remembered for config.network_probe_ttl seconds. The first location is used for
+the directory listings and all of them, in order, are used by fetch_archive so that a
+download can fail over to the next one.
+
+These functions are intended for internal casaconfig use.
+"""
+
+import threading
+
+# the most recent selection by type as (candidates, time.monotonic() of the probe, ordered urls)
+_selected = {}
+_selected_lock = threading.Lock()
+
+def _as_url(location):
+    # a location without a scheme is the path to a directory, return it as a file:// url
+    import os
+    import urllib.request
+
+    if '://' in location:
+        return location.rstrip('/')
+    return 'file://' + urllib.request.pathname2url(os.path.abspath(os.path.expanduser(location)))
+
+def mirror_url():
+    """The mirror to use (config.data_mirror_url without any trailing /) or None."""
+    from .. import config as _config
+
+    mirror = getattr(_config, 'data_mirror_url', None)
+    if not mirror:
+        return None
+    return _as_url(mirror)
+
+def local_path(url):
+    """The directory named by url if it is a file:// url, otherwise None."""
+    import urllib.parse
+    import urllib.request
+
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme.lower() != 'file':
+        return None
+    return urllib.request.url2pathname(parsed.path)
+
+def is_local(url):
+    """True if url is on a local or shared filesystem (a file:// url)."""
+    return local_path(url) is not None
+
+def sources_are_local(type=None):
+    """
+    True if all of the locations of type ('casarundata' or 'measures', or both when type
+    is None) are local so that nothing needs the network.
+    """
+    types = ['casarundata', 'measures'] if type is None else [type]
+    return all(is_local(url) for t in types for url in candidate_urls(t))
+
+def candidate_urls(type, use_mirror=True):
+    """
+    Return the configured locations for type ('casarundata' or 'measures') in order of preference.
+    The mirror at config.data_mirror_url is left out when use_mirror is False (e.g. by the mirror itself).
+    """
+    from .. import config as _config
+
+    urls = []
+    mirror = mirror_url() if use_mirror else None
+    if mirror is not None:
+        urls.append(mirror + '/' + type)
+    configured = _config.casarundata_mirrors if type == 'casarundata' else _config.measures_mirrors
+    if isinstance(configured, str):
+        configured = [configured]
+    for url in configured:
+        url = _as_url(url)
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+def probe_url(url, timeout):
+    """
+    Return the seconds taken by url to answer a HEAD request (any 2xx after redirects), or None
+    if it did not answer in time or answered with an error. A file:// url answers when it is
+    a directory that can be read.
+    """
+    import os
+    import time
+    import urllib.error
+
+    from .transport import urlopen
+
+    start = time.monotonic()
+    path = local_path(url)
+    if path is not None:
+        return (time.monotonic() - start) if (os.path.isdir(path) and os.access(path, os.R_OK | os.X_OK)) else None
+    try:
+        with urlopen(url, method='HEAD', timeout=timeout) as response:
+            if (response.status // 100) != 2:
+                return None
+    except urllib.error.HTTPError as httperr:
+        if httperr.code not in (405, 501):
+            return None
+    except Exception:
+        return None
+    return time.monotonic() - start
+
+def select_urls(type, use_mirror=True):
+    """
+    Return the locations for type in the order that they should be used (see the module documentation).
+    The mirror at config.data_mirror_url is left out when use_mirror is False.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .. import config as _config
+
+    candidates = candidate_urls(type, use_mirror)
+    # the mirror (first when it is set) stays first, only the fallbacks after it are ordered by the probe
+    pinned = candidates[:1] if (use_mirror and mirror_url() is not None) else []
+    fallbacks = candidates[len(pinned):]
+    if len(fallbacks) < 2:
+        # nothing to choose between, the network probe (have_network) is sufficient
+        return candidates
+
+    with _selected_lock:
+        previous = _selected.get(type)
+        if previous is not None and previous[0] == candidates and (time.monotonic() - previous[1]) < _config.network_probe_ttl:
+            return list(previous[2])
+
+    with ThreadPoolExecutor(max_workers=len(fallbacks)) as pool:
+        latencies = list(pool.map(lambda url: probe_url(url, _config.mirror_probe_timeout), fallbacks))
+
+    answered = sorted([(latency, i) for (i, latency) in enumerate(latencies) if latency is not None])
+    ordered = pinned + [fallbacks[i] for (latency, i) in answered] + [url for (url, latency) in zip(fallbacks, latencies) if latency is None]
+
+    with _selected_lock:
+        _selected[type] = (candidates, time.monotonic(), ordered)
+    return ordered
+
+def casarundata_urls():
+    """The locations of the casarundata tarballs, in the order they should be used."""
+    return select_urls('casarundata')
+
+def measures_urls():
+    """The locations of the measures tarballs, in the order they should be used."""
+    return select_urls('measures')
+
+def casarundata_url():
+    """The location of the casarundata directory listing."""
+    return casarundata_urls()[0]
+
+def measures_url():
+    """The location of the measures directory listing."""
+    return measures_urls()[0]
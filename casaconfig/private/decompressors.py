@@ -0,0 +1,166 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The decompressors used by extract_archive.
+
+The compression of a tarball is identified from the magic bytes at the start of the
+stream ('xz', 'gz', 'bz2', 'zst', or None when it is not compressed).
+
+A tarball can be decompressed by an external tool, reading the compressed stream on
+stdin and writing the tar stream to stdout, or in a thread of this process. The
+external tools spread the work over several cores : xz (version 5.4 and later) and
+pzstd decompress the independent blocks of a multi-block (multi-threaded) xz or
+pzstd stream concurrently, pigz, lbzip2 and pbzip2 use extra threads. Even a single
+threaded tool (zstd) moves the decompression out of this process.
+
+config.extract_decompressor selects how this is done :
+
+   - 'auto' : a parallel external tool when one is found on PATH (and zstd for .zst), otherwise in a thread
+   - 'python' : always in a thread, .zst then needs the optional zstandard module (or compression.zstd in Python 3.14 and later)
+   - 'external' : always an external tool (parallel if possible), it is an error if there is none
+
+config.extract_decompress_threads sets the number of threads used by the external
+tools (0 uses all of the available cores).
+
+These functions are intended for internal casaconfig use.
+"""
+
+# the external tools by compression in order of preference as (command, parallel), '%d' is replaced by the number of threads
+_TOOLS = {
+    'xz':  [(['xz', '-d', '-c', '-q', '-T%d'], True)],
+    'zst': [(['pzstd', '-d', '-c', '-q', '-p', '%d'], True), (['zstd', '-d', '-c', '-q'], False)],
+    'gz':  [(['pigz', '-d', '-c', '-p', '%d'], True), (['gzip', '-d', '-c'], False)],
+    'bz2': [(['lbzip2', '-d', '-c', '-n', '%d'], True), (['pbzip2', '-d', '-c', '-p%d'], True), (['bzip2', '-d', '-c'], False)],
+}
+
+def compression_of(block):
+    """
+    Return the compression of the stream starting with block ('xz', 'gz', 'bz2', 'zst') or
+    None when it is not compressed.
+    """
+    if block.startswith(b'\xfd7zXZ\x00'):
+        return 'xz'
+    if block.startswith(b'\x1f\x8b'):
+        return 'gz'
+    if block.startswith(b'BZh'):
+        return 'bz2'
+    if block.startswith(b'\x28\xb5\x2f\xfd'):
+        return 'zst'
+    return None
+
+def _threads():
+    import os
+
+    from .. import config as _config
+
+    nthreads = _config.extract_decompress_threads
+    if not nthreads or nthreads < 1:
+        try:
+            nthreads = len(os.sched_getaffinity(0))
+        except (AttributeError, OSError):
+            nthreads = os.cpu_count() or 1
+    return nthreads
+
+def external_command(kind):
+    """
+    Return the command line (a list) of the external tool to use to decompress kind, or
+    None if kind is to be decompressed in a thread (see config.extract_decompressor).
+
+    Raises
+       - ValueError - raised when config.extract_decompressor is not a known value
+       - FileNotFoundError - raised when config.extract_decompressor is 'external' and no tool for kind is found on PATH
+    """
+    import shutil
+
+    from .. import config as _config
+
+    mode = _config.extract_decompressor
+    if mode not in ('auto', 'python', 'external'):
+        raise ValueError("unknown config.extract_decompressor : %s, expected one of 'auto', 'python', 'external'" % mode)
+    if kind is None or mode == 'python':
+        return None
+
+    for (command, parallel) in _TOOLS.get(kind, []):
+        # in 'auto' a thread of this process is as good as a single threaded tool, except for zstd which is not in the standard library
+        if mode == 'auto' and not parallel and kind != 'zst':
+            continue
+        if shutil.which(command[0]) is not None:
+            nthreads = _threads()
+            return [(arg % nthreads) if '%d' in arg else arg for arg in command]
+
+    if mode == 'external':
+        raise FileNotFoundError("no external tool was found to decompress a %s stream, see config.extract_decompressor" % kind)
+    return None
+
+def _zstd_module():
+    # the zstd module to use in a thread, or None
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+def python_decompressor(kind):
+    """
+    Return a new decompressor for kind to use in a thread. It has the decompress method and
+    eof and unused_data attributes of the standard library decompressors. None is returned
+    when the stream is not compressed.
+
+    Raises
+       - RuntimeError - raised when kind is 'zst' and there is no zstd module
+    """
+    import lzma
+    import zlib
+    import bz2
+
+    if kind == 'xz':
+        return lzma.LZMADecompressor()
+    if kind == 'gz':
+        return zlib.decompressobj(16+zlib.MAX_WBITS)
+    if kind == 'bz2':
+        return bz2.BZ2Decompressor()
+    if kind == 'zst':
+        zstd = _zstd_module()
+        if zstd is None:
+            raise RuntimeError("unable to decompress a zstd stream, install the zstandard module or the zstd tool")
+        if hasattr(zstd, 'ZstdDecompressor') and hasattr(zstd.ZstdDecompressor, 'decompressobj'):
+            # the zstandard module
+            return zstd.ZstdDecompressor().decompressobj()
+        return zstd.ZstdDecompressor()
+    return None
+
+def can_decompress(kind):
+    """
+    True if a stream of kind can be decompressed here (either by an external tool or in a thread).
+    """
+    try:
+        if external_command(kind) is not None:
+            return True
+    except (ValueError, FileNotFoundError):
+        return False
+    return kind != 'zst' or _zstd_module() is not None
+
+def kind_of_name(name):
+    """
+    Return the compression implied by the name of a tarball (e.g. 'casarundata-x.y.z.tar.zst') or None.
+    """
+    for (suffix, kind) in (('.xz', 'xz'), ('.txz', 'xz'), ('.gz', 'gz'), ('.tgz', 'gz'), ('.bz2', 'bz2'), ('.zst', 'zst'), ('.tzst', 'zst')):
+        if name.endswith(suffix):
+            return kind
+    return None
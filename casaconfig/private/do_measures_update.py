@@ -0,0 +1,159 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+def do_measures_update(path, version, archive, logger, use_astron_obs_table=False, staging_dir=None):
+    """
+    Install the measures data for the given version from a previously fetched archive
+    in path and update the measures readme.txt file when done.
+
+    This function is used by measures_update when it has determined that the desired
+    version should be installed, and when an interrupted measures install is recovered.
+    The calling function has already obtained the lock. No additional checking happens
+    here. The calling function has also already fetched the archive (using fetch_archive)
+    so that a failed download does not change anything in path.
+
+    Any *.old tables in the geodetic tree are not installed and neither is the
+    Observatories table unless use_astron_obs_table is True.
+
+    How the archive is installed depends on config.measures_install_mode. For 'inplace'
+    (the default) the measures readme.txt file is removed and the archive is extracted
+    over the installed tables. For 'staged' the archive is extracted into a staging
+    directory in path, anything in the installed directories that is not in the archive
+    (e.g. the Observatories table from casarundata) is hard linked into the staging
+    directory, and each top-level directory is then renamed into place.
+
+    When staging_dir is set (see publish.py) the archive is extracted into a work directory
+    there and then published into path ('inplace') or into the staging directory in path
+    ('staged', with the tables identical to those already installed hard linked from path).
+    Only the files that are not already identical at the destination are copied. An archive
+    that was downloaded into staging_dir is removed once it has been installed.
+
+    The install is recorded in the install state database in path (see install_state.py)
+    and the measures readme.txt file is generated from that state.
+
+    The archive is released to the archive cache once it has been installed.
+
+    Parameters
+       - path (str) - Folder path containing the measures data.
+       - version (str) - measures version (tarball name) being installed.
+       - archive (str) - The path to the local copy of the measures tarball for version.
+       - logger (casatools.logsink) - Instance of the casalogger to use for writing messages. Messages are always written to the terminal. Set to None to skip writing messages to a logger.
+       - use_astron_obs_table (bool=False) - install the Observatories table found in the archive.
+       - staging_dir (str=None) - A directory on fast local storage where the archive is extracted before it is published into path. None extracts directly into path.
+
+    Returns
+       None
+
+    """
+
+    import os
+    import re
+    import shutil
+    import tarfile
+    import time
+    from datetime import datetime
+
+    from .archive_cache import release_archive
+    from .extract_archive import extract_archive
+    from .staged_install import make_staging_dir, carry_over, swap_into_place
+    from .lock_info import report_progress, report_install
+    from .install_state import record_install, file_records
+    from .publish import make_work_dir, publish_tree, remove_staged_archive
+    from .. import config as _config
+
+    # this install can be finished by another process if this one does not finish it
+    report_install('measures', version, use_astron_obs_table=use_astron_obs_table)
+
+    readme_path = os.path.join(path,'geodetic/readme.txt')
+    staged = _config.measures_install_mode == 'staged'
+
+    # the records of the installed tables that publishing from staging_dir compares with the extracted files
+    # (the install state is only used while it matches the readme, it must be read before that is removed)
+    installed = file_records(path, 'measures') if staging_dir is not None else None
+
+    if not staged:
+        # remove any existing measures readme.txt now in case something goes wrong during extraction
+        if os.path.exists(readme_path):
+            os.remove(readme_path)
+
+    # custom filter that incorporates data_filter to watch for dangerous members of the tar file and
+    # add filtering to remove the Observatories table (unless use_astron_obs_table is True) and
+    # the *.old tables that may be in the geodetic tree
+    def custom_filter(member, extractionPath):
+        # member is a TarInfo instance and extractionPath is the destination path
+        # use the 'data_filter' first to deal with dangerous members
+        member = tarfile.data_filter(member, extractionPath)
+        # always exclude *.old names in geodetic
+        if (member is not None) and (re.search('geodetic',member.name) and re.search('.old',member.name)):
+            member = None
+        if (not use_astron_obs_table) and (member is not None) and (re.search('Observatories',member.name)):
+            member = None
+        return member
+
+    # the readme.txt file is generated from the install state recorded for these measures
+    readme_date = datetime.today().strftime('%Y-%m-%d')
+    started = time.time()
+    file_info = {}
+
+    work = None
+    if staging_dir is not None:
+        # extract on fast local storage, path is not changed until this is complete
+        work = make_work_dir(staging_dir, 'measures')
+        try:
+            stats = extract_archive(archive, work, custom_filter, logger, file_info)
+        except:
+            shutil.rmtree(work, ignore_errors=True)
+            raise
+
+    if not staged:
+        if work is None:
+            stats = extract_archive(archive, path, custom_filter, logger, file_info)
+        else:
+            try:
+                stats['publish'] = publish_tree(work, path, logger=logger, item=version, file_info=file_info, installed=installed)
+            finally:
+                shutil.rmtree(work, ignore_errors=True)
+
+        # record the install and create a new readme.txt file
+        record_install(path, 'measures', version, readme_date, file_info, started, stats)
+    else:
+        # extract into a staging directory, the installed tables are not changed until that's complete
+        staging = make_staging_dir(path)
+        try:
+            if work is None:
+                stats = extract_archive(archive, staging, custom_filter, logger, file_info)
+            else:
+                # tables identical to those already installed are linked rather than copied
+                stats['publish'] = publish_tree(work, staging, reference=path, logger=logger, item=version, file_info=file_info, installed=installed)
+            # the new readme.txt is swapped into place along with the geodetic tables
+            record_install(path, 'measures', version, readme_date, file_info, started, stats, readme_dir=staging)
+            # keep everything not found in the tarball (e.g. the Observatories table from casarundata)
+            for f in os.listdir(staging):
+                livePath = os.path.join(path, f)
+                stagedPath = os.path.join(staging, f)
+                if os.path.isdir(livePath) and not os.path.islink(livePath) and os.path.isdir(stagedPath):
+                    carry_over(livePath, stagedPath)
+        except:
+            # nothing in path has changed yet
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        finally:
+            if work is not None:
+                shutil.rmtree(work, ignore_errors=True)
+        report_progress('swap', None, None, version)
+        swap_into_place(path, staging)
+
+    # the tarball is kept in the archive cache only if there's room for it
+    release_archive(archive)
+    remove_staged_archive(archive, staging_dir)
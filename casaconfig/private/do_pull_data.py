@@ -12,16 +12,39 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-def do_pull_data(path, version, installed_files, currentVersion, currentDate, logger):
+def do_pull_data(path, version, installed_files, currentVersion, currentDate, logger, archive, staging_dir=None):
     """
-    Pull the casarundata for the given version and install it in path, removing
-    the installed files and updating the readme.txt file when done.
+    Install the casarundata for the given version from a previously fetched archive
+    in path, removing the installed files and updating the readme.txt file when done.
 
     This function is used by both pull_data and data_update when each has
     determind that the desired version should be installed. The calling function
     has already obtained the lock. No additional checking happens here. The
     calling function has already examined any existing readme file and used that
-    to set the installed_files list as appropriate. 
+    to set the installed_files list as appropriate. The calling function has also
+    already fetched the archive (using fetch_archive) so that a failed download
+    does not leave path without the previously installed files.
+
+    This function is also used to finish an install that was interrupted (see
+    recover_install.py), in which case some of the installed_files may already be gone.
+
+    The archive is released to the archive cache once it has been installed.
+
+    How the archive is installed depends on config.data_install_mode :
+
+       - 'inplace' (the default) extracts each file directly into its final location in path, recording the manifest as it goes
+       - 'copy' extracts into a version directory in path and then copies its contents up into path (this writes everything twice)
+       - 'staged' extracts into a staging directory in path while the previous version stays in place and then renames each top-level directory (and then readme.txt) into place (see staged_install.py)
+       - 'differential' extracts as for 'inplace' but does not write the files that the install state shows are unchanged, and then removes the previously installed files that are not in the new manifest (see extraction_engines.py)
+
+    When staging_dir is set the tarball is extracted there and the result is published into
+    path (or into the staging directory in path for 'staged'), copying only the files that are
+    not already identical there (see publish.py). The 'copy' mode is not used with a staging_dir.
+
+    The installed version, the size, modification time and checksum of each installed file,
+    and the timings of the install are recorded in the install state database in path (see
+    install_state.py). The readme.txt file is generated from that state and is always replaced
+    atomically.
 
     Parameters
        - path (str) - Folder path to place casadata contents.
@@ -30,107 +53,225 @@ def do_pull_data(path, version, installed_files, currentVersion, currentDate, lo
        - currentVersion (str) - from the readme file if it already exists, or an empty string if there is no previously installed version.
        - currentDate (str) - from the readme file if it already exists, or an empty string if there is no previously installed version.
        - logger (casatools.logsink) - Instance of the casalogger to use for writing messages. Messages are always written to the terminal. Set to None to skip writing messages to a logger.
+       - archive (str) - The path to the local copy of the casarundata tarball for version.
+       - staging_dir (str=None) - A directory on fast local storage where the tarball is extracted before it is published into path. None extracts directly into path.
 
     Returns
        None
 
+    Raises
+       - casaconfig.RemoteError - raised when the tarball has something outside of the version directory or no files in it
+
     """
 
     import os
     import sys
     from datetime import datetime
-    import ssl
-    import urllib.request
-    import certifi
     import tarfile
     import shutil
+    import copy
+    import time
 
+    from casaconfig import RemoteError
     from .print_log_messages import print_log_messages
+    from .archive_cache import release_archive
+    from .extract_archive import extract_archive
+    from .remove_manifest import remove_manifest
+    from .staged_install import make_staging_dir, carry_over, swap_into_place
+    from .lock_info import report_progress, report_install
+    from .install_state import record_install, file_records
+    from .publish import make_work_dir, publish_tree, remove_staged_archive
+    from .. import config as _config
     
     readme_path = os.path.join(path, 'readme.txt')
+    started = time.time()
+
+    # this install can be finished by another process if this one does not finish it
+    report_install('casarundata', version)
 
-    if (installed_files is not None and len(installed_files) > 0):
-        # remove the previously installed files
+    # the size, modification time and checksum of each extracted file, recorded in the install state
+    file_info = {}
+
+    staged = _config.data_install_mode == 'staged'
+    differential = _config.data_install_mode == 'differential' and staging_dir is None
+
+    # the records of the installed files that a differential install compares with the tarball members
+    # and that publishing from staging_dir compares with the extracted files
+    # (the install state is only used while it matches the readme, it must be read before that is removed)
+    installed = file_records(path, 'casarundata') if (differential or staging_dir is not None) else None
+
+    if (installed_files is not None and len(installed_files) > 0) and not staged and staging_dir is None:
         # remove this readme file so it's not confusing if something goes wrong after this
-        os.remove(readme_path)
-        print_log_messages('Removing files using manifest from previous install of %s on %s' % (currentVersion, currentDate), logger)
-        for relpath in installed_files:
-            filepath = os.path.join(path,relpath)
-            # don't say anything if filepath isn't found, remove it if it is found
-            if os.path.exists(filepath) and os.path.isfile(filepath):
-                os.remove(filepath)
-        
-        # remove any empty directories in path - this is recursive
-        def remove_empty_dirs(dirpath):
-            # look at all of the files in dirpath, for dirs, go down that recursively
-            # if there's nothing there after the dirs have all been handled, remove it
-            files = os.listdir(dirpath)
-            not_dirs = []
-            for f in os.listdir(dirpath):
-                fpath = os.path.join(dirpath, f)
-                if os.path.isdir(fpath):
-                    remove_empty_dirs(fpath)
-                else:
-                    not_dirs.append(f)
-            if len(not_dirs) == 0:
-                if len(os.listdir(dirpath)) == 0:
-                    os.rmdir(dirpath)
-                    
-        remove_empty_dirs(path)
+        # (it may already be gone when an interrupted install is being recovered)
+        if os.path.exists(readme_path):
+            os.remove(readme_path)
+        if not differential:
+            # remove the previously installed files
+            print_log_messages('Removing files using manifest from previous install of %s on %s' % (currentVersion, currentDate), logger)
+            # this also removes any directories left empty
+            report_progress('remove', None, len(installed_files), currentVersion)
+            remove_manifest(path, installed_files)
 
     # okay, safe to install the requested version
 
-    goURL = 'https://go.nrao.edu/casarundata'
-    context = ssl.create_default_context(cafile=certifi.where())
+    # use the 'data' filter if available, revert to previous 'fully_trusted' behavior of not available
+    data_filter = getattr(tarfile, 'data_filter', (lambda member, path: member))
 
-    # need to first resolve the go.nrao.edu URL to find the actual data URL
-    dataURLroot = urllib.request.urlopen(goURL, context=context).url
-    dataURL = os.path.join(dataURLroot, version)
-    
-    with urllib.request.urlopen(dataURL, context=context, timeout=400) as tstream, tarfile.open(fileobj=tstream, mode='r|*') as tar :
-        l = int(tstream.headers.get('content-length', 0))
-        sizeString = "unknown size"
-        if (l>0): sizeString = ("%.0fM" % (l/(1024*1024)))
-        # use print directly to make use of the end argument
-        print('downloading casarundata contents to %s (%s) ... ' % (path,sizeString), file = sys.stdout, end="" )
-        sys.stdout.flush()
-        # also log it
-        if logger is not None: logger.post('downloading casarundata contents to %s ...' % path, 'INFO')
-        # use the 'data' filter if available, revert to previous 'fully_trusted' behavior of not available
-        tar.extraction_filter = getattr(tarfile, 'data_filter', (lambda member, path: member))
-        tar.extractall(path=path)
-        
-    print("done", file=sys.stdout)
-        
-    # the tarball has been extracted to path/version
-    # get the instaled files of files to be written to the readme file
-    versdir = os.path.join(path,version[:version.index('.tar')])
-    installed_files = []
-    wgen = os.walk(versdir)
-    for (dirpath, dirnames, filenames) in wgen:
-        for f in filenames:
-            installed_files.append(os.path.relpath(os.path.join(dirpath,f),versdir))
-                
-    # move everything in version up a level to path
-    for f in os.listdir(versdir):
-        srcPath = os.path.join(versdir,f)
-        if os.path.isdir(srcPath):
-            # directories are first copied, then removed
-            # existing directories are reused, existing files are overwritten
-            # things in path that do not exist in srcPath are not changed
-            shutil.copytree(srcPath,os.path.join(path,f),dirs_exist_ok=True)
-            shutil.rmtree(srcPath)
+    # the tarball contents are all in a top-level directory named for the version
+    versname = version[:version.index('.tar')]
+    versdir = os.path.join(path,versname)
+    prefix = versname + '/'
+
+    def check_member(member):
+        # anything outside of the version directory means this is not the expected tarball, stop before it is extracted
+        if member.name != versname and not member.name.startswith(prefix):
+            raise RemoteError('%s is not the expected casarundata tarball, %s is outside of the %s directory' % (os.path.basename(archive), member.name, versname))
+
+    def check_files():
+        # a tarball with no files in the version directory would install nothing
+        if len(installed_files) == 0:
+            raise RemoteError('%s is not the expected casarundata tarball, there are no files in the %s directory' % (os.path.basename(archive), versname))
+
+    print_log_messages('extracting casarundata contents to %s ...' % path, logger)
+
+    if _config.data_install_mode == 'copy' and staging_dir is None:
+        def copy_filter(member, dest_path):
+            check_member(member)
+            return data_filter(member, dest_path)
+
+        # the time taken by each stage of the extraction is reported when it's done
+        stats = extract_archive(archive, path, copy_filter, logger, file_info)
+
+        # the tarball has been extracted to path/version
+        # get the instaled files of files to be written to the readme file
+        installed_files = []
+        wgen = os.walk(versdir)
+        for (dirpath, dirnames, filenames) in wgen:
+            for f in filenames:
+                installed_files.append(os.path.relpath(os.path.join(dirpath,f),versdir))
+        if len(installed_files) == 0 and os.path.isdir(versdir):
+            shutil.rmtree(versdir)
+        check_files()
+
+        # move everything in version up a level to path
+        for f in os.listdir(versdir):
+            srcPath = os.path.join(versdir,f)
+            if os.path.isdir(srcPath):
+                # directories are first copied, then removed
+                # existing directories are reused, existing files are overwritten
+                # things in path that do not exist in srcPath are not changed
+                shutil.copytree(srcPath,os.path.join(path,f),dirs_exist_ok=True)
+                shutil.rmtree(srcPath)
+            else:
+                # assume it's a simple file, these can be moved directly, overwriting anything already there
+                os.rename(srcPath,os.path.join(path,f))
+
+        # safe to remove versdir, it would be a surprise if it's not empty
+        os.rmdir(versdir)
+
+        # the extracted member names include the version directory
+        file_info = {os.path.relpath(f, versname):file_info[f] for f in file_info}
+    else:
+        # 'inplace', 'differential' and 'staged' : strip the version directory from each member name as it streams by and extract
+        # directly into path (or the staging directory), the manifest is every non-directory member that is extracted
+        previous_files = installed_files if installed_files is not None else []
+        installed_files = []
+
+        def inplace_filter(member, dest_path):
+            check_member(member)
+            if member.name == versname:
+                # the version directory itself
+                return None
+            member = copy.copy(member)
+            member.name = member.name[len(prefix):]
+            if member.islnk() and member.linkname.startswith(prefix):
+                # hard links name another member of the tarball
+                member.linkname = member.linkname[len(prefix):]
+            member = data_filter(member, dest_path)
+            if member is not None and not member.isdir():
+                installed_files.append(member.name)
+            return member
+
+        work = None
+        if staging_dir is not None:
+            # extract on fast local storage, path is not changed until this is complete
+            work = make_work_dir(staging_dir, 'casarundata')
+            try:
+                stats = extract_archive(archive, work, inplace_filter, logger, file_info)
+                check_files()
+            except:
+                shutil.rmtree(work, ignore_errors=True)
+                raise
+
+        if not staged:
+            if work is None:
+                stats = extract_archive(archive, path, inplace_filter, logger, file_info, installed=installed)
+                check_files()
+            else:
+                # the previous readme is removed so that a partially published version is not mistaken for a complete one
+                if os.path.exists(readme_path):
+                    os.remove(readme_path)
+                print_log_messages('publishing casarundata contents from %s to %s ...' % (work, path), logger)
+                try:
+                    stats['publish'] = publish_tree(work, path, logger=logger, item=version, file_info=file_info, installed=installed)
+                finally:
+                    shutil.rmtree(work, ignore_errors=True)
+            if work is not None or differential:
+                # previously installed files that are not part of this version are removed
+                installed_set = set(installed_files)
+                leftover = [f for f in previous_files if f not in installed_set]
+                if len(leftover) > 0:
+                    print_log_messages('Removing files using manifest from previous install of %s on %s' % (currentVersion, currentDate), logger)
+                    report_progress('remove', None, len(leftover), currentVersion)
+                    remove_manifest(path, leftover)
         else:
-            # assume it's a simple file, these can be moved directly, overwriting anything already there
-            os.rename(srcPath,os.path.join(path,f))
-                        
-    # safe to remove versdir, it would be a surprise if it's not empty
-    os.rmdir(versdir)
-    # update the readme.txt file
-    with open(readme_path,'w') as fid:
-        fid.write("# casarundata populated by casaconfig.pull_data\nversion : %s\ndate : %s" % (version, datetime.today().strftime('%Y-%m-%d')))
-        fid.write("\n#\n# manifest")
-        for f in installed_files:
-            fid.write("\n%s" % f)
+            staging = make_staging_dir(path)
+            try:
+                if work is None:
+                    stats = extract_archive(archive, staging, inplace_filter, logger, file_info)
+                    check_files()
+                else:
+                    # files identical to those already installed are linked rather than copied
+                    print_log_messages('publishing casarundata contents from %s to %s ...' % (work, staging), logger)
+                    stats['publish'] = publish_tree(work, staging, reference=path, logger=logger, item=version, file_info=file_info, installed=installed)
+            except:
+                # nothing in path has changed yet
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            finally:
+                if work is not None:
+                    shutil.rmtree(work, ignore_errors=True)
+
+            # anything in the directories being replaced that isn't in the previous manifest is kept
+            previous_set = set(previous_files)
+            for f in os.listdir(staging):
+                livePath = os.path.join(path, f)
+                stagedPath = os.path.join(staging, f)
+                if os.path.isdir(livePath) and not os.path.islink(livePath) and os.path.isdir(stagedPath):
+                    carry_over(livePath, stagedPath, previous_set, f)
+
+            # record the install state and write the new readme.txt file in the staging directory, it is swapped into place last
+            manifest_info = {f:file_info.get(f, (None, None, None)) for f in installed_files}
+            record_install(path, 'casarundata', version, datetime.today().strftime('%Y-%m-%d'), manifest_info, started, stats, readme_dir=staging)
+
+            report_progress('swap', None, None, version)
+            swapped = swap_into_place(path, staging)
+
+            # previously installed files outside of the directories that were swapped in are removed as usual
+            leftover = [f for f in previous_files if f.split(os.sep)[0] not in swapped]
+            if len(leftover) > 0:
+                print_log_messages('Removing files using manifest from previous install of %s on %s' % (currentVersion, currentDate), logger)
+                report_progress('remove', None, len(leftover), currentVersion)
+                remove_manifest(path, leftover)
+
+    if not staged:
+        # record the install state and update the readme.txt file generated from it, in manifest order
+        # other sessions see either the previous or the new readme.txt contents
+        manifest_info = {f:file_info.get(f, (None, None, None)) for f in installed_files}
+        record_install(path, 'casarundata', version, datetime.today().strftime('%Y-%m-%d'), manifest_info, started, stats)
+
+    # the tarball is kept in the archive cache only if there's room for it
+    release_archive(archive)
+    remove_staged_archive(archive, staging_dir)
 
     print_log_messages('casarundata installed %s at %s' % (version, path), logger)
@@ -0,0 +1,471 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+
+# one download at a time to each destination within this process, keyed by the absolute path of dest
+# (the lock on the partial download file only excludes other processes)
+_dest_locks = {}
+_dest_locks_lock = threading.Lock()
+
+def download_file(url, dest, logger=None, retries=2, timeout=400, segments=1, validators=None):
+    """
+    Download url to dest, resuming any previously interrupted download of the same url.
+    The url may also be a list of locations of the same file in the order that they
+    should be used.
+
+    The data are first written to a partial download file (dest + '.part'). A small
+    journal file (dest + '.part.journal') records the url, the expected total size,
+    any ETag or Last-Modified validators sent by the server, and the number of bytes
+    in the partial download file that have been verified (written and synced to disk).
+    When a download is interrupted the partial download file and journal are left in
+    place. The next attempt to download the same url to the same dest asks the server
+    for just the remaining bytes using an HTTP Range request (with an If-Range
+    validator when one is known). If the server does not honor that request then the
+    download starts over from the beginning.
+
+    When segments is more than 1 and the server supports Range requests the file is
+    split into that many byte ranges (segments smaller than 8 MB are not used) which
+    are fetched concurrently, each on its own connection, into a partial download file
+    that has been preallocated to the full size. The journal then records the number
+    of verified bytes in each segment so that an interrupted segmented download is
+    also resumed segment by segment. When the server does not support Range requests
+    or does not report the size the download falls back to a single stream.
+
+    When url is a list of locations the download moves to the next location when it
+    fails, or when it is slower than config.download_min_rate bytes per second over
+    config.download_rate_window seconds, resuming from the bytes already downloaded
+    (the last location is used until the download succeeds or the retries run out).
+    A partial download from any of those locations is resumed. The validators of a
+    partial download only apply to the location it came from, the size of the file is
+    checked instead when it is resumed from another location.
+
+    When the download is complete the partial download file is renamed to dest and the
+    journal is removed. If dest already exists it is assumed to be a complete download
+    and it is returned without contacting the server. When validators is a dictionary
+    it is given the url, size, and ETag and Last-Modified validators of a download
+    completed here (it is left empty when dest was already there).
+
+    The partial download file is locked while it is being written so that only one
+    process at a time can be downloading to dest. Any other process waits for that
+    download to finish and then uses the result. Threads of the same process (e.g. the
+    prefetches of concurrent casaconfig.aio updates) wait for each other in the same way.
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - url (str or list of str) - The url to download, or the urls of the same file in the order that they should be used.
+       - dest (str) - The path of the downloaded file. The directory containing dest is created if necessary.
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages. Messages are always written to the terminal.
+       - retries (int=2) - The number of additional attempts to make, resuming where the previous attempt stopped, before giving up.
+       - timeout (float=400) - Timeout in seconds used when opening url and reading from it.
+       - segments (int=1) - The number of byte ranges to fetch concurrently when the server supports Range requests.
+       - validators (dict=None) - If not None, the url ('url'), size ('size'), ETag ('etag') and Last-Modified ('last_modified') of the completed download are added here.
+
+    Returns
+       - the path to the downloaded file (dest)
+
+    Raises
+       - casaconfig.RemoteError - raised when the download could not be completed. Any partial download is kept so that a later attempt can resume it.
+
+    """
+
+    import os
+    import sys
+    import json
+    import time
+    import fcntl
+    import threading
+    import collections
+    import urllib.error
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+
+    from casaconfig import RemoteError
+    from .print_log_messages import print_log_messages
+    from .transport import urlopen
+    from .call_controls import cancel_event, check_cancelled, abort_on_cancel
+    from .lock_info import progress_reporter
+    from .. import config as _config
+
+    if os.path.exists(dest):
+        return dest
+
+    # the locations to use in order, url is the one currently in use
+    urls = [url] if isinstance(url, str) else list(url)
+    url = urls[0]
+
+    part_path = dest + '.part'
+    journal_path = part_path + '.journal'
+
+    # read size for each chunk, the partial file is synced and the journal updated after sync_size bytes
+    chunk_size = 1024*1024
+    sync_size = 16*chunk_size
+    min_segment_size = 8*chunk_size
+
+    destdir = os.path.dirname(dest)
+    if len(destdir) > 0:
+        os.makedirs(destdir, exist_ok=True)
+
+    # guards the journal when segments are being fetched concurrently
+    journal_lock = threading.Lock()
+
+    # set if the caller (e.g. casaconfig.aio) cancels this download, checked after each chunk is written, a stream waiting for data is aborted
+    cancel = cancel_event()
+
+    # the progress is reported to the lock file when the caller holds the lock
+    report = progress_reporter()
+    name = os.path.basename(dest)
+
+    def report_progress(done, total):
+        if report is not None:
+            report.update('download', done, total, name)
+
+    def read_journal():
+        try:
+            with open(journal_path, 'r') as fid:
+                journal = json.load(fid)
+            if journal.get('url') in urls:
+                if journal['url'] != url:
+                    # resumed from a different location, its validators do not apply there, the size is checked instead
+                    journal['url'] = url
+                    journal['etag'] = None
+                    journal['last_modified'] = None
+                return journal
+        except:
+            pass
+        return None
+
+    class SlowDownload(OSError):
+        pass
+
+    class RateMonitor:
+        # watches the rate of the current attempt when there is another location to move to
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.reset()
+
+        def reset(self):
+            self.enabled = _config.download_min_rate > 0 and urls.index(url) < (len(urls)-1)
+            self.started = time.monotonic()
+            self.total = 0
+            self.samples = collections.deque([(self.started, 0)])
+            self.slow = False
+
+        def read_timeout(self):
+            # a read that gets nothing for the whole window is also too slow
+            return min(timeout, _config.download_rate_window) if self.enabled else timeout
+
+        def add(self, nbytes):
+            if not self.enabled:
+                return
+            with self.lock:
+                now = time.monotonic()
+                self.total += nbytes
+                self.samples.append((now, self.total))
+                # keep the newest sample that is at least the window old
+                while len(self.samples) > 1 and self.samples[1][0] <= (now - _config.download_rate_window):
+                    self.samples.popleft()
+                if (now - self.started) >= _config.download_rate_window:
+                    (then, done) = self.samples[0]
+                    if (self.total - done) < _config.download_min_rate * (now - then):
+                        self.slow = True
+                if self.slow:
+                    raise SlowDownload('slower than %d bytes per second' % _config.download_min_rate)
+
+    monitor = RateMonitor()
+
+    def write_journal(journal):
+        # write a new journal and then move it into place so the journal is never partially written
+        tmp_path = journal_path + '.tmp'
+        with open(tmp_path, 'w') as fid:
+            json.dump(journal, fid)
+            fid.flush()
+            os.fsync(fid.fileno())
+        os.replace(tmp_path, journal_path)
+
+    def sizeString(nbytes):
+        if nbytes is None:
+            return "unknown size"
+        return "%.0fM" % (nbytes/(1024*1024))
+
+    def announce(msg):
+        # use print directly to make use of the end argument
+        print(msg, file=sys.stdout, end="")
+        sys.stdout.flush()
+        if logger is not None: logger.post(msg, 'INFO')
+
+    def range_headers(start, end, journal):
+        headers = {'Range': 'bytes=%d-%s' % (start, '' if end is None else end)}
+        validator = journal['etag'] or journal['last_modified']
+        if validator is not None:
+            headers['If-Range'] = validator
+        return headers
+
+    def probe():
+        # ask for the first byte to learn if Range requests are supported and the total size
+        # returns (total, etag, last_modified), total is None if Range requests are not supported
+        with urlopen(url, headers={'Range': 'bytes=0-0'}, timeout=monitor.read_timeout()) as stream, abort_on_cancel(stream, cancel):
+            etag = stream.headers.get('etag')
+            last_modified = stream.headers.get('last-modified')
+            contentRange = stream.headers.get('content-range', '')
+            if stream.status == 206 and '/' in contentRange and contentRange.split('/')[-1].strip() != '*':
+                return (int(contentRange.split('/')[-1]), etag, last_modified)
+        return (None, etag, last_modified)
+
+    def fetch_single(journal):
+        # fetch everything after the verified bytes on a single stream, appending to the partial file
+        verified = journal['verified']
+        headers = {}
+        if verified > 0:
+            headers = range_headers(verified, None, journal)
+
+        with urlopen(url, headers=headers, timeout=monitor.read_timeout()) as stream, abort_on_cancel(stream, cancel):
+            if verified > 0 and stream.status == 206 and journal['size'] is not None:
+                contentRange = stream.headers.get('content-range', '')
+                if contentRange.split('/')[-1].strip() != str(journal['size']):
+                    # not the same file, start over
+                    print_log_messages('%s is not the same size as the partial download, starting over' % url, logger)
+                    stream.close()
+                    verified = 0
+                    part_fd.truncate(0)
+                    journal['verified'] = 0
+                    write_journal(journal)
+                    return fetch_single(journal)
+            if verified > 0 and stream.status != 206:
+                # the server did not honor the Range request (or the content has changed), start over
+                print_log_messages('server did not resume the partial download of %s, starting over' % url, logger)
+                verified = 0
+                part_fd.truncate(0)
+
+            total = None
+            if stream.status == 206:
+                # Content-Range : bytes start-end/total
+                contentRange = stream.headers.get('content-range', '')
+                if '/' in contentRange and contentRange.split('/')[-1].strip() != '*':
+                    total = int(contentRange.split('/')[-1])
+            else:
+                contentLength = int(stream.headers.get('content-length', 0))
+                if contentLength > 0:
+                    total = contentLength
+
+            journal['size'] = total
+            journal['etag'] = stream.headers.get('etag')
+            journal['last_modified'] = stream.headers.get('last-modified')
+            journal['verified'] = verified
+            write_journal(journal)
+
+            if verified > 0:
+                announce('resuming download of %s at %s of %s ... ' % (os.path.basename(dest), sizeString(verified), sizeString(total)))
+            else:
+                announce('downloading %s (%s) ... ' % (os.path.basename(dest), sizeString(total)))
+
+            unsynced = 0
+            try:
+                while True:
+                    check_cancelled(cancel)
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    part_fd.write(chunk)
+                    unsynced += len(chunk)
+                    report_progress(verified+unsynced, total)
+                    monitor.add(len(chunk))
+                    if unsynced >= sync_size:
+                        part_fd.flush()
+                        os.fsync(part_fd.fileno())
+                        verified += unsynced
+                        unsynced = 0
+                        journal['verified'] = verified
+                        write_journal(journal)
+            finally:
+                # everything written so far came from successful reads, record it so a later attempt can resume from here
+                part_fd.flush()
+                os.fsync(part_fd.fileno())
+                verified += unsynced
+                journal['verified'] = verified
+                write_journal(journal)
+
+        if total is not None and verified != total:
+            raise http.client.IncompleteRead(b'', total-verified)
+
+    def fetch_segment(journal, segment, write_fd):
+        # fetch the rest of one segment on its own connection, writing at the segment offsets in the partial file
+        # segment is [start, end, done] where end is inclusive and done is the number of verified bytes
+        start, end, done = segment
+        if start+done > end:
+            return
+        with urlopen(url, headers=range_headers(start+done, end, journal), timeout=monitor.read_timeout()) as stream, abort_on_cancel(stream, cancel):
+            if stream.status != 206:
+                # the content changed since the segments were laid out, this attempt can not continue
+                raise RemoteError("server stopped honoring Range requests for %s" % url)
+            if stream.headers.get('content-range', '').split('/')[-1].strip() != str(journal['size']):
+                raise RemoteError("%s is not the same size as the partial download" % url)
+            unsynced = 0
+            offset = start + done
+            try:
+                while offset <= end:
+                    check_cancelled(cancel)
+                    chunk = stream.read(min(chunk_size, end+1-offset))
+                    if not chunk:
+                        break
+                    os.pwrite(write_fd, chunk, offset)
+                    offset += len(chunk)
+                    unsynced += len(chunk)
+                    monitor.add(len(chunk))
+                    if unsynced >= sync_size:
+                        os.fsync(write_fd)
+                        with journal_lock:
+                            segment[2] += unsynced
+                            write_journal(journal)
+                            report_progress(sum([s[2] for s in journal['segments']]), journal['size'])
+                        unsynced = 0
+            finally:
+                os.fsync(write_fd)
+                with journal_lock:
+                    segment[2] += unsynced
+                    write_journal(journal)
+        if start+segment[2] <= end:
+            raise http.client.IncompleteRead(b'', end+1-start-segment[2])
+
+    def fetch_segmented(journal):
+        # fetch all of the unfinished segments concurrently
+        remaining = sum([(end+1-start-done) for (start, end, done) in journal['segments']])
+        verified = journal['size'] - remaining
+        if verified > 0:
+            announce('resuming download of %s at %s of %s using %s segments ... ' % (os.path.basename(dest), sizeString(verified), sizeString(journal['size']), len(journal['segments'])))
+        else:
+            announce('downloading %s (%s) using %s segments ... ' % (os.path.basename(dest), sizeString(journal['size']), len(journal['segments'])))
+        unfinished = [s for s in journal['segments'] if s[0]+s[2] <= s[1]]
+        with ThreadPoolExecutor(max_workers=max(1,len(unfinished))) as pool:
+            futures = [pool.submit(fetch_segment, journal, s, write_fd) for s in unfinished]
+            # wait for all of them so that the progress of every segment is in the journal, then report the first failure
+            errors = [f.exception() for f in futures]
+        for err in errors:
+            if err is not None:
+                raise err
+
+    # wait here if another thread of this process is downloading to this same location, before the partial
+    # download file is opened (closing another descriptor of that file would release the lock held on it)
+    with _dest_locks_lock:
+        dest_lock = _dest_locks.setdefault(os.path.abspath(dest), threading.Lock())
+    while not dest_lock.acquire(timeout=1.0):
+        check_cancelled(cancel)
+
+    try:
+        # the append mode means that all single stream writes go to the end of the file, after the verified bytes
+        part_fd = open(part_path, 'ab')
+        # segments are written in place through a descriptor without the append mode, it is kept open as long as part_fd
+        # (closing a descriptor of the partial download file would release the lock held on it)
+        write_fd = os.open(part_path, os.O_WRONLY)
+        try:
+            # wait here if someone else is downloading to this same location
+            fcntl.lockf(part_fd, fcntl.LOCK_EX)
+
+            if os.path.exists(dest):
+                # another process or thread finished this download while this one was waiting
+                if os.path.exists(part_path) and os.path.getsize(part_path) == 0:
+                    os.remove(part_path)
+                return dest
+
+            attempt = 0
+            while True:
+                try:
+                    monitor.reset()
+                    journal = read_journal()
+                    partSize = os.fstat(part_fd.fileno()).st_size
+
+                    if journal is None and segments > 1:
+                        # a new download, see if it can be split into segments
+                        (total, etag, last_modified) = probe()
+                        if total is not None and total >= 2*min_segment_size:
+                            nseg = int(min(segments, total // min_segment_size))
+                            segSize = total // nseg
+                            segList = []
+                            for i in range(nseg):
+                                start = i*segSize
+                                end = total-1 if i == (nseg-1) else (start+segSize-1)
+                                segList.append([start, end, 0])
+                            journal = {'url':url, 'size':total, 'etag':etag, 'last_modified':last_modified, 'segments':segList}
+                            # preallocate the full size, segments are written in place
+                            part_fd.truncate(0)
+                            part_fd.truncate(total)
+                            write_journal(journal)
+                        else:
+                            print_log_messages('%s can not be downloaded in segments, using a single stream' % url, logger)
+
+                    if journal is not None and 'segments' in journal:
+                        if partSize != journal['size']:
+                            # the partial file is not the preallocated size, the segment progress can not be trusted
+                            for s in journal['segments']:
+                                s[2] = 0
+                            part_fd.truncate(0)
+                            part_fd.truncate(journal['size'])
+                            write_journal(journal)
+                        fetch_segmented(journal)
+                    else:
+                        verified = 0
+                        if journal is not None:
+                            # bytes after the verified count may not have made it to the disk intact, don't trust them
+                            verified = min(journal.get('verified', 0), partSize)
+                        else:
+                            journal = {'url':url, 'size':None, 'etag':None, 'last_modified':None, 'verified':0}
+                        part_fd.truncate(verified)
+                        journal['verified'] = verified
+
+                        if journal['size'] is None or verified != journal['size']:
+                            fetch_single(journal)
+
+                    print("done", file=sys.stdout)
+                    break
+
+                except (urllib.error.URLError, http.client.HTTPException, OSError, RemoteError) as exc:
+                    print("", file=sys.stdout)
+                    # a cancelled download fails as its stream is aborted
+                    check_cancelled(cancel)
+                    if isinstance(exc, RemoteError) and os.path.exists(journal_path):
+                        # the content changed under a segmented download, the next attempt starts over
+                        os.remove(journal_path)
+                    if urls.index(url) < (len(urls)-1):
+                        # move to the next location, resuming from what has been downloaded so far
+                        nextURL = urls[urls.index(url)+1]
+                        print_log_messages('download of %s from %s %s (%s), continuing from %s' % (os.path.basename(dest), url, 'is too slow' if isinstance(exc, SlowDownload) else 'failed', str(exc), nextURL), logger)
+                        url = nextURL
+                        check_cancelled(cancel)
+                        continue
+                    attempt += 1
+                    if attempt > retries:
+                        msg = "Unable to download %s : %s. The partial download has been kept at %s and will be resumed by the next attempt." % (url, str(exc), part_path)
+                        raise RemoteError(msg) from None
+                    print_log_messages('download of %s interrupted (%s), retrying ...' % (url, str(exc)), logger)
+                    if cancel is not None:
+                        cancel.wait(min(30, 2**attempt))
+                        check_cancelled(cancel)
+                    else:
+                        time.sleep(min(30, 2**attempt))
+
+            # the download is complete, move it into place while still holding the lock
+            if validators is not None:
+                validators.update({'url':journal['url'], 'size':journal['size'], 'etag':journal['etag'], 'last_modified':journal['last_modified']})
+            os.replace(part_path, dest)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+
+        finally:
+            os.close(write_fd)
+            part_fd.close()
+    finally:
+        dest_lock.release()
+
+    return dest
@@ -0,0 +1,326 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+def extract_archive(archive, path, member_filter, logger=None, file_info=None, engine=None, installed=None):
+    """
+    Extract the tarball at archive into path using a pipeline of threads.
+
+    The stages of the pipeline are connected by bounded queues so that each stage
+    can work while the others do:
+
+       - a reader thread reads blocks of the (compressed) archive
+       - a decompressor thread decompresses those blocks (xz, gzip, bzip2, zstd or uncompressed), or feeds them to an external decompressor that can use several cores (see decompressors.py and config.extract_decompressor) while another thread reads its output
+       - the calling thread parses the tar stream and applies member_filter to each member
+       - a pool of writer threads (config.extract_writers) creates and writes the regular files, the file data waiting for them is kept within config.extract_inflight_bytes
+
+    The last two stages are done by an extraction engine (see extraction_engines.py and
+    config.extract_engine). Directories are created by the calling thread before any file
+    in them is handed to the writers. Any other type of member (e.g. links) is extracted by
+    the calling thread once all previously queued files have been written so that the member
+    order in the archive is preserved. Directory modes and times are set after everything
+    has been extracted, as tarfile does.
+
+    The time spent in each stage is measured and logged when the extraction is done
+    (printed only when there is no logger) so that the slowest stage can be identified.
+    The reader and decompressor wait times show how long those stages were blocked on a
+    full queue (the stages after them were slower). For an external decompressor the
+    decompress time is the time spent waiting for its output. The parse wait time shows how long
+    the calling thread was blocked waiting for decompressed data and the write wait time
+    shows how long it was blocked waiting for the writers. The write time is the sum over
+    all of the writer threads.
+
+    The whole archive is read even when the end of the tar archive comes first, so that a
+    failure anywhere in the pipeline (e.g. an external decompressor that exits with an error
+    or compressed data that end too soon) is raised even if a readable tar archive was
+    extracted before it.
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - archive (str) - the path to the tarball
+       - path (str) - the directory to extract into
+       - member_filter (function) - an extraction filter as used by tarfile (e.g. tarfile.data_filter). It is called with each member and path and returns the member to extract (possibly modified) or None to skip it.
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages.
+       - file_info (dict=None) - When not None, the size, modification time, and sha256 checksum of each extracted member are added to this dictionary as a tuple keyed by the (filtered) member name. The checksum is computed by the writer threads from the data being written and it is None for members that are not regular files.
+       - engine (str=None) - The extraction engine to use ('pipeline' or 'batched'), None uses config.extract_engine.
+       - installed (dict=None) - The (size, mtime, sha256) of the files already installed in path keyed by the (filtered) member name (see install_state.file_records). When given, a file that is installed and unchanged with the same contents as its member is not written again (see extraction_engines.py).
+
+    Returns
+       - a dictionary of the time in seconds spent in each stage ('read', 'read_wait', 'decompress', 'decompress_wait', 'parse', 'parse_wait', 'write_wait', 'write', and 'total'), the number of 'members' extracted, the 'decompressor' used (the name of the external tool, 'python' or None when not compressed), the extraction 'engine' used, the number of 'writers' and the number of installed files left 'unchanged'.
+
+    """
+
+    import os
+    import time
+    import queue
+    import threading
+    import tarfile
+    import subprocess
+
+    from .print_log_messages import print_log_messages
+    from .lock_info import progress_reporter
+    from .decompressors import compression_of, external_command, python_decompressor
+    from .extraction_engines import extraction_engine
+    from .. import config as _config
+
+    block_size = 1024*1024
+    queue_depth = 16
+
+    nwriters = _config.extract_writers
+    if nwriters is None or nwriters < 1:
+        # each file costs several round trips to the server of a network filesystem, more writers overlap more of them
+        from .lock_backends import filesystem_type
+        fstype = filesystem_type(path) or ''
+        nwriters = 16 if (fstype.startswith('nfs') or fstype in ('lustre', 'cifs', 'smb3', 'smbfs', 'gpfs', 'ceph', 'fuse.sshfs')) else 4
+
+    stats = {'read':0., 'read_wait':0., 'decompress':0., 'decompress_wait':0., 'parse':0., 'parse_wait':0., 'write_wait':0., 'write':0., 'total':0., 'members':0, 'decompressor':None, 'engine':None, 'writers':nwriters, 'unchanged':0}
+
+    # each stage adds to its own statistics, they are added to stats once all of the stages are done
+    read_stats = {'read':0., 'read_wait':0.}
+    decompress_stats = {'decompress':0., 'decompress_wait':0.}
+    parse_stats = {'parse_wait':0.}
+    engine_stats = {'parse':0., 'write_wait':0., 'write':0., 'members':0, 'unchanged':0}
+
+    # the engine turns the members of the tar stream into files, an unknown engine fails before anything is started
+    engine = extraction_engine(engine)(path, member_filter, file_info, engine_stats, nwriters, max(1, _config.extract_inflight_bytes), installed)
+    stats['engine'] = engine.name
+
+    # set when any stage fails so that the others stop instead of waiting on a queue
+    stop = threading.Event()
+    errors = []
+
+    # items on both queues are bytes, None at the end of the data
+    compressed = queue.Queue(maxsize=queue_depth)
+    decompressed = queue.Queue(maxsize=queue_depth)
+
+    def put(q, item, stage_stats, wait_key):
+        # put item on q, giving up if another stage has failed
+        t0 = time.perf_counter()
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        stage_stats[wait_key] += time.perf_counter() - t0
+
+    def get(q, stage_stats, wait_key):
+        t0 = time.perf_counter()
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                stage_stats[wait_key] += time.perf_counter() - t0
+                return item
+            except queue.Empty:
+                pass
+        stage_stats[wait_key] += time.perf_counter() - t0
+        return None
+
+    # the progress (the bytes of the archive read so far) is reported to the lock file when the caller holds the lock
+    report = progress_reporter()
+
+    def reader():
+        try:
+            with open(archive, 'rb') as fid:
+                archive_size = os.fstat(fid.fileno()).st_size
+                nread = 0
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    block = fid.read(block_size)
+                    read_stats['read'] += time.perf_counter() - t0
+                    if not block:
+                        break
+                    nread += len(block)
+                    if report is not None:
+                        report.update('extract', nread, archive_size, os.path.basename(archive))
+                    put(compressed, block, read_stats, 'read_wait')
+        except Exception as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            put(compressed, None, read_stats, 'read_wait')
+
+    def new_decompressor(block):
+        # identify the compression from the magic bytes at the start of the stream, None when it's an uncompressed tar stream
+        return python_decompressor(compression_of(block))
+
+    def decompress_here(block):
+        # decompress in this thread
+        decomp = new_decompressor(block)
+        if decomp is not None:
+            decompress_stats['decompressor'] = 'python'
+        while block is not None:
+            t0 = time.perf_counter()
+            outputs = []
+            while len(block) > 0:
+                if decomp is not None and decomp.eof:
+                    # concatenated compressed streams, start a new decompressor on the remainder
+                    decomp = new_decompressor(block)
+                    if decomp is None:
+                        # trailing padding after the last stream
+                        break
+                if decomp is None:
+                    # uncompressed
+                    outputs.append(block)
+                    break
+                outputs.append(decomp.decompress(block))
+                block = decomp.unused_data if decomp.eof else b''
+            decompress_stats['decompress'] += time.perf_counter() - t0
+            for out in outputs:
+                if len(out) > 0:
+                    put(decompressed, out, decompress_stats, 'decompress_wait')
+            block = get(compressed, decompress_stats, 'decompress_wait')
+        if decomp is not None and not getattr(decomp, 'eof', True) and not stop.is_set():
+            # the decompressor is still waiting for the rest of the stream
+            raise EOFError('%s ended before the end of its compressed data' % os.path.basename(archive))
+
+    def decompress_external(command, block):
+        # feed the compressed blocks to an external decompressor, its output is read by another thread
+        decompress_stats['decompressor'] = os.path.basename(command[0])
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # the output thread has its own statistics, added to those of this thread once it is done
+        output_stats = {'decompress':0., 'decompress_wait':0.}
+
+        def output():
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    out = proc.stdout.read1(block_size)
+                    output_stats['decompress'] += time.perf_counter() - t0
+                    if not out:
+                        break
+                    put(decompressed, out, output_stats, 'decompress_wait')
+            except Exception as exc:
+                errors.append(exc)
+                stop.set()
+
+        outThread = threading.Thread(target=output, daemon=True)
+        outThread.start()
+        try:
+            try:
+                while block is not None and not stop.is_set():
+                    proc.stdin.write(block)
+                    block = get(compressed, decompress_stats, 'decompress_wait')
+                proc.stdin.close()
+            except BrokenPipeError:
+                # the decompressor stopped early, its exit status says why
+                pass
+            if stop.is_set():
+                proc.kill()
+            outThread.join()
+            stderr = proc.stderr.read().decode(errors='replace').strip()
+            status = proc.wait()
+            if status != 0 and not stop.is_set():
+                raise RuntimeError('%s failed to decompress %s (exit status %d) : %s' % (' '.join(command), os.path.basename(archive), status, stderr))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            outThread.join()
+            for f in (proc.stdin, proc.stdout, proc.stderr):
+                try:
+                    f.close()
+                except (OSError, ValueError):
+                    pass
+            for (key, value) in output_stats.items():
+                decompress_stats[key] += value
+
+    def decompressor():
+        try:
+            block = get(compressed, decompress_stats, 'decompress_wait')
+            if block is not None:
+                command = external_command(compression_of(block))
+                if command is not None:
+                    decompress_external(command, block)
+                else:
+                    decompress_here(block)
+        except Exception as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            put(decompressed, None, decompress_stats, 'decompress_wait')
+
+    class QueueReader:
+        # a minimal read-only file object over the decompressed queue for use by tarfile in stream mode
+        def __init__(self):
+            self.block = b''
+            self.pos = 0
+            self.done = False
+
+        def read(self, size=-1):
+            chunks = []
+            n = 0
+            while size < 0 or n < size:
+                if self.pos >= len(self.block):
+                    if self.done:
+                        break
+                    block = get(decompressed, parse_stats, 'parse_wait')
+                    if block is None:
+                        self.done = True
+                        break
+                    self.block = block
+                    self.pos = 0
+                take = len(self.block) - self.pos
+                if size >= 0:
+                    take = min(take, size - n)
+                chunks.append(self.block[self.pos:self.pos+take])
+                self.pos += take
+                n += take
+            return b''.join(chunks)
+
+    tstart = time.perf_counter()
+    readThread = threading.Thread(target=reader, daemon=True)
+    decompThread = threading.Thread(target=decompressor, daemon=True)
+    readThread.start()
+    decompThread.start()
+
+    try:
+        stream = QueueReader()
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            # members handed to tar.extract have already been filtered
+            tar.extraction_filter = (lambda member, dest_path: member)
+            engine.extract(tar, lambda: parse_stats['parse_wait'])
+        # read what is left after the end of the tar archive (padding) so that the reader and decompressor
+        # finish the whole archive and any failure there (e.g. the exit status of an external decompressor) is seen
+        while stream.read(block_size):
+            pass
+        engine.finish()
+
+    except Exception:
+        # a failure in the reader or decompressor shows up here as a truncated tar stream, report the original failure
+        if len(errors) > 0:
+            raise errors[0] from None
+        raise
+
+    finally:
+        stop.set()
+        readThread.join()
+        decompThread.join()
+
+    # a failure in the reader or decompressor that ended the stream early may still have left a readable tar archive
+    if len(errors) > 0:
+        raise errors[0]
+
+    stats['decompressor'] = decompress_stats.pop('decompressor', None)
+    for stage_stats in (read_stats, decompress_stats, parse_stats, engine_stats):
+        for (key, value) in stage_stats.items():
+            stats[key] += value
+    stats['total'] = time.perf_counter() - tstart
+
+    msg = 'extraction of %s : %d members in %.1fs; read %.1fs (waited %.1fs), decompress %.1fs using %s (waited %.1fs), parse %.1fs (waited %.1fs on decompress, %.1fs on writers), write %.1fs over %d writers using the %s engine' % (os.path.basename(archive), stats['members'], stats['total'], stats['read'], stats['read_wait'], stats['decompress'], stats['decompressor'], stats['decompress_wait'], stats['parse'], stats['parse_wait'], stats['write_wait'], stats['write'], nwriters, stats['engine'])
+    if installed is not None:
+        msg += ', %d installed files unchanged' % stats['unchanged']
+    print_log_messages(msg, logger, verbose=1)
+
+    return stats
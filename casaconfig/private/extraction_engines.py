@@ -0,0 +1,486 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The engines used by extract_archive to turn the members of a tar stream into files.
+
+extract_archive reads and decompresses the tarball and opens the tar stream. An engine
+is given that stream and it filters each member (using the extraction filter of the
+caller, e.g. tarfile.data_filter) and creates what the filtered member describes under
+the extraction path. config.extract_engine selects the engine :
+
+   - 'pipeline' : each regular file is handed to a pool of writer threads (config.extract_writers) as it is found. The files are written with tarfile's usual per-file steps (open, write, chmod, utime by name).
+   - 'batched' : regular files are collected into batches that are handed to the writer threads, which reduces the per-file overhead for archives of many small files (e.g. casarundata). The data of each file is read directly from the tar stream. All of the directories of a batch are created together, each file is written with one unbuffered write and its time is set through the open file (its mode is given when it is created, it is only changed afterwards if the umask removed some of it). Directory modes and times are set at the end.
+
+In all engines the data of the files read from the stream but not yet written is kept
+within a budget of config.extract_inflight_bytes (the reading of the stream waits for the
+writers when it would go over that). A file larger than that budget is written by the
+calling thread as it is read. The writers overlap the round trips of creating and writing
+each file, which matters most on a network filesystem (e.g. NFS) where each of them waits on
+the server, see config.extract_writers.
+
+When the engine is given the records of the files already installed in the extraction
+path (installed, the size, modification time and sha256 checksum of each file from the
+install state, see install_state.py) a regular file whose size and checksum match its record,
+and which has not been changed since it was installed (its size and modification time on
+disk are as recorded), is not written again. Only its mode and time are updated if they
+differ. The checksum is computed from the data read from the stream, as it is for the
+file_info records, so the only extra cost is a stat of the installed file. A file larger
+than the budget is compared with the installed file as it is read and only written from
+the first difference on.
+
+In all engines directories are created before any file in them is written, any other
+type of member (e.g. links) is extracted by tarfile once all previously found files
+have been written so that the member order in the archive is preserved, and the
+directory modes and times are set after everything has been extracted, as tarfile does.
+
+A new engine subclasses ExtractionEngine and is added to ENGINES. tests/benchmark_extraction.py
+compares the members per second of the engines on a casarundata shaped archive.
+
+These are intended for internal casaconfig use.
+"""
+
+import threading
+
+class ByteBudget:
+    """
+    The bytes of file data read from the tar stream that have not yet been written, kept
+    within budget. Acquiring waits while that would go over budget, except that anything
+    can be acquired when nothing else is in flight.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.inflight = 0
+        self._cond = threading.Condition()
+
+    def available(self, nbytes):
+        """True if nbytes can be acquired now without waiting."""
+        with self._cond:
+            return self.inflight == 0 or (self.inflight + nbytes) <= self.budget
+
+    def acquire(self, nbytes):
+        with self._cond:
+            while self.inflight > 0 and (self.inflight + nbytes) > self.budget:
+                self._cond.wait()
+            self.inflight += nbytes
+
+    def release(self, nbytes):
+        with self._cond:
+            self.inflight -= nbytes
+            self._cond.notify_all()
+
+class ExtractionEngine:
+    """
+    The interface of an extraction engine. An engine is used for one extraction.
+
+    Parameters
+       - path (str) - the directory to extract into
+       - member_filter (function) - the extraction filter, called with each member and path, returns the member to extract or None
+       - file_info (dict) - when not None the size, modification time and sha256 checksum (None when not a regular file) of each extracted member are added by (filtered) member name
+       - stats (dict) - the extraction statistics, the engine adds to 'parse', 'write_wait', 'write' and 'members'
+       - nwriters (int) - the number of writer threads to use
+       - inflight_bytes (int) - the budget for the file data read but not yet written
+       - installed (dict=None) - the (size, mtime, sha256) of the files already installed in path keyed by the (filtered) member name, unchanged files are not written again
+    """
+
+    name = None
+
+    def __init__(self, path, member_filter, file_info, stats, nwriters, inflight_bytes, installed=None):
+        self.path = path
+        self.member_filter = member_filter
+        self.file_info = file_info
+        self.stats = stats
+        self.nwriters = nwriters
+        self.budget = ByteBudget(inflight_bytes)
+        self.installed = installed
+        self.stats_lock = threading.Lock()
+        # the time spent waiting for the decompressed stream so far, set by extract
+        self.parse_wait = lambda: 0.
+        self.directories = []
+        self.made_dirs = set()
+
+    def extract(self, tar, parse_wait):
+        """
+        Extract all of the members of tar (a tarfile opened in stream mode). parse_wait
+        returns the time so far spent waiting for the decompressed stream, it is not
+        counted as parse time.
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Set the directory modes and times, deepest first, once everything has been
+        extracted (extracting into them changes their times).
+        """
+        import os
+
+        self.directories.sort(key=lambda m: m.name, reverse=True)
+        for member in self.directories:
+            dirpath = os.path.join(self.path, member.name)
+            if member.mode is not None:
+                os.chmod(dirpath, member.mode)
+            if member.mtime is not None:
+                os.utime(dirpath, (member.mtime, member.mtime))
+
+    def make_directory(self, member, targetpath):
+        import os
+
+        os.makedirs(targetpath, exist_ok=True)
+        self.made_dirs.add(targetpath)
+        self.directories.append(member)
+
+    def extract_other(self, tar, member):
+        # links and anything else are extracted by tarfile, the caller has waited for everything before them
+        tar.extract(member, path=self.path)
+        if self.file_info is not None and not member.isdir():
+            self.file_info[member.name] = (member.size, member.mtime, None)
+
+    def installed_copy(self, member, targetpath, sha=None):
+        """
+        The os.stat_result of targetpath if it is the installed file recorded for member with
+        the size of member (and the checksum sha when given) and it has not been changed since
+        it was installed, otherwise None.
+        """
+        import os
+        import stat
+
+        record = self.installed.get(member.name) if self.installed is not None else None
+        if record is None or record[0] != member.size or (sha is not None and record[2] != sha):
+            return None
+        try:
+            st = os.lstat(targetpath)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode) or st.st_size != record[0] or st.st_mtime != record[1]:
+            return None
+        return st
+
+    def keep_installed(self, member, targetpath, st):
+        # the installed file at targetpath already has the contents of member, only its mode and time may differ
+        import os
+        import stat
+
+        if member.mode is not None and stat.S_IMODE(st.st_mode) != (member.mode & 0o7777):
+            os.chmod(targetpath, member.mode)
+        if member.mtime is not None and st.st_mtime != member.mtime:
+            os.utime(targetpath, (member.mtime, member.mtime))
+        with self.stats_lock:
+            self.stats['unchanged'] += 1
+
+    def add_write_time(self, seconds):
+        with self.stats_lock:
+            self.stats['write'] += seconds
+
+    def make_parent(self, targetpath):
+        import os
+
+        parent = os.path.dirname(targetpath)
+        if parent not in self.made_dirs:
+            os.makedirs(parent, exist_ok=True)
+            self.made_dirs.add(parent)
+
+    def write_streamed(self, tar, member, targetpath):
+        # a file too large for the budget, written here as it is read from the stream
+        import os
+        import time
+        import hashlib
+
+        t0 = time.perf_counter()
+        wait0 = self.parse_wait()
+        self.make_parent(targetpath)
+        source = tar.extractfile(member)
+        sha = hashlib.sha256()
+        # an unchanged installed copy is compared as the data are read, it is written from the first difference on
+        st = self.installed_copy(member, targetpath)
+        same = st is not None
+        with open(targetpath, 'r+b' if same else 'wb') as fid:
+            offset = 0
+            while True:
+                chunk = source.read(1024*1024)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                if same:
+                    if fid.read(len(chunk)) == chunk:
+                        offset += len(chunk)
+                        continue
+                    same = False
+                    fid.seek(offset)
+                fid.write(chunk)
+                offset += len(chunk)
+            fid.truncate()
+        if same:
+            self.keep_installed(member, targetpath, st)
+        else:
+            if member.mode is not None:
+                os.chmod(targetpath, member.mode)
+            if member.mtime is not None:
+                os.utime(targetpath, (member.mtime, member.mtime))
+        if self.file_info is not None:
+            self.file_info[member.name] = (member.size, member.mtime, sha.hexdigest())
+        # the time spent waiting for the data to be decompressed is already counted as parse wait
+        elapsed = (time.perf_counter() - t0) - (self.parse_wait() - wait0)
+        self.add_write_time(elapsed)
+        # this thread was writing instead of parsing
+        self.stats['write_wait'] += elapsed
+
+class PipelineEngine(ExtractionEngine):
+    """Each regular file is handed to the writer threads as it is found."""
+
+    name = 'pipeline'
+
+    def write_member(self, member, targetpath, data):
+        import os
+        import time
+        import hashlib
+
+        t0 = time.perf_counter()
+        sha = hashlib.sha256(data).hexdigest() if (self.file_info is not None or self.installed is not None) else None
+        st = self.installed_copy(member, targetpath, sha) if self.installed is not None else None
+        if st is not None:
+            self.keep_installed(member, targetpath, st)
+        else:
+            with open(targetpath, 'wb') as fid:
+                fid.write(data)
+            if member.mode is not None:
+                os.chmod(targetpath, member.mode)
+            if member.mtime is not None:
+                os.utime(targetpath, (member.mtime, member.mtime))
+        if self.file_info is not None:
+            self.file_info[member.name] = (len(data), member.mtime, sha)
+        self.add_write_time(time.perf_counter() - t0)
+
+    def extract(self, tar, parse_wait):
+        import os
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        stats = self.stats
+        # limits the number of files waiting to be written
+        inflight = threading.BoundedSemaphore(4*self.nwriters)
+        pending = []
+
+        def drain():
+            # wait for all queued writes, raising the first write error
+            for f in pending:
+                f.result()
+            pending.clear()
+
+        def release(future, nbytes):
+            inflight.release()
+            self.budget.release(nbytes)
+
+        self.parse_wait = parse_wait
+        t0 = time.perf_counter()
+        wait0 = parse_wait()
+        with ThreadPoolExecutor(max_workers=self.nwriters) as pool:
+            for member in tar:
+                member = self.member_filter(member, self.path)
+                if member is None:
+                    continue
+                targetpath = os.path.join(self.path, member.name)
+                if member.isdir():
+                    self.make_directory(member, targetpath)
+                elif member.isreg() and member.size > self.budget.budget:
+                    self.write_streamed(tar, member, targetpath)
+                elif member.isreg():
+                    self.make_parent(targetpath)
+                    # wait for room before reading the data
+                    tw = time.perf_counter()
+                    inflight.acquire()
+                    self.budget.acquire(member.size)
+                    stats['write_wait'] += time.perf_counter() - tw
+                    data = tar.extractfile(member).read()
+                    future = pool.submit(self.write_member, member, targetpath, data)
+                    future.add_done_callback(lambda f, nbytes=member.size: release(f, nbytes))
+                    pending.append(future)
+                    # don't let the list of finished writes grow without limit
+                    if len(pending) > 64*self.nwriters:
+                        done = [f for f in pending if f.done()]
+                        for f in done:
+                            f.result()
+                            pending.remove(f)
+                else:
+                    # links and anything else are extracted in order after everything before them has been written
+                    tw = time.perf_counter()
+                    drain()
+                    stats['write_wait'] += time.perf_counter() - tw
+                    self.extract_other(tar, member)
+                stats['members'] += 1
+            tw = time.perf_counter()
+            drain()
+            stats['write_wait'] += time.perf_counter() - tw
+        stats['parse'] += (time.perf_counter() - t0) - (parse_wait() - wait0) - stats['write_wait']
+
+class BatchedEngine(ExtractionEngine):
+    """Regular files are written in batches by the writer threads, see the module documentation."""
+
+    name = 'batched'
+
+    # a batch is handed to the writers when it has this many files or this many bytes
+    batch_files = 256
+    batch_bytes = 8*1024*1024
+
+    def __init__(self, path, member_filter, file_info, stats, nwriters, inflight_bytes, installed=None):
+        import os
+
+        super().__init__(path, member_filter, file_info, stats, nwriters, inflight_bytes, installed)
+        # the umask is needed to know if the mode given to os.open is the mode the file gets
+        umask = os.umask(0)
+        os.umask(umask)
+        self.umask = umask
+
+    def read_data(self, tar, member):
+        # the data of a regular member, read directly from the tar stream when it is at the start of that data
+        stream = tar.fileobj
+        if not member.issparse() and hasattr(stream, 'tell') and stream.tell() == member.offset_data:
+            data = stream.read(member.size)
+            if len(data) == member.size:
+                return data
+            import tarfile
+            raise tarfile.ReadError('unexpected end of data')
+        return tar.extractfile(member).read()
+
+    def write_batch(self, batch):
+        import os
+        import time
+        import hashlib
+
+        t0 = time.perf_counter()
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_CLOEXEC', 0)
+        info = {}
+        for (member, targetpath, data) in batch:
+            sha = hashlib.sha256(data).hexdigest() if (self.file_info is not None or self.installed is not None) else None
+            st = self.installed_copy(member, targetpath, sha) if self.installed is not None else None
+            if st is not None:
+                self.keep_installed(member, targetpath, st)
+                if self.file_info is not None:
+                    info[member.name] = (len(data), member.mtime, sha)
+                continue
+            mode = 0o666 if member.mode is None else member.mode
+            fd = os.open(targetpath, flags, mode)
+            try:
+                view = memoryview(data)
+                while len(view) > 0:
+                    view = view[os.write(fd, view):]
+                if member.mode is not None and ((member.mode & self.umask) != 0 or (member.mode & ~0o777) != 0):
+                    # the umask removed part of the mode, or it has bits that are not set when the file is created
+                    os.chmod(fd, member.mode)
+                if member.mtime is not None:
+                    os.utime(fd, (member.mtime, member.mtime))
+            finally:
+                os.close(fd)
+            if self.file_info is not None:
+                info[member.name] = (len(data), member.mtime, sha)
+        if self.file_info is not None:
+            self.file_info.update(info)
+        self.add_write_time(time.perf_counter() - t0)
+
+    def extract(self, tar, parse_wait):
+        import os
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        stats = self.stats
+        # limits the number of batches waiting to be written
+        inflight = threading.BoundedSemaphore(2*self.nwriters)
+        pending = []
+        batch = []
+        batch_dirs = set()
+        batch_size = 0
+
+        def submit(pool):
+            # create the directories of this batch and hand it to the writers
+            nonlocal batch, batch_dirs, batch_size
+            for d in sorted(batch_dirs - self.made_dirs):
+                os.makedirs(d, exist_ok=True)
+            self.made_dirs.update(batch_dirs)
+            batch_dirs = set()
+            if len(batch) == 0:
+                return
+            tw = time.perf_counter()
+            inflight.acquire()
+            stats['write_wait'] += time.perf_counter() - tw
+            future = pool.submit(self.write_batch, batch)
+            future.add_done_callback(lambda f, nbytes=batch_size: (inflight.release(), self.budget.release(nbytes)))
+            pending.append(future)
+            done = [f for f in pending if f.done()]
+            for f in done:
+                f.result()
+                pending.remove(f)
+            batch = []
+            batch_size = 0
+
+        def drain(pool):
+            # write everything found so far, raising the first write error
+            submit(pool)
+            tw = time.perf_counter()
+            for f in pending:
+                f.result()
+            pending.clear()
+            stats['write_wait'] += time.perf_counter() - tw
+
+        self.parse_wait = parse_wait
+        t0 = time.perf_counter()
+        wait0 = parse_wait()
+        with ThreadPoolExecutor(max_workers=self.nwriters) as pool:
+            for member in tar:
+                member = self.member_filter(member, self.path)
+                if member is None:
+                    continue
+                targetpath = os.path.join(self.path, member.name)
+                if member.isdir():
+                    # created with the next batch unless something else needs it first
+                    batch_dirs.add(targetpath)
+                    self.directories.append(member)
+                elif member.isreg() and member.size > self.budget.budget:
+                    submit(pool)
+                    self.write_streamed(tar, member, targetpath)
+                elif member.isreg():
+                    if len(batch) > 0 and not self.budget.available(member.size):
+                        # the data in this batch can only be released once it is written
+                        submit(pool)
+                    tw = time.perf_counter()
+                    self.budget.acquire(member.size)
+                    stats['write_wait'] += time.perf_counter() - tw
+                    batch_dirs.add(os.path.dirname(targetpath))
+                    data = self.read_data(tar, member)
+                    batch.append((member, targetpath, data))
+                    batch_size += len(data)
+                    if len(batch) >= self.batch_files or batch_size >= self.batch_bytes:
+                        submit(pool)
+                else:
+                    # links and anything else are extracted in order after everything before them has been written
+                    drain(pool)
+                    self.extract_other(tar, member)
+                stats['members'] += 1
+            drain(pool)
+        stats['parse'] += (time.perf_counter() - t0) - (parse_wait() - wait0) - stats['write_wait']
+
+ENGINES = {engine.name:engine for engine in (PipelineEngine, BatchedEngine)}
+
+def extraction_engine(name=None):
+    """
+    Return the engine class for name (config.extract_engine when name is None).
+
+    Raises
+       - ValueError - raised when name is not a known engine
+    """
+    from .. import config as _config
+
+    if name is None:
+        name = _config.extract_engine
+    if name not in ENGINES:
+        raise ValueError("unknown extraction engine : %s, expected one of %s" % (name, ', '.join("'%s'" % e for e in ENGINES)))
+    return ENGINES[name]
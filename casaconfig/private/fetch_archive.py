@@ -0,0 +1,123 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+def fetch_archive(url_root, name, logger=None, download_dir=None):
+    """
+    Fetch the named archive (a casarundata or measures tarball) found at url_root
+    and return the path to the local copy. The url_root may be a list of locations of
+    the same archive (see data_urls.py) in the order that they should be used.
+
+    The archive cache (see archive_cache.py) is checked first. If the archive is
+    already there (fetched earlier by this user or, for a shared archive cache, by
+    any other user) then that copy is used and nothing is downloaded, unless the data
+    host now reports a different ETag or Last-Modified for the url it was downloaded
+    from (a tarball replaced under the same name). That check is a HEAD request limited
+    to config.network_probe_timeout seconds, the cached copy is used if it fails.
+
+    An archive at a local location (a file:// url, e.g. a staged copy on a shared filesystem)
+    is used where it is. It is not copied into the archive cache.
+
+    Otherwise the archive is downloaded into the archive cache directory using
+    download_file. The number of byte ranges fetched concurrently is set by
+    config.download_segments. An interrupted download is resumed by the next call
+    to fetch the same archive. When download_dir is given (a staging directory, see
+    publish.py) and the archive cache does not keep archives (config.archive_cache_size
+    is 0) the archive is downloaded there instead. When there is more than one location, a location that can
+    not be resolved is skipped and download_file moves the download to the next location
+    if it fails or becomes too slow. Nothing in measurespath is changed here so a failure
+    while fetching an archive leaves any installed data untouched.
+
+    The caller must use release_archive once the archive has been installed so that
+    the archive cache is kept within its size budget.
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - url_root (str or list of str) - The location of the archive (e.g. https://go.nrao.edu/casarundata) or the locations to use in order. Any redirect at these locations is followed.
+       - name (str) - The filename of the archive at url_root (the casarundata or measures version).
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages. Messages are always written to the terminal.
+       - download_dir (str=None) - Where to download the archive when it is not kept in the archive cache.
+
+    Returns
+       - the path to the local copy of the archive (in the archive cache, download_dir or at a local location)
+
+    Raises
+       - casaconfig.RemoteError - raised when the archive could not be fetched
+
+    """
+
+    import os
+    import urllib.error
+
+    from casaconfig import RemoteError
+    from .download_file import download_file
+    from .archive_cache import archive_cache_dir, cached_archive, add_archive, archive_record, remove_archive
+    from .print_log_messages import print_log_messages
+    from .transport import resolve, urlopen
+    from .data_urls import local_path
+    from .. import config as _config
+
+    archive = cached_archive(name)
+    if archive is not None:
+        record = archive_record(archive) or {}
+        if record.get('url') is not None and (record.get('etag') or record.get('last_modified')):
+            try:
+                with urlopen(record['url'], method='HEAD', timeout=_config.network_probe_timeout) as response:
+                    upstream = (response.headers.get('etag'), response.headers.get('last-modified'))
+            except Exception:
+                # unable to check, the cached copy is used
+                upstream = None
+            if upstream is not None and upstream != (record.get('etag'), record.get('last_modified')):
+                print_log_messages('%s has changed at %s, the cached copy will not be used' % (name, record['url']), logger, verbose=1)
+                remove_archive(archive)
+                archive = None
+        if archive is not None:
+            print_log_messages('using cached copy of %s at %s' % (name, archive), logger)
+            return archive
+
+    url_roots = [url_root] if isinstance(url_root, str) else list(url_root)
+
+    # an archive on a local or shared filesystem is read where it is
+    for root in url_roots:
+        rootPath = local_path(root)
+        if rootPath is not None and os.path.isfile(os.path.join(rootPath, name)):
+            archive = os.path.join(rootPath, name)
+            print_log_messages('using %s' % archive, logger)
+            return archive
+
+    if download_dir is not None and _config.archive_cache_size == 0:
+        dest = os.path.join(download_dir, name)
+    else:
+        dest = os.path.join(archive_cache_dir(), name)
+
+    dataURLs = []
+    for root in url_roots:
+        try:
+            # need to first resolve the url_root (e.g. go.nrao.edu) to find the actual data URL, this is remembered for later use
+            dataURLroot = resolve(root, timeout=400)
+        except urllib.error.URLError as urlerr:
+            if len(url_roots) == 1:
+                raise RemoteError("Unable to resolve the location of %s at %s : %s" % (name, root, str(urlerr))) from None
+            print_log_messages('unable to resolve %s (%s), it will not be used for %s' % (root, str(urlerr), name), logger, verbose=1)
+            continue
+        dataURLs.append(os.path.join(dataURLroot, name))
+    if len(dataURLs) == 0:
+        raise RemoteError("Unable to resolve any of the locations of %s : %s" % (name, ', '.join(url_roots)))
+
+    validators = {}
+    download_file(dataURLs[0] if len(dataURLs) == 1 else dataURLs, dest, logger, segments=_config.download_segments, validators=validators)
+    if _config.archive_cache_size > 0:
+        add_archive(dest, validators)
+
+    return dest
@@ -0,0 +1,154 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+def fetch_catalog(name, url, link_filter, what, logger=None, use_mirror=True):
+    """
+    Return the sorted list of versions (the links in the directory listing at url that
+    pass link_filter) using the catalog of those versions saved in cachedir when possible.
+
+    The catalog (name + '.json' in the catalogs directory in config.cachedir) records, for
+    each location the listing was found at, the versions along with the ETag and
+    Last-Modified headers of that listing and when it was last checked. The catalog does
+    not depend on which of the locations is used first (that can change as the locations
+    are probed, see data_urls.py).
+
+       - a catalog checked (at any location) less than config.catalog_ttl seconds ago is used as is
+       - otherwise the listing is requested using If-None-Match and If-Modified-Since from the catalog for url. A 304 (not modified) response means the catalog is still current and only the time it was checked is updated. Any other response is parsed and saved as the catalog for url
+       - a listing on a local or shared filesystem (a file:// url) does not need the network
+       - if there is no network, or the listing can not be fetched, the most recently checked catalog is used regardless of its age
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - name (str) - the name of the catalog (e.g. 'casarundata')
+       - url (str) - the location of the directory listing
+       - link_filter (function) - called with each href value in the listing, returns True if it is a version to be included
+       - what (str) - describes the versions in any messages (e.g. 'casarundata versions')
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages.
+       - use_mirror (bool=True) - passed to have_network, False when the catalog is for the mirror itself (see serve.py).
+
+    Returns
+       list - version names returned as list of strings, earliest first
+
+    Raises
+       - casaconfig.NoNetwork - Raised where there is no network seen and there is no saved catalog
+       - casaconfig.RemoteError - Raised when the listing could not be fetched for some reason other than no network and there is no saved catalog
+
+    """
+
+    import os
+    import json
+    import time
+    import html.parser
+    import urllib.error
+
+    from casaconfig import RemoteError
+    from casaconfig import NoNetwork
+
+    from .have_network import have_network
+    from .data_urls import is_local
+    from .print_log_messages import print_log_messages
+    from .transport import urlopen
+    from .. import config as _config
+
+    catalogdir = os.path.join(os.path.abspath(os.path.expanduser(_config.cachedir)), 'catalogs')
+    catalog_path = os.path.join(catalogdir, name + '.json')
+
+    catalogs = {}
+    try:
+        with open(catalog_path, 'r') as fid:
+            catalogs = json.load(fid)['urls']
+        catalogs = {u:c for (u, c) in catalogs.items() if isinstance(c.get('versions'), list)}
+    except:
+        # no catalog or it can't be used
+        catalogs = {}
+
+    # the catalog for url, for the conditional request, and the most recently checked catalog
+    catalog = catalogs.get(url)
+    latest = None
+    if len(catalogs) > 0:
+        latest = max(catalogs.values(), key=lambda c: c.get('checked', 0))
+
+    def save(catalog):
+        catalogs[url] = catalog
+        try:
+            os.makedirs(catalogdir, exist_ok=True)
+            tmp_path = catalog_path + '.%s.tmp' % os.getpid()
+            with open(tmp_path, 'w') as fid:
+                json.dump({'urls':catalogs}, fid)
+            os.replace(tmp_path, catalog_path)
+        except OSError:
+            # not being able to save the catalog is not an error, it will be fetched again next time
+            pass
+
+    if latest is not None and (time.time() - latest.get('checked', 0)) < _config.catalog_ttl:
+        return latest['versions']
+
+    if not is_local(url) and not have_network(use_mirror):
+        if latest is not None:
+            print_log_messages('No network, using the list of %s found on %s' % (what, time.strftime('%Y-%m-%d %H:%M', time.localtime(latest.get('checked', 0)))), logger, verbose=1)
+            return latest['versions']
+        raise NoNetwork("No network, can not find the list of available data.")
+
+    class LinkParser(html.parser.HTMLParser):
+        def reset(self):
+            super().reset()
+            self.rundataList = []
+
+        def handle_starttag(self, tag, attrs):
+            if tag == 'a':
+                for (attrname, value) in attrs:
+                    if attrname == 'href' and value is not None and link_filter(value):
+                        # only add it to the list if it's not already there
+                        if (value not in self.rundataList):
+                            self.rundataList.append(value)
+
+    headers = {}
+    if catalog is not None:
+        if catalog.get('etag'):
+            headers['If-None-Match'] = catalog['etag']
+        if catalog.get('last_modified'):
+            headers['If-Modified-Since'] = catalog['last_modified']
+
+    try:
+        with urlopen(url, headers=headers, timeout=400) as urlstream:
+            parser = LinkParser()
+            encoding = urlstream.headers.get_content_charset() or 'UTF-8'
+            for line in urlstream:
+                parser.feed(line.decode(encoding))
+            etag = urlstream.headers.get('ETag')
+            last_modified = urlstream.headers.get('Last-Modified')
+
+    except urllib.error.HTTPError as httperr:
+        if httperr.code == 304 and catalog is not None:
+            # not modified, the catalog is current
+            catalog['checked'] = time.time()
+            save(catalog)
+            return catalog['versions']
+        if latest is not None:
+            print_log_messages('Unable to retrieve list of available %s (%s), using the list found earlier' % (what, str(httperr)), logger, verbose=1)
+            return latest['versions']
+        raise RemoteError("Unable to retrieve list of available %s : %s" % (what, str(httperr))) from None
+
+    except urllib.error.URLError as urlerr:
+        if latest is not None:
+            print_log_messages('Unable to retrieve list of available %s (%s), using the list found earlier' % (what, str(urlerr)), logger, verbose=1)
+            return latest['versions']
+        raise RemoteError("Unable to retrieve list of available %s : %s" % (what, str(urlerr))) from None
+
+    # sorted, earliest versions are first, newest is last
+    versions = sorted(parser.rundataList)
+    save({'versions':versions, 'etag':etag, 'last_modified':last_modified, 'checked':time.time()})
+
+    return versions
@@ -15,6 +15,13 @@
 this module will be included in the api
 """
 
+# the casarundata and measures results by (path, type) along with the signature of path used to validate them
+_info_cache = {}
+
+# the release information does not change while casaconfig is in use, it is read once
+_release_info = None
+_release_read = False
+
 def get_data_info(path=None, logger=None, type=None):
     """
     Get the summary information on the 3 types of data managed by casaconfig.
@@ -70,6 +77,11 @@ def get_data_info(path=None, logger=None, type=None):
     If path has not been set (has a value of None) then the returned value will be None. This
     likely means that a casasiteconfig.py exists but has not yet been edited to set measurespath.
 
+    The 'casarundata' and 'measures' results are remembered for each path and type. They are
+    reused as long as path, the readme.txt files for both types, and the lock file in path
+    have not changed (as seen by os.stat) since the results were found. The age is always
+    computed for the current time. The release information is read once.
+
     Parameters
        - path (str) - Folder path to find the casarundata and measures data information. If not set then config.measurespath is used.
        - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages. Default None writes messages to the terminal.
@@ -84,6 +96,8 @@ def get_data_info(path=None, logger=None, type=None):
 
     """
 
+    global _release_info, _release_read
+
     result = None
 
     import os
@@ -91,6 +105,9 @@ def get_data_info(path=None, logger=None, type=None):
     import importlib.resources
     from .print_log_messages import print_log_messages
     from .read_readme import read_readme
+    from .staged_install import STAGING_PREFIX, RETIRED_PREFIX
+    from .install_state import STATE_DB_NAME, installed_state
+    from .lock_info import LOCK_NAME
     
     from casaconfig import UnsetMeasurespath
 
@@ -114,10 +131,42 @@ def get_data_info(path=None, logger=None, type=None):
 
     # casarundata and measures 
 
-    if os.path.isdir(path) and (len(os.listdir(path))>0):
-        # if the only thing at path is the lock file then proceed as if path is empty - skip this section
-        pathfiles = os.listdir(path)
-        if len(pathfiles) == 1 and pathfiles[0] == "data_update.lock":
+    # the results depend only on these, a change in any of them (or a change in what's at the top of path) means they need to be found again
+    cached = None
+    if type != 'release':
+        sigPaths = [path, os.path.join(path,'readme.txt'), os.path.join(path,'geodetic/readme.txt'), os.path.join(path,'data_update.lock')]
+        signature = []
+        for sigPath in sigPaths:
+            try:
+                st = os.stat(sigPath)
+                signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        signature = tuple(signature)
+
+        cached = _info_cache.get((path, type))
+        if cached is not None and cached[0] != signature:
+            cached = None
+
+    if cached is not None:
+        # copies of the remembered results with the age as of now
+        for (dataType, sigIndex) in [('casarundata', 1), ('measures', 2)]:
+            dataInfo = cached[1][dataType]
+            if dataInfo is not None:
+                dataInfo = dict(dataInfo)
+                if dataInfo.get('manifest') is not None:
+                    dataInfo['manifest'] = list(dataInfo['manifest'])
+                if dataInfo['age'] is not None:
+                    dataInfo['age'] = (currentTime - signature[sigIndex][2] / 1.e9) / secondsPerDay
+            result[dataType] = dataInfo
+
+    elif type != 'release' and os.path.isdir(path):
+        # if path is empty or the only thing at path is the lock file then proceed as if path is empty - skip this section
+        # the staging and retired directories used by a staged install in progress and the install state database are ignored
+        pathfiles = [f for f in os.listdir(path) if not (f.startswith(STAGING_PREFIX) or f.startswith(RETIRED_PREFIX) or f.startswith(STATE_DB_NAME))]
+        # the lock file and anything the lock backend uses next to it is also ignored here
+        pathfiles = [f for f in pathfiles if not f.startswith(LOCK_NAME)]
+        if len(pathfiles) == 0:
             pass
         else:
             # there's something at path, look for the casarundata readme
@@ -126,7 +175,12 @@ def get_data_info(path=None, logger=None, type=None):
                 if os.path.exists(datareadme_path):
                     # the readme exists, get the info
                     result['casarundata'] = {'version':'error', 'date':'', 'manifest':[], 'age':None}
-                    readmeContents = read_readme(datareadme_path)
+                    # use the install state if it matches the readme, otherwise read the readme
+                    state = installed_state(path, 'casarundata', manifest=True)
+                    if state is not None:
+                        readmeContents = {'version':state['version'], 'date':state['date'], 'extra':state['manifest']}
+                    else:
+                        readmeContents = read_readme(datareadme_path)
                     if readmeContents is not None:
                         currentAge = (currentTime - os.path.getmtime(datareadme_path)) / secondsPerDay
                         currentVersion = readmeContents['version']
@@ -154,7 +208,9 @@ def get_data_info(path=None, logger=None, type=None):
                 if os.path.exists(measuresreadme_path):
                     # the readme exists, get the info
                     result['measures'] = {'version':'error', 'date':'', 'age':None}
-                    readmeContents = read_readme(measuresreadme_path)
+                    readmeContents = installed_state(path, 'measures')
+                    if readmeContents is None:
+                        readmeContents = read_readme(measuresreadme_path)
                     if readmeContents is not None:
                         currentVersion = readmeContents['version']
                         currentDate = readmeContents['date']
@@ -169,8 +225,24 @@ def get_data_info(path=None, logger=None, type=None):
                         # probably not measuresdata
                         result['measures'] = {'version':'invalid', 'date':'', 'age':None}
 
-    if type is None or type=='release':
-        # release data versions
+    if type != 'release' and cached is None:
+        # remember copies of these results
+        remembered = {}
+        for dataType in ['casarundata', 'measures']:
+            dataInfo = result[dataType]
+            if dataInfo is not None:
+                dataInfo = dict(dataInfo)
+                if dataInfo.get('manifest') is not None:
+                    dataInfo['manifest'] = list(dataInfo['manifest'])
+            remembered[dataType] = dataInfo
+        _info_cache[(path, type)] = (signature, remembered)
+
+    if (type is None or type=='release') and _release_read:
+        result['release'] = None if _release_info is None else dict(_release_info)
+
+    elif type is None or type=='release':
+        # release data versions, only read once
+        _release_read = True
         if importlib.resources.is_resource('casaconfig','release_data_readme.txt'):
             try:
                 casarundataVersion = None
@@ -213,6 +285,7 @@ def get_data_info(path=None, logger=None, type=None):
                     # leave 'release' as None
                 else:
                     result['release'] = {'casarundata':casarundataVersion, 'measures':measuresVersion}
+                    _release_info = dict(result['release'])
             except:
                 print("Unexpected error reading release_data_readme.txt")
                 # leave 'release' as None
@@ -12,84 +12,313 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-def get_data_lock(path, fn_name):
+def get_data_lock(path, fn_name, logger=None, type=None):
     """
     Get and initialize and set the lock on 'data_update.log' in path.
 
-    If path does not already exist or the lock file is not empty then a lock
-    is not set then a BadLock exception is raised.
+    If path does not already exist then a BadLock exception is raised.
 
     When a lock is set the lock file will contain the user, hostname, pid,
-    date, and time.
+    date, and time followed by a line of structured information (see lock_info.py)
+    that is updated with the progress of the update holding the lock and that is
+    renewed as a lease (every config.data_lock_lease/4 seconds) while the lock is held.
+    Other processes waiting for the lock read that to report who they are waiting on and
+    how far along that update is.
+
+    If the lock file is not empty when the lock is obtained then a previous update
+    did not finish :
+
+       - if that update's lease is still current (its process is still running on another host that did not see this lock) then the lock is released and this waits for that update as if it held the lock
+       - if that update's lease has expired, or its process is gone, then the install it was doing (if any) is recovered (see recover_install.py) before the lock is set
+       - otherwise (the lock file was left by an update that failed with an error, or written by an older version of casaconfig, or unreadable) a BadLock exception is raised
+
+    How the lock is held depends on config.data_lock_backend (see lock_backends.py) :
+    a POSIX lock on the lock file ('fcntl'), a lock file created with a hard link ('link'),
+    or a lock directory created by a rename ('rename'). The default ('auto') chooses one
+    from the type of filesystem holding path. Only one thread in a process holds the lock
+    on path at a time whatever the backend. The other threads of this process wait for it
+    before the lock file is opened (see lock_backends.ThreadLock) so that they never close
+    a descriptor of the lock file while the POSIX lock on it is held by this process.
 
     The opened file descriptor holding the lock is returned.
 
-    The caller is responsible for closing the returned file descriptor to release the
-    lock. The lock file should be truncated if everything went as expected.
+    The caller is responsible for releasing the lock using release_data_lock. The lock
+    file should be cleaned if everything went as expected.
 
     This function is intended for internal casaconfig use.
 
     If there is not network (have_network returns False) then the lock file is not
-    set or initialized and a NoNetwork exception is raised.
+    set or initialized and a NoNetwork exception is raised. The network is not checked
+    when all of the locations of the data of type are on a local or shared filesystem
+    (see data_urls.py).
+
+    If another process holds the lock then this waits for at most config.data_lock_wait
+    seconds (None waits as long as necessary, except that it does not wait at all when
+    config.data_lock_policy is 'skip'). A lock timeout set for this thread (see
+    call_controls.py, used by casaconfig.aio) is used instead of config.data_lock_wait.
+    LockTimeout is raised if the lock can not be obtained within that time. The caller
+    decides what that means using config.data_lock_policy : with 'wait' pull_data,
+    data_update and measures_update raise that LockTimeout and with 'skip' they return
+    without updating anything so that the data already installed at path continue to be
+    used (pull_data still raises it when nothing is installed at path yet). The wait also
+    ends (with a call_controls.Cancelled exception) if the caller is cancelled.
 
     Parameters
        - path (str) - The location where 'data_update.log' is to be found.
        - fn_name (str) - A string giving the name of the calling function to be recorded in the lock file.
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages while waiting for the lock.
+       - type (str=None) - The type of data to be installed ('casarundata' or 'measures'), None for either.
 
     Returns:
-       - the open file descriptor holding the lock. Close this file descriptor to release the lock.
+       - the open file descriptor holding the lock. Use release_data_lock to release the lock.
 
     Raises:
         - casaconfig.NoNetwork - raised wheren there is no network, nothing can be downloaded so nothing should be locked.
-        - casaconfig.BadLock - raised when the path to the lock file does not exist or the lock file is not empty as found
+        - casaconfig.BadLock - raised when the path to the lock file does not exist or the lock file is not empty as found and can not be recovered
+        - casaconfig.LockTimeout - raised when the lock could not be obtained within the time allowed
         - Exception - an unexpected exception was seen while writing the lock information to the file
 
     """
 
-    import fcntl
     import os
     import getpass
-    from datetime import datetime
+    import time
 
     from casaconfig import BadLock
     from casaconfig import NoNetwork
+    from casaconfig import LockTimeout
     from .have_network import have_network
+    from .data_urls import sources_are_local
+    from .print_log_messages import print_log_messages
+    from .call_controls import lock_timeout, cancel_event, check_cancelled
+    from .lock_info import LOCK_NAME, lock_text, parse_lock_text, read_lock_info, describe_lock, lease_expired, LockProgress, set_progress_reporter
+    from .lock_backends import lock_backend, ThreadLock
+    from .recover_install import recover_install
+    from .. import config as _config
 
-    if not have_network():
+    if not sources_are_local(type) and not have_network():
         raise NoNetwork("No network, lock file has not been set, unable to continue.")
 
     if not os.path.exists(path):
         raise BadLock("path to contain lock file does not exist : %s" % path)
 
-    lock_path = os.path.join(path, 'data_update.lock')
-    lock_exists = os.path.exists(lock_path)
+    lock_path = os.path.join(path, LOCK_NAME)
+
+    # the time allowed to wait for the lock, None waits as long as necessary
+    timeout = lock_timeout()
+    if timeout is None:
+        timeout = _config.data_lock_wait
+        if timeout is None and _config.data_lock_policy == 'skip':
+            timeout = 0
+    start = time.monotonic()
+
+    def remaining():
+        return None if timeout is None else max(0, timeout - (time.monotonic() - start))
+
+    # other threads of this process first, the lock file is not opened by this thread until it has this lock
+    # (closing a descriptor of the lock file would release a POSIX lock held by another thread of this process)
+    tlock = ThreadLock(path)
+    announced = False
+    if not tlock.acquire(timeout=0):
+        def held_by():
+            info = tlock.holder_info()
+            return describe_lock('' if info is None else lock_text(info).split('\n')[0], info)
+        if timeout is None or timeout > 0:
+            print_log_messages('%s waiting for the lock on %s held by %s' % (fn_name, path, held_by()), logger)
+        announced = True
+        reported = time.monotonic()
+        while not tlock.acquire(timeout=1.0 if timeout is None else min(1.0, remaining())):
+            check_cancelled()
+            if timeout is not None and remaining() <= 0:
+                raise LockTimeout("unable to obtain the lock on %s within %s seconds, it is held by %s" % (lock_path, timeout, held_by()))
+            if (time.monotonic() - reported) >= 60:
+                reported = time.monotonic()
+                print_log_messages('%s still waiting for the lock on %s held by %s' % (fn_name, path, held_by()), logger, verbose=1)
 
     # open and lock the lock file - don't truncate the lock file here if it already exists, wait until it's locked
-    mode = 'r+' if os.path.exists(lock_path) else 'w'
-    lock_fd = open(lock_path, mode)
-    fcntl.lockf(lock_fd, fcntl.LOCK_EX)
-
-    # see if the lock file is empty
-    if (lock_exists):
-        lockLines = lock_fd.readlines()
-        if (len(lockLines) > 0) and (len(lockLines[0]) > 0):
-            # not empty
+    try:
+        mode = 'r+' if os.path.exists(lock_path) else 'w+'
+        lock_fd = open(lock_path, mode)
+    except:
+        tlock.release()
+        raise
+
+    # the exclusion is provided by the backend selected by config.data_lock_backend, it is
+    # kept with the open lock file so that release_data_lock (and the lease heartbeat) can find it
+    try:
+        backend = lock_backend(path, lock_fd)
+    except:
+        lock_fd.close()
+        tlock.release()
+        raise
+    lock_fd._casaconfig_lock = backend
+    lock_fd._casaconfig_thread_lock = tlock
+
+    def close():
+        # close the lock file and release the lock if it's held
+        try:
             lock_fd.close()
+        finally:
+            try:
+                backend.release()
+            finally:
+                tlock.release()
+
+    def give_up():
+        # the lock can not be obtained in the time allowed
+        # no thread of this process holds the POSIX lock while this thread holds tlock, the lock file can be read
+        (text, info) = read_lock_info(path)
+        close()
+        raise LockTimeout("unable to obtain the lock on %s within %s seconds, it is held by %s" % (lock_path, timeout, describe_lock(text, info)))
+
+    def wait(block):
+        # wait for the lock, blocking if allowed
+        if block and timeout is None and cancel_event() is None:
+            backend.acquire(block=True)
+            return
+        # poll for the lock so that the wait can end, with an occasional report on the holder's progress
+        reported = time.monotonic()
+        delay = 0.05
+        while True:
+            if backend.acquire():
+                return
+            try:
+                check_cancelled()
+            except:
+                close()
+                raise
+            if timeout is not None and (time.monotonic() - start) >= timeout:
+                give_up()
+            time.sleep(delay if timeout is None else max(0, min(delay, timeout - (time.monotonic() - start))))
+            delay = min(1.0, delay*2)
+            if (time.monotonic() - reported) >= 60:
+                reported = time.monotonic()
+                (text, info) = read_lock_info(path)
+                print_log_messages('%s still waiting for the lock on %s held by %s' % (fn_name, path, describe_lock(text, info)), logger, verbose=1)
+
+    while True:
+        # False when someone else has the lock
+        locked = backend.acquire()
+
+        if not locked:
+            # the lock file is only read by another descriptor while this process does not hold the lock
+            (text, info) = read_lock_info(path)
+            if not announced and (timeout is None or timeout > 0):
+                print_log_messages('%s waiting for the lock on %s held by %s' % (fn_name, path, describe_lock(text, info)), logger)
+            announced = True
+            wait(True)
+
+        # see if the lock file is empty
+        lock_fd.seek(0)
+        lockText = lock_fd.read()
+        if len(lockText) == 0 or len(lockText.split('\n')[0]) == 0:
+            break
+
+        staleInfo = parse_lock_text(lockText)
+        if staleInfo is None or staleInfo.get('stage') == 'failed':
+            close()
             raise BadLock("lock file is not empty : %s" % lock_path)
 
-    # write the lock information, the seek and truncate are probably not necessary
+        if not lease_expired(staleInfo):
+            # the lease is still current, the holder is still working (e.g. on another host where this lock was not
+            # seen, or using a different lock backend), wait for it as if it held the lock
+            backend.release()
+            if timeout is not None and (time.monotonic() - start) >= timeout:
+                give_up()
+            time.sleep(1.0 if timeout is None else max(0, min(1.0, timeout - (time.monotonic() - start))))
+            announced = True
+            continue
+
+        # the previous holder is gone, recover what it was doing while holding the lock as this function
+        # the lock file keeps the unfinished install so that it is recovered again if this does not finish
+        print_log_messages('%s found the lock on %s left by %s, recovering ...' % (fn_name, path, describe_lock(lockText.split('\n')[0], staleInfo)), logger)
+        now = time.time()
+        info = {'fn':fn_name, 'user':getpass.getuser(), 'host':os.uname().nodename, 'pid':os.getpid(), 'started':now, 'updated':now,
+                'lease':_config.data_lock_lease, 'stage':'recover', 'item':None, 'done':None, 'total':None, 'install':staleInfo.get('install')}
+        lock_fd.seek(0)
+        lock_fd.truncate(0)
+        lock_fd.write(lock_text(info))
+        lock_fd.flush()
+        reporter = LockProgress(lock_fd, info)
+        set_progress_reporter(reporter)
+        try:
+            recover_install(path, staleInfo, logger)
+        except Exception as exc:
+            # put back what was found so that the next attempt also recovers it
+            reporter.stop()
+            lock_fd.seek(0)
+            lock_fd.truncate(0)
+            lock_fd.write(lockText)
+            close()
+            raise BadLock("lock file is not empty : %s, the unfinished update could not be recovered : %s" % (lock_path, str(exc))) from None
+        finally:
+            set_progress_reporter(None)
+        # the lock is still held, it is set for the caller below
+        reporter.stop()
+        break
+
+    # write the lock information
     try:
+        now = time.time()
+        info = {'fn':fn_name, 'user':getpass.getuser(), 'host':os.uname().nodename, 'pid':os.getpid(), 'started':now, 'updated':now,
+                'lease':_config.data_lock_lease, 'stage':'locked', 'item':None, 'done':None, 'total':None, 'install':None}
         lock_fd.seek(0)
         lock_fd.truncate(0)
-        lock_fd.write("locked using %s by %s on %s : pid = %s at %s" % (fn_name, getpass.getuser(), os.uname().nodename, os.getpid(), datetime.today().strftime('%Y-%m-%d:%H:%M:%S')))
+        lock_fd.write(lock_text(info))
         lock_fd.flush()
+        # what other threads of this process waiting for this lock report (this is updated as the update progresses)
+        tlock.set_info(info)
     except Exception as exc:
         print("ERROR! Unexpected failure in writing lock information to lock file %s" % lock_path)
         print("ERROR! Called by function : %s" % fn_name)
         print("ERROR! : %s" % exc)
-        lock_fd.close()
+        close()
         # reraise the exception - this shouldn't happen
         raise exc
 
+    # progress reported by this thread (and any threads it starts) goes to this lock file until it is released
+    set_progress_reporter(LockProgress(lock_fd, info))
+
     return lock_fd
-   
+
+def release_data_lock(lock_fd, clean=True):
+    """
+    Release the lock obtained by get_data_lock, closing lock_fd.
+
+    When clean is True the lock file is emptied. Otherwise the lock file is left as it is,
+    marked as failed, for someone to examine (and it is not recovered automatically).
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - lock_fd (file) - the open lock file returned by get_data_lock
+       - clean (bool=True) - empty the lock file
+
+    Returns
+       None
+    """
+
+    from .lock_info import progress_reporter, set_progress_reporter
+
+    backend = getattr(lock_fd, '_casaconfig_lock', None)
+    tlock = getattr(lock_fd, '_casaconfig_thread_lock', None)
+    try:
+        reporter = progress_reporter()
+        if reporter is not None and reporter.owns(lock_fd):
+            set_progress_reporter(None)
+            reporter.release(clean)
+            return
+
+        try:
+            if clean:
+                lock_fd.truncate(0)
+        finally:
+            lock_fd.close()
+    finally:
+        # the lock is released once the lock file says what happened, other threads of this process may then open the lock file
+        try:
+            if backend is not None:
+                backend.release()
+        finally:
+            if tlock is not None:
+                tlock.release()
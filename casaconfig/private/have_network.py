@@ -12,29 +12,62 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import urllib.request
 import urllib.error
+import threading
+import time
 
-def have_network():
+# the most recent probe result as (url, time.monotonic() of the probe, result)
+_probe = None
+_probe_lock = threading.Lock()
+
+def have_network(use_mirror=True):
     """
     check to see if an active network with general internet connectivity
     is available. returns True if we have internet connectivity and
     False if we do not.
+
+    The probe is a HEAD request to config.network_probe_url that must
+    complete within config.network_probe_timeout seconds with a 2xx status
+    (after any redirects). The result is remembered for config.network_probe_ttl
+    seconds and shared by all callers in this process so that a sequence
+    of remote operations probes the network once. The probe target can be
+    set to the data host (e.g. https://go.nrao.edu/casarundata) so that the
+    probe also checks that the data source is reachable. When config.data_mirror_url
+    is set (and use_mirror is True) the mirror is probed instead since it is the only
+    data source used. The mirror itself (see serve.py) uses use_mirror=False.
     """
     ###
     ### see: https://stackoverflow.com/questions/50558000/test-internet-connection-for-python3
     ###
     ### copied from in casagui/utils/__init__.py
     ###
-    try:
-        with urllib.request.urlopen('http://clients3.google.com/generate_204') as response:
-            return response.status == 204
-    except urllib.error.HTTPError:
-        ### http error
-        return False
-    except urllib.error.ContentTooShortError:
-        return False
-    except urllib.error.URLError:
-        return False
-    except Exception:
-        return False
+
+    global _probe
+
+    from .. import config as _config
+    from .transport import urlopen
+    from .data_urls import mirror_url
+
+    # a mirror is the only data source that needs to be reachable
+    url = (mirror_url() if use_mirror else None) or _config.network_probe_url
+
+    with _probe_lock:
+        if _probe is not None and _probe[0] == url and (time.monotonic() - _probe[1]) < _config.network_probe_ttl:
+            return _probe[2]
+
+        result = False
+        try:
+            with urlopen(url, method='HEAD', timeout=_config.network_probe_timeout) as response:
+                result = (response.status // 100) == 2
+        except urllib.error.HTTPError:
+            ### http error
+            result = False
+        except urllib.error.ContentTooShortError:
+            result = False
+        except urllib.error.URLError:
+            result = False
+        except Exception:
+            result = False
+
+        _probe = (url, time.monotonic(), result)
+        return result
@@ -0,0 +1,285 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Functions to maintain the install state database in path (measurespath).
+
+The install state database (STATE_DB_NAME in path) is a sqlite database recording,
+for each type of data ('casarundata' and 'measures'), the installed version and date,
+the size, modification time, and sha256 checksum of each installed file, and the
+history of installs with their timings.
+
+The readme.txt files (readme.txt in path for casarundata and geodetic/readme.txt in
+path for measures) are still written for compatibility with other tools and with
+older versions of casaconfig. They are generated from the database when an install
+is recorded. The inode and size of each readme.txt file is recorded along with the
+state. If the readme.txt file found in path does not match what was recorded (e.g.
+it was written by an older casaconfig) then the state for that type is not used and
+the readme.txt file should be read instead.
+
+Any error using the database (e.g. a filesystem that does not support the locking
+used by sqlite) is treated as if there were no database.
+
+These functions are intended for internal casaconfig use.
+"""
+
+STATE_DB_NAME = 'casaconfig_state.db'
+
+_schema = """
+create table if not exists installs (
+    id integer primary key,
+    type text not null,
+    version text not null,
+    date text not null,
+    started real,
+    finished real,
+    nfiles integer,
+    stats text
+);
+create table if not exists files (
+    type text not null,
+    relpath text not null,
+    size integer,
+    mtime real,
+    sha256 text,
+    unique (type, relpath)
+);
+create table if not exists state (
+    type text primary key,
+    version text not null,
+    date text not null,
+    install_id integer,
+    readme_ino integer,
+    readme_size integer
+);
+"""
+
+def _readme_path(path, type):
+    import os
+    if type == 'measures':
+        return os.path.join(path, 'geodetic', 'readme.txt')
+    return os.path.join(path, 'readme.txt')
+
+def _connect(path, create=False):
+    """
+    Return a connection to the state database in path, or None if there isn't one and
+    create is False.
+    """
+    import os
+    import sqlite3
+
+    db_path = os.path.join(path, STATE_DB_NAME)
+    if not create and not os.path.isfile(db_path):
+        return None
+    conn = sqlite3.connect(db_path, timeout=30)
+    if create:
+        conn.executescript(_schema)
+    return conn
+
+def readme_text(type, version, date, manifest=None):
+    """
+    Return the contents of the readme.txt file for the given type, version, and date.
+    The manifest is only used for casarundata.
+    """
+    if type == 'measures':
+        return "# measures data populated by casaconfig\nversion : %s\ndate : %s" % (version, date)
+
+    text = "# casarundata populated by casaconfig.pull_data\nversion : %s\ndate : %s" % (version, date)
+    text += "\n#\n# manifest"
+    for f in manifest:
+        text += "\n%s" % f
+    return text
+
+def record_install(path, type, version, date, file_info, started, stats=None, readme_dir=None):
+    """
+    Record a completed install in the state database in path (creating it if necessary) and
+    write the readme.txt file for that type generated from the recorded state.
+
+    If the state can not be recorded the readme.txt file is still written.
+
+    Parameters
+       - path (str) - the location of the installed data (measurespath)
+       - type (str) - 'casarundata' or 'measures'
+       - version (str) - the installed version
+       - date (str) - the install date as written to the readme.txt file
+       - file_info (dict) - the (size, mtime, sha256) of each installed file keyed by the path relative to path, in install order
+       - started (float) - the time (time.time()) when the install started
+       - stats (dict=None) - the timing statistics of the extraction
+       - readme_dir (str=None) - write the readme.txt file relative to this directory instead of path (used when it needs to be swapped into place along with the installed files)
+
+    Returns
+       None
+    """
+
+    import os
+    import time
+    import json
+    import sqlite3
+
+    from .staged_install import write_atomic
+
+    readme_path = _readme_path(path if readme_dir is None else readme_dir, type)
+    os.makedirs(os.path.dirname(readme_path), exist_ok=True)
+    manifest = list(file_info)
+
+    conn = None
+    try:
+        conn = _connect(path, create=True)
+        with conn:
+            cur = conn.execute("insert into installs (type, version, date, started, finished, nfiles, stats) values (?,?,?,?,?,?,?)",
+                               (type, version, date, started, time.time(), len(manifest), json.dumps(stats) if stats is not None else None))
+            install_id = cur.lastrowid
+            conn.execute("delete from files where type=?", (type,))
+            conn.executemany("insert into files (type, relpath, size, mtime, sha256) values (?,?,?,?,?)",
+                             [(type, f,) + tuple(file_info[f]) for f in manifest])
+            # the readme is the compatibility view of what was just recorded
+            rows = conn.execute("select relpath from files where type=? order by rowid", (type,)).fetchall()
+            write_atomic(readme_path, readme_text(type, version, date, [r[0] for r in rows]))
+            rstat = os.stat(readme_path)
+            conn.execute("insert or replace into state (type, version, date, install_id, readme_ino, readme_size) values (?,?,?,?,?,?)",
+                         (type, version, date, install_id, rstat.st_ino, rstat.st_size))
+        return
+    except (sqlite3.Error, OSError):
+        # the readme is what matters to everything else
+        pass
+    finally:
+        if conn is not None:
+            conn.close()
+
+    write_atomic(readme_path, readme_text(type, version, date, manifest))
+
+def _valid_state(conn, path, type):
+    # the state row for type, if it still describes the readme.txt file in path
+    import os
+    row = conn.execute("select version, date, install_id, readme_ino, readme_size from state where type=?", (type,)).fetchone()
+    if row is None:
+        return None
+    try:
+        rstat = os.stat(_readme_path(path, type))
+    except OSError:
+        return None
+    if rstat.st_ino != row[3] or rstat.st_size != row[4]:
+        return None
+    return row
+
+def installed_state(path, type, manifest=False, check_readme=True):
+    """
+    Return the installed version and date for type recorded in the state database in path
+    as a dictionary with keys 'version' and 'date' (and 'manifest', the list of installed files,
+    when manifest is True). Returns None if there is no usable state for type, in which case the
+    readme.txt file should be used.
+
+    Parameters
+       - path (str) - the location of the installed data (measurespath)
+       - type (str) - 'casarundata' or 'measures'
+       - manifest (bool=False) - when True, also return the list of installed files
+       - check_readme (bool=True) - when False, return the last recorded state even if the readme.txt file no longer matches it (used to recover from an interrupted install)
+
+    Returns
+       - a dictionary or None
+    """
+
+    import sqlite3
+
+    conn = None
+    try:
+        conn = _connect(path)
+        if conn is None:
+            return None
+        if check_readme:
+            row = _valid_state(conn, path, type)
+        else:
+            row = conn.execute("select version, date from state where type=?", (type,)).fetchone()
+        if row is None:
+            return None
+        result = {'version':row[0], 'date':row[1]}
+        if manifest:
+            rows = conn.execute("select relpath from files where type=? order by rowid", (type,)).fetchall()
+            result['manifest'] = [r[0] for r in rows]
+        return result
+    except sqlite3.Error:
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+def is_managed(path, relpath, type='casarundata'):
+    """
+    Return True if relpath (relative to path) was installed as part of the current version
+    of type, False if it was not, and None if there is no usable state for type.
+    """
+
+    import sqlite3
+
+    conn = None
+    try:
+        conn = _connect(path)
+        if conn is None or _valid_state(conn, path, type) is None:
+            return None
+        row = conn.execute("select 1 from files where type=? and relpath=?", (type, relpath)).fetchone()
+        return row is not None
+    except sqlite3.Error:
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+def file_records(path, type):
+    """
+    Return a dictionary of the (size, mtime, sha256) of each installed file of type keyed by
+    the path relative to path, or None if there is no usable state for type.
+    """
+
+    import sqlite3
+
+    conn = None
+    try:
+        conn = _connect(path)
+        if conn is None or _valid_state(conn, path, type) is None:
+            return None
+        rows = conn.execute("select relpath, size, mtime, sha256 from files where type=? order by rowid", (type,)).fetchall()
+        return {r[0]:(r[1], r[2], r[3]) for r in rows}
+    except sqlite3.Error:
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+def install_history(path, type=None):
+    """
+    Return the recorded installs in path, oldest first, as a list of dictionaries with keys
+    'type', 'version', 'date', 'started', 'finished', 'nfiles' and 'stats'. Only installs of
+    type are returned when type is not None.
+    """
+
+    import json
+    import sqlite3
+
+    conn = None
+    try:
+        conn = _connect(path)
+        if conn is None:
+            return []
+        query = "select type, version, date, started, finished, nfiles, stats from installs"
+        args = ()
+        if type is not None:
+            query += " where type=?"
+            args = (type,)
+        rows = conn.execute(query + " order by id", args).fetchall()
+        return [{'type':r[0], 'version':r[1], 'date':r[2], 'started':r[3], 'finished':r[4], 'nfiles':r[5],
+                 'stats':json.loads(r[6]) if r[6] is not None else None} for r in rows]
+    except sqlite3.Error:
+        return []
+    finally:
+        if conn is not None:
+            conn.close()
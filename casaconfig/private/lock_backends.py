@@ -0,0 +1,421 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The backends that provide the exclusion for the lock on measurespath used by
+get_data_lock (and so by pull_data, data_update and measures_update).
+
+The lock file (data_update.lock) always holds the lock information (see lock_info.py).
+The backend decides how the exclusion itself is done :
+
+   - 'fcntl' : a POSIX lock (lockf) on the lock file. The lock is released by the system when the holding process exits. This can be slow or unreliable on some NFS and Lustre mounts.
+   - 'link' : a lock file (data_update.lock.link) that is created atomically by writing a uniquely named file (opened with O_EXCL) and hard linking it to that name. This is safe on NFS, including when the reply to the link is lost.
+   - 'rename' : a lock directory (data_update.lock.dir) created by renaming a uniquely named, non-empty, directory to that name. This only needs directory renames to be atomic (e.g. Lustre mounted without flock).
+   - 'auto' : chosen from the type of the filesystem holding measurespath ('link' for NFS, 'rename' for Lustre and SMB/CIFS, otherwise 'fcntl').
+
+config.data_lock_backend selects the backend. Whatever the backend, an in-process
+lock (ThreadLock) is taken first so that only one thread of a process uses the lock
+file at a time. A POSIX lock does not exclude other threads in the same process and it
+belongs to the process, so closing any descriptor of the lock file in any thread of
+the holding process releases it. The ThreadLock is therefore held from before the lock
+file is opened until after it is closed and a thread waiting for it never opens the lock
+file, the lock information of the thread holding it is kept with the ThreadLock instead.
+
+The 'link' and 'rename' locks are left behind if the holding process is killed. They
+record the host and pid of the holder and they are renewed with the lease in the lock
+file (see LockProgress). One whose lease has expired, or whose process is known to be
+gone, is removed by the next process that tries to get the lock.
+
+These are intended for internal casaconfig use.
+"""
+
+import threading
+
+BACKENDS = ('fcntl', 'link', 'rename')
+
+# seconds between attempts to get a 'link' or 'rename' lock when blocking
+_POLL = 0.5
+
+# [threading lock, lock information of the holder] by the real path of the lock file
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+def filesystem_type(path):
+    """
+    Return the type of the filesystem holding path (e.g. 'ext4', 'nfs4', 'lustre') as found
+    in /proc/self/mounts, or None if that can not be determined (e.g. not Linux).
+    """
+    import os
+    import re
+
+    realpath = os.path.realpath(path)
+    best = None
+    fstype = None
+    try:
+        with open('/proc/self/mounts', 'r') as fid:
+            for line in fid:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # spaces and other special characters in the mount point are escaped as octal
+                mountpoint = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                if realpath == mountpoint or realpath.startswith(mountpoint.rstrip('/') + '/'):
+                    if best is None or len(mountpoint) >= len(best):
+                        best = mountpoint
+                        fstype = fields[2]
+    except OSError:
+        return None
+    return fstype
+
+def backend_name(path):
+    """
+    Return the name of the backend to use for the lock on path, resolving 'auto'.
+    """
+    from .. import config as _config
+
+    name = _config.data_lock_backend
+    if name == 'auto':
+        fstype = filesystem_type(path) or ''
+        if fstype.startswith('nfs'):
+            return 'link'
+        if fstype in ('lustre', 'cifs', 'smb3', 'smbfs'):
+            return 'rename'
+        return 'fcntl'
+    if name not in BACKENDS:
+        raise ValueError("unknown config.data_lock_backend : %s, expected one of 'auto', %s" % (name, ', '.join("'%s'" % b for b in BACKENDS)))
+    return name
+
+def lock_backend(path, lock_fd):
+    """
+    Return the backend for the lock on path. The ThreadLock for path must already be held.
+
+    Parameters
+       - path (str) - the location of the lock file (measurespath)
+       - lock_fd (file) - the open lock file
+
+    Returns
+       - a LockBackend, not yet acquired
+    """
+    name = backend_name(path)
+    if name == 'link':
+        return LinkLock(path, lock_fd)
+    if name == 'rename':
+        return RenameLock(path, lock_fd)
+    return FcntlLock(path, lock_fd)
+
+class LockBackend:
+    """
+    The interface of a lock backend. A backend is used for one attempt to get the lock on a
+    path and it may be acquired and released several times during that attempt.
+    """
+
+    name = None
+
+    def __init__(self, path, lock_fd):
+        import os
+
+        from .lock_info import LOCK_NAME
+
+        self.path = path
+        self.lock_fd = lock_fd
+        self.lock_path = os.path.join(path, LOCK_NAME)
+        self.held = False
+
+    def acquire(self, block=False):
+        """Get the lock, returns True if it is now held. When block is True this waits until it can be held."""
+        raise NotImplementedError
+
+    def release(self):
+        """Release the lock if it is held."""
+        raise NotImplementedError
+
+    def refresh(self):
+        """Renew the lease of the lock while it is held."""
+        pass
+
+class FcntlLock(LockBackend):
+    """A POSIX lock on the lock file."""
+
+    name = 'fcntl'
+
+    def acquire(self, block=False):
+        import fcntl
+
+        if block:
+            fcntl.lockf(self.lock_fd, fcntl.LOCK_EX)
+        else:
+            try:
+                fcntl.lockf(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # someone else has the lock
+                return False
+        self.held = True
+        return True
+
+    def release(self):
+        import fcntl
+
+        if self.held and not self.lock_fd.closed:
+            fcntl.lockf(self.lock_fd, fcntl.LOCK_UN)
+        # closing the lock file also releases it
+        self.held = False
+
+class _OwnedLock(LockBackend):
+    # a lock that exists as a name next to the lock file recording its owner,
+    # subclasses create it (_create), find its owner file (_owner_path) and remove it (_remove)
+
+    suffix = None
+
+    def __init__(self, path, lock_fd):
+        import os
+        import uuid
+
+        super().__init__(path, lock_fd)
+        self.name_path = self.lock_path + self.suffix
+        self.token = '%s.%s.%s' % (os.uname().nodename, os.getpid(), uuid.uuid4().hex[:8])
+
+    def _owner_text(self):
+        import os
+        import json
+
+        from .. import config as _config
+
+        return json.dumps({'host':os.uname().nodename, 'pid':os.getpid(), 'token':self.token, 'lease':_config.data_lock_lease})
+
+    def _owner(self, owner_path):
+        # (owner dictionary or None, mtime) for the owner file, None if it does not exist
+        import os
+        import json
+
+        try:
+            mtime = os.stat(owner_path).st_mtime
+        except FileNotFoundError:
+            return None
+        try:
+            with open(owner_path, 'r') as fid:
+                owner = json.load(fid)
+            if not isinstance(owner, dict):
+                owner = None
+        except (OSError, ValueError):
+            owner = None
+        return (owner, mtime)
+
+    def _is_stale(self, found):
+        from .lock_info import lease_expired
+        from .. import config as _config
+
+        (owner, mtime) = found
+        if owner is None:
+            # unreadable, only its age can be used
+            return lease_expired({'host':None, 'pid':None, 'updated':mtime, 'lease':_config.data_lock_lease})
+        return lease_expired({'host':owner.get('host'), 'pid':owner.get('pid'), 'updated':mtime,
+                              'lease':owner.get('lease', _config.data_lock_lease)})
+
+    def _break_stale(self):
+        # remove the lock if it was left by a holder that is gone, returns True if it was removed
+        import os
+
+        found = self._owner(self._owner_path(self.name_path))
+        if found is None:
+            # already gone
+            return True
+        if not self._is_stale(found):
+            return False
+        staleToken = None if found[0] is None else found[0].get('token')
+        # move it aside first so that only one process removes it
+        moved = self.lock_path + '.stale.' + self.token
+        try:
+            os.rename(self.name_path, moved)
+        except OSError:
+            return False
+        movedFound = self._owner(self._owner_path(moved))
+        movedToken = None if (movedFound is None or movedFound[0] is None) else movedFound[0].get('token')
+        if movedToken != staleToken:
+            # someone else broke it and got the lock in between, put theirs back
+            self._restore(moved)
+            return False
+        self._remove(moved)
+        return True
+
+    def acquire(self, block=False):
+        import time
+
+        while True:
+            if self._create():
+                self.held = True
+                return True
+            if self._break_stale() and self._create():
+                self.held = True
+                return True
+            if not block:
+                return False
+            time.sleep(_POLL)
+
+    def release(self):
+        import os
+
+        if not self.held:
+            return
+        self.held = False
+        found = self._owner(self._owner_path(self.name_path))
+        if found is None or found[0] is None or found[0].get('token') != self.token:
+            # it was broken by someone who thought this was gone, it is not this lock to remove
+            return
+        moved = self.lock_path + '.released.' + self.token
+        try:
+            os.rename(self.name_path, moved)
+        except OSError:
+            return
+        self._remove(moved)
+
+    def refresh(self):
+        import os
+
+        if self.held:
+            try:
+                os.utime(self._owner_path(self.name_path))
+            except OSError:
+                pass
+
+class LinkLock(_OwnedLock):
+    """A lock file created using O_EXCL and a hard link."""
+
+    name = 'link'
+    suffix = '.link'
+
+    def _owner_path(self, lockname):
+        return lockname
+
+    def _create(self):
+        import os
+
+        tmp_path = self.lock_path + '.' + self.token
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.write(fd, self._owner_text().encode())
+        finally:
+            os.close(fd)
+        try:
+            try:
+                os.link(tmp_path, self.name_path)
+            except FileExistsError:
+                return False
+            except OSError:
+                # the link may have been made even if the reply was lost (NFS), the link count says
+                pass
+            return os.stat(tmp_path).st_nlink == 2
+        finally:
+            os.unlink(tmp_path)
+
+    def _restore(self, moved):
+        import os
+
+        try:
+            os.link(moved, self.name_path)
+        except OSError:
+            pass
+        os.unlink(moved)
+
+    def _remove(self, moved):
+        import os
+
+        os.unlink(moved)
+
+class RenameLock(_OwnedLock):
+    """A lock directory created by renaming a non-empty directory into place."""
+
+    name = 'rename'
+    suffix = '.dir'
+
+    def _owner_path(self, lockname):
+        import os
+
+        return os.path.join(lockname, 'owner')
+
+    def _create(self):
+        import os
+        import shutil
+
+        tmp_path = self.lock_path + '.' + self.token
+        os.mkdir(tmp_path)
+        with open(os.path.join(tmp_path, 'owner'), 'w') as fid:
+            fid.write(self._owner_text())
+        try:
+            # this fails when there is already a (non-empty) lock directory
+            os.rename(tmp_path, self.name_path)
+            return True
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return False
+
+    def _restore(self, moved):
+        import os
+        import shutil
+
+        try:
+            os.rename(moved, self.name_path)
+        except OSError:
+            shutil.rmtree(moved, ignore_errors=True)
+
+    def _remove(self, moved):
+        import shutil
+
+        shutil.rmtree(moved, ignore_errors=True)
+
+class ThreadLock:
+    """
+    The in-process lock on the lock file in path, shared by all of the threads of this
+    process. It is held from before the lock file is opened until after it is closed (see
+    the module documentation). The thread holding it records its lock information here
+    (set_info) so that the threads waiting for it can report who they are waiting on
+    (holder_info) without opening the lock file.
+    """
+
+    def __init__(self, path):
+        import os
+
+        from .lock_info import LOCK_NAME
+
+        key = os.path.realpath(os.path.join(path, LOCK_NAME))
+        with _thread_locks_lock:
+            self._entry = _thread_locks.setdefault(key, [threading.Lock(), None])
+        self.held = False
+
+    def acquire(self, timeout=None):
+        """Get the lock, waiting for at most timeout seconds (None waits as long as necessary). Returns True if it is now held."""
+        if timeout is None:
+            locked = self._entry[0].acquire()
+        elif timeout <= 0:
+            locked = self._entry[0].acquire(blocking=False)
+        else:
+            locked = self._entry[0].acquire(timeout=timeout)
+        self.held = locked
+        return locked
+
+    def set_info(self, info):
+        """Record the lock information (as written to the lock file) of this holder."""
+        if self.held:
+            self._entry[1] = info
+
+    def holder_info(self):
+        """A copy of the lock information recorded by the thread holding this lock, or None."""
+        info = self._entry[1]
+        return None if info is None else dict(info)
+
+    def release(self):
+        """Release the lock if it is held."""
+        if not self.held:
+            return
+        self.held = False
+        self._entry[1] = None
+        self._entry[0].release()
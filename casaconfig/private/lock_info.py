@@ -0,0 +1,295 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The contents of the lock file (data_update.lock) in measurespath.
+
+While an update holds the lock the lock file contains two lines. The first is the
+human readable description that casaconfig has always written there. The second is
+a JSON dictionary that other processes waiting for the lock can read to see who holds
+it and how far along that update is :
+
+   - fn, user, host, pid : the function holding the lock and where it is running
+   - started : when the lock was obtained (seconds since the epoch)
+   - updated : when this information was last written (seconds since the epoch), this is the heartbeat of the lease
+   - lease : the lease in seconds, the holder rewrites this information at least every lease/4 seconds while it holds the lock
+   - stage : what the update is doing ('locked', 'download', 'remove', 'extract', 'publish', 'swap', 'recover') or 'failed' when the update stopped with an error and left the lock file for someone to examine
+   - item : what that stage is working on (e.g. the tarball name), may be None
+   - done, total : the progress of that stage (bytes for 'download' and 'extract'), either may be None
+   - install : the install that is changing measurespath, a dictionary with 'type' ('casarundata' or 'measures') and 'version' (and 'use_astron_obs_table' for measures), None until something in measurespath starts to change
+
+The lock file is empty when no update is in progress (or an update in progress has not
+yet changed anything in measurespath).
+
+A lock file that is not empty when the lock is obtained was left by an update that did
+not finish. If its lease has expired (the heartbeat is older than the lease) or the
+process that held it is known to be gone (same host, no such pid) then that update is
+recovered (see recover_install.py) by the next update to get the lock.
+
+The progress is written by the update holding the lock using report_progress. The
+reporter for the update running in a thread is set by get_data_lock. Functions that
+do their work in several threads (e.g. download_file) get the reporter once using
+progress_reporter and use it from those threads.
+
+These functions are intended for internal casaconfig use.
+"""
+
+import threading
+
+LOCK_NAME = 'data_update.lock'
+
+# seconds between writes of the progress of the same stage
+_PROGRESS_INTERVAL = 1.0
+
+# seconds between checks by the heartbeat thread that the lock file is still open
+_HEARTBEAT_POLL = 1.0
+
+_local = threading.local()
+
+def lock_text(info):
+    """
+    Return the contents of the lock file for the info dictionary.
+    """
+    import json
+    import time
+
+    started = time.strftime('%Y-%m-%d:%H:%M:%S', time.localtime(info['started']))
+    return "locked using %s by %s on %s : pid = %s at %s\n%s\n" % (info['fn'], info['user'], info['host'], info['pid'], started, json.dumps(info))
+
+def parse_lock_text(text):
+    """
+    Return the info dictionary found in the contents of a lock file, or None if the
+    contents do not include one (e.g. a lock file written by an older casaconfig).
+    """
+    import json
+
+    lines = text.split('\n')
+    if len(lines) < 2:
+        return None
+    try:
+        info = json.loads(lines[1])
+    except ValueError:
+        return None
+    if not isinstance(info, dict) or not all(k in info for k in ('fn', 'host', 'pid', 'started', 'updated')):
+        return None
+    return info
+
+def read_lock_info(path):
+    """
+    Return (text, info) for the lock file in path where text is the first line of the
+    lock file (an empty string if the lock file is empty or does not exist) and info is
+    the info dictionary (or None).
+    """
+    import os
+
+    try:
+        with open(os.path.join(path, LOCK_NAME), 'r') as fid:
+            text = fid.read(65536)
+    except OSError:
+        return ('', None)
+    return (text.split('\n')[0].strip(), parse_lock_text(text))
+
+def lock_holder(path):
+    """
+    Return a description of the update that holds the lock on path (see describe_lock),
+    or None if the lock does not appear to be held. This never waits and never takes the
+    lock, it is used to wait for the lock without holding a thread (casaconfig.aio). A lock
+    file left by an update that did not finish is not held (get_data_lock deals with it).
+    """
+    from .lock_backends import ThreadLock
+
+    # another thread of this process, the lock file must not be opened (and closed) while it has the lock
+    tlock = ThreadLock(path)
+    if not tlock.acquire(timeout=0):
+        info = tlock.holder_info()
+        return describe_lock('' if info is None else lock_text(info).split('\n')[0], info)
+    try:
+        (text, info) = read_lock_info(path)
+    finally:
+        tlock.release()
+    if info is None or info.get('stage') == 'failed' or lease_expired(info):
+        return None
+    return describe_lock(text, info)
+
+def describe_lock(text, info):
+    """
+    Return a description of who holds the lock and their progress for use in messages.
+    """
+    import time
+
+    if info is None:
+        return text if len(text) > 0 else 'an unknown process'
+
+    def sizeString(nbytes):
+        return "%.0fM" % (nbytes/(1024*1024))
+
+    msg = '%s by %s on %s (pid %s) since %s' % (info['fn'], info.get('user'), info['host'], info['pid'],
+                                                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info['started'])))
+    stage = info.get('stage')
+    if stage is not None and stage != 'locked':
+        msg += ', %s' % stage
+        if info.get('item') is not None:
+            msg += ' %s' % info['item']
+        done = info.get('done')
+        total = info.get('total')
+        if done is not None and total:
+            msg += ' %.0f%%' % (100.0*done/total)
+            if stage in ('download', 'extract'):
+                msg += ' (%s of %s)' % (sizeString(done), sizeString(total))
+        elif done is not None:
+            msg += ' (%s so far)' % (sizeString(done) if stage in ('download', 'extract') else done)
+    msg += ', last updated %.0fs ago' % max(0, time.time() - info['updated'])
+    return msg
+
+def lease_expired(info):
+    """
+    Return True if the lease described by info has expired (no heartbeat within the
+    lease) or the process holding it is gone (it was on this host and that pid does not
+    exist). The lease of another thread in this process never expires while this process
+    is running and the heartbeat continues.
+    """
+    import os
+    import time
+
+    from .. import config as _config
+
+    lease = info.get('lease', _config.data_lock_lease)
+    if (time.time() - info['updated']) > lease:
+        return True
+    if info['host'] == os.uname().nodename and info['pid'] != os.getpid():
+        try:
+            os.kill(info['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # it exists but belongs to someone else
+            pass
+    return False
+
+class LockProgress:
+    """
+    Writes the progress of the update holding the lock to the lock file. The lock file
+    is rewritten in place (it must stay the same file to keep the lock), at most once
+    every _PROGRESS_INTERVAL seconds unless the stage changes. A heartbeat thread also
+    rewrites it every lease/4 seconds to renew the lease. Nothing is written once the lock
+    file has been closed (the heartbeat thread then exits) and any failure to write is ignored.
+    """
+
+    def __init__(self, lock_fd, info):
+        self._lock_fd = lock_fd
+        self._info = info
+        self._lock = threading.Lock()
+        self._released = False
+        self._heartbeat = threading.Thread(target=self._beat, name='casaconfig-lock-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        import time
+
+        interval = max(_HEARTBEAT_POLL, self._info.get('lease', 60) / 4.0)
+        while not self._lock_fd.closed:
+            time.sleep(_HEARTBEAT_POLL)
+            if not self._lock_fd.closed and (time.time() - self._info['updated']) >= interval:
+                self.write()
+
+    def write(self):
+        import os
+        import time
+
+        with self._lock:
+            if self._released or self._lock_fd.closed:
+                return
+            self._info['updated'] = time.time()
+            data = lock_text(self._info).encode()
+            try:
+                fd = self._lock_fd.fileno()
+                # overwrite then trim so that a reader never sees an empty file
+                os.pwrite(fd, data, 0)
+                os.ftruncate(fd, len(data))
+            except (OSError, ValueError):
+                pass
+            # the lock backend may have its own lease to renew (see lock_backends.py)
+            backend = getattr(self._lock_fd, '_casaconfig_lock', None)
+            if backend is not None:
+                backend.refresh()
+
+    def stop(self):
+        """Stop writing to the lock file, the lock file is left open."""
+        with self._lock:
+            self._released = True
+
+    def release(self, clean):
+        """
+        Stop writing to the lock file and close it (releasing the lock). The lock file is
+        emptied when clean is True, otherwise it is left with the 'failed' stage.
+        """
+        if not clean:
+            self.update('failed', item=self._info.get('item'))
+        with self._lock:
+            self._released = True
+            try:
+                if clean:
+                    self._lock_fd.truncate(0)
+            finally:
+                self._lock_fd.close()
+
+    def owns(self, lock_fd):
+        """True if this writes to lock_fd."""
+        return self._lock_fd is lock_fd
+
+    def begin_install(self, type, version, **extra):
+        """Record that the install of version of type is about to change measurespath."""
+        with self._lock:
+            install = {'type':type, 'version':version}
+            install.update(extra)
+            self._info['install'] = install
+        self.write()
+
+    def update(self, stage, done=None, total=None, item=None):
+        import time
+
+        with self._lock:
+            same = stage == self._info.get('stage') and item == self._info.get('item')
+            if same and (time.time() - self._info['updated']) < _PROGRESS_INTERVAL and done != total:
+                # record it but don't write it yet
+                self._info['done'] = done
+                self._info['total'] = total
+                return
+            self._info.update({'stage':stage, 'item':item, 'done':done, 'total':total})
+        self.write()
+
+def set_progress_reporter(reporter):
+    """Set the LockProgress (or None) used by report_progress in this thread."""
+    _local.reporter = reporter
+
+def progress_reporter():
+    """The LockProgress for the update running in this thread, or None."""
+    return getattr(_local, 'reporter', None)
+
+def report_progress(stage, done=None, total=None, item=None):
+    """
+    Report the progress of the update running in this thread (if it holds the lock).
+    """
+    reporter = progress_reporter()
+    if reporter is not None:
+        reporter.update(stage, done, total, item)
+
+def report_install(type, version, **extra):
+    """
+    Record in the lock file held by this thread that the install of version of type is
+    about to change measurespath, so that it can be finished if this process does not
+    finish it.
+    """
+    reporter = progress_reporter()
+    if reporter is not None:
+        reporter.begin_install(type, version, **extra)
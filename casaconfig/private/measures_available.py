@@ -15,15 +15,27 @@
 this module will be included in the api
 """
 
+def is_version(value):
+    # only versions starting with WSRT_Measures and having 'tar' after character 15 to exclude the "WSRT_Measures.ztar" file
+    # without relying on the specific type of compression or nameing in  more detail than that
+    return (value.startswith('WSRT_Measures') and (value.rfind('tar')>15))
+
 def measures_available():
     """
     List available measures versions on ASTRON at https://www.astron.nl/iers/
+    (or the mirror at config.data_mirror_url when that is set).
 
     This returns a list of the measures versions available on the ASTRON
     server. The version parameter of measures_update must be one
     of the values in that list if set (otherwise the most recent version
     in this list is used).
 
+    The list is saved in the catalogs directory in config.cachedir. A list saved less
+    than config.catalog_ttl seconds ago is returned without contacting the server.
+    Otherwise the server is asked if the list has changed since it was saved (which
+    is usually answered without sending the list again). The saved list is returned
+    when there is no network or the server can not be reached.
+
     Parameters
        None
     
@@ -31,56 +43,24 @@ def measures_available():
        list - version names returned as list of strings
 
     Raises
-       - casaconfig.NoNetwork - Raised where there is no network seen, can not continue
-       - casaconfig.RemoteError - Raised when there is an error fetching some remote content for some reason other than no network
+       - casaconfig.NoNetwork - Raised where there is no network seen and there is no saved list, can not continue
+       - casaconfig.RemoteError - Raised when there is an error fetching some remote content for some reason other than no network and there is no saved list
        - Exception - Unexpected exception while getting list of available measures versions
 
     """
 
-    import html.parser
-    import urllib.request
-    import urllib.error
-    import ssl
-    import certifi
-
     from casaconfig import RemoteError
     from casaconfig import NoNetwork
 
-    from .have_network import have_network
-
-    if not have_network():
-        raise NoNetwork("No network, can not find the list of available data.")
-    
-    class LinkParser(html.parser.HTMLParser):
-        def reset(self):
-            super().reset()
-            self.rundataList = []
-
-        def handle_starttag(self, tag, attrs):
-            if tag == 'a':
-                for (name, value) in attrs:
-                    # only care if this is an href and the value starts with
-                    # WSRT_Measures and has 'tar' after character 15 to exclude the "WSRT_Measures.ztar" file
-                    # without relying on the specific type of compression or nameing in  more detail than that
-                    if name == 'href' and (value.startswith('WSRT_Measures') and (value.rfind('tar')>15)):
-                        # only add it to the list if it's not already there
-                        if (value not in self.rundataList):
-                            self.rundataList.append(value)
+    from .fetch_catalog import fetch_catalog
+    from .data_urls import measures_url
 
     try:
-        context = ssl.create_default_context(cafile=certifi.where())
-        with urllib.request.urlopen('https://www.astron.nl/iers', context=context, timeout=400) as urlstream:
-            parser = LinkParser()
-            encoding = urlstream.headers.get_content_charset() or 'UTF-8'
-            for line in urlstream:
-                parser.feed(line.decode(encoding))
+        return fetch_catalog('measures', measures_url(), is_version, 'measures versions')
 
-        # return the sorted list, earliest versions are first, newest is last
-        return sorted(parser.rundataList)
+    except (NoNetwork, RemoteError):
+        raise
 
-    except urllib.error.URLError as urlerr:
-        raise RemoteError("Unable to retrieve list of available measures versions : " + str(urlerr)) from None
-        
     except Exception as exc:
         msg = "Unexpected exception while getting list of available measures versions : " + str(exc)
         raise Exception(msg)
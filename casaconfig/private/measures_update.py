@@ -15,7 +15,7 @@
 this module will be included in the api
 """
 
-def measures_update(path=None, version=None, force=False, logger=None, auto_update_rules=False, use_astron_obs_table=False, verbose=None):
+def measures_update(path=None, version=None, force=False, logger=None, auto_update_rules=False, use_astron_obs_table=False, verbose=None, staging_dir=None):
     """
     Update or install the IERS data used for measures calculations from ASTRON into path.
     
@@ -29,6 +29,13 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
     The default value of the verbose argument is taken from the casaconfig_verbose config
     value (defaults to 1).
 
+    How the measures data are installed depends on config.measures_install_mode. For 'inplace'
+    (the default) the tarball is extracted over the installed tables. For 'staged' the tarball
+    is extracted into a staging directory in path and each top-level directory there (geodetic
+    and ephemerides) is then renamed into place, replacing the installed directory, so that
+    other sessions using path never see partially updated tables. Anything in the installed
+    directories that is not in the tarball (e.g. the Observatories table) is kept in either case.
+
     CASA maintains a separate Observatories table which is available in the casarundata
     collection through pull_data and data_update. The Observatories table found at ASTRON
     is not installed by measures_update and any Observatories file at path will not be changed
@@ -36,7 +43,9 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
     both to True (use_astron_obs_table is ignored when force is False).
 
     A text file (readme.txt in the geodetic directory in path) records the measures version string
-    and the date when that version was installed in path.
+    and the date when that version was installed in path. The same information, along with the
+    size, modification time and checksum of each installed file and the timing of the install,
+    is recorded in the install state database in path.
 
     If path is None then config.measurespath is used.
 
@@ -73,6 +82,9 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
     completely or use a different path and use pull_data to install a fresh copy of the
     desired version.
 
+    A lock file left by an update that was killed is recovered automatically and the wait
+    for a lock held by another update is bounded, see get_data_lock and config.data_lock_policy.
+
     Care should be used when using measures_update outside of the normal automatic
     update that other casa sessions are not using the same measures at the same time,
     especially if they may also be starting at that time. If a specific version is
@@ -113,51 +125,49 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
        - auto_update_rules (bool=False) - If True then the user must be the owner of path, version must be None, and force must be False.
        - use_astron_obs_table (bool=False) - If True and force is also True then keep the Observatories table found in the Measures tar tarball (possibly overwriting the Observatories table from casarundata).
        - verbose (int=None) - Level of output, 0 is none, 1 is to logger, 2 is to logger and terminal, defaults to casaconfig_verbose in config dictionary.
+       - staging_dir (str=None) - A directory on fast local storage (e.g. local NVMe or /dev/shm) where the tarball is downloaded and extracted before it is published to path, copying only the files that are not already identical there. Default None uses config.staging_dir (when that is also None the tarball is extracted directly into path).
         
     Returns
        None
 
     Raises
        - casaconfig.AutoUpdatesNotAllowed - raised when path does not exists as a directory or is not owned by the user when auto_update_rules is True
-       - casaconfig.BadLock - raised when the lock file was not empty when found
+       - casaconfig.BadLock - raised when the lock file was not empty when found and it could not be recovered
+       - casaconfig.LockTimeout - raised when the lock on path is held by another update for longer than config.data_lock_wait seconds and config.data_lock_policy is 'wait'
        - casaconfig.BadReadme - raised when something unexpected is found in the readme or the readme changed after an update is in progress
        - casaconfig.NoReadme - raised when the readme.txt file is not found at path (path also may not exist)
        - casaconfig.NotWritable - raised when the user does not have permission to write to path
        - casaconfig.NoNetwork - raised by measuers_available or when getting the lock file if there is no network.
-       - casaconfig.RemoteError - raised by measures_available when the remote list of measures could not be fetched, not due to no network.
+       - casaconfig.RemoteError - raised by measures_available when the remote list of measures could not be fetched, not due to no network, or when the measures tarball could not be downloaded.
        - casaconfig.UnsetMeasurespath - raised when path is None and has not been set in config
        - Exception - raised when something unexpected happened while updating measures
     
     """
     import os
     import pkg_resources
-    from datetime import datetime
     import sys
-
-    import tarfile
-    import re
-    import ssl
-    import urllib.request
-    import certifi
-    import shutil
+    import urllib.parse
 
     from casaconfig import measures_available
-    from casaconfig import AutoUpdatesNotAllowed, UnsetMeasurespath, RemoteError, NotWritable, BadReadme, BadLock, NoReadme, NoNetwork
+    from casaconfig import AutoUpdatesNotAllowed, UnsetMeasurespath, RemoteError, NotWritable, BadReadme, BadLock, NoReadme, NoNetwork, LockTimeout
 
     from .print_log_messages import print_log_messages
-    from .get_data_lock import get_data_lock
+    from .get_data_lock import get_data_lock, release_data_lock
     from .get_data_info import get_data_info
     from .measures_available import measures_available
+    from .fetch_archive import fetch_archive
+    from .publish import resolve_staging_dir
+    from .data_urls import measures_urls
+    from .do_measures_update import do_measures_update
+    from .. import config as _config
     
     if path is None:
-        from .. import config as _config
         path = _config.measurespath
 
     if path is None:
         raise UnsetMeasurespath('measures_update: path is None and has not been set in config.measurespath. Provide a valid path and retry.')
 
     if verbose is None:
-        from .. import config as _config
         verbose = _config.casaconfig_verbose
 
     path = os.path.expanduser(path)
@@ -256,7 +266,7 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
         print_log_messages('measures_update ... acquiring the lock ... ', logger)
 
         # the BadLock exception that may happen here is caught below
-        lock_fd = get_data_lock(path, 'measures_update')
+        lock_fd = get_data_lock(path, 'measures_update', logger, type='measures')
 
         do_update = force
         
@@ -293,7 +303,7 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
             if force:
                 print_log_messages('A measures update has been requested by the force argument', logger)
 
-            print_log_messages('  ... finding available measures at www.astron.nl ...', logger)
+            print_log_messages('  ... finding available measures at %s ...' % (urllib.parse.urlsplit(measures_urls()[0]).netloc or measures_urls()[0]), logger)
 
             files = measures_available()
 
@@ -308,44 +318,15 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
                 # there are files to extract
                 print_log_messages('  ... downloading %s from ASTRON server to %s ...' % (target, path), logger)
 
-                astronURL = 'https://www.astron.nl/iers'
-                context = ssl.create_default_context(cafile=certifi.where())
-                # just in case there's a redirect at astron the way there is for the go.nrao.edu site and casarundata
-                measuresURLroot = urllib.request.urlopen(astronURL, context=context).url
-                measuresURL = os.path.join(measuresURLroot, target)
-                
+                # fetch the tarball first, nothing at path has changed yet so the lock can be cleaned if this fails
+                staging_dir = resolve_staging_dir(staging_dir)
+                archive = fetch_archive(measures_urls(), target, logger, download_dir=staging_dir)
+
                 # it's at this point that this code starts modifying what's there so the lock file should
                 # not be removed on failure after this although it may leave that temp tar file around, but that's OK
                 clean_lock = False
-                # remove any existing measures readme.txt now in case something goes wrong during extraction
-                readme_path = os.path.join(path,'geodetic/readme.txt')
-                if os.path.exists(readme_path):
-                    os.remove(readme_path)
-
-                # custom filter that incorporates data_filter to watch for dangerous members of the tar file and
-                # add filtering to remove the Observatories table (unless use_astron_obs_table is True) and
-                # the *.old tables that may be in the geodetic tree
-                def custom_filter(member, extractionPath):
-                    # member is a TarInfo instance and extractionPath is the destination path
-                    # use the 'data_filter' first to deal with dangerous members
-                    member = tarfile.data_filter(member, extractionPath)
-                    # always exclude *.old names in geodetic
-                    if (member is not None) and (re.search('geodetic',member.name) and re.search('.old',member.name)):
-                        member = None
-                    # the use_astron_obs_table argumen only has weight if force is True
-                    if (not (force and use_astron_obs_table)) and (member is not None) and (re.search('Observatories',member.name)):
-                        member = None
-                    return member
-
-                with urllib.request.urlopen(measuresURL, context=context, timeout=400) as tstream, tarfile.open(fileobj=tstream, mode='r|*') as tar :
-                    # use the 'data' filter if available, revert to previous 'fully_trusted' behavior of not available
-                    tar.extraction_filter = custom_filter
-                    tar.extractall(path=path)
-                    tar.close()
-
-                # create a new readme.txt file
-                with open(readme_path,'w') as fid:
-                    fid.write("# measures data populated by casaconfig\nversion : %s\ndate : %s" % (target, datetime.today().strftime('%Y-%m-%d')))
+                # the use_astron_obs_table argument only has weight if force is True
+                do_measures_update(path, target, archive, logger, use_astron_obs_table=(force and use_astron_obs_table), staging_dir=staging_dir)
 
                 clean_lock = True
                 print_log_messages('  ... measures data updated at %s' % path, logger)
@@ -365,6 +346,14 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
         # reraise this
         raise
 
+    except LockTimeout as exc:
+        # nothing at path has changed, the lock was never obtained
+        if _config.data_lock_policy == 'skip':
+            print_log_messages('measures_update skipped : %s' % str(exc), logger)
+            return
+        print_log_messages(str(exc), logger, True)
+        raise
+
     except BadReadme as exc:
         # something is wrong in the readme after an update was triggered, this shouldn't happen, print more context and reraise this
         msgs = [str(exc)]
@@ -382,9 +371,8 @@ def measures_update(path=None, version=None, force=False, logger=None, auto_upda
 
     finally:
         # make sure the lock file is closed and also clean the lock file if safe to do so, this is always executed
+        # a lock file that is not cleaned is marked as failed and it will not be recovered automatically
         if lock_fd is not None and not lock_fd.closed:
-            if clean_lock:
-                lock_fd.truncate(0)
-            lock_fd.close()
+            release_data_lock(lock_fd, clean_lock)
 
     return
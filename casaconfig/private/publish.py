@@ -0,0 +1,253 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Install through a staging directory on fast local storage (config.staging_dir).
+
+A tarball is downloaded and extracted into a work directory in the staging directory,
+where the manifest and the size, modification time and checksum of each file are recorded
+as usual. The extracted tree is then published to measurespath (or to a staging directory
+in measurespath for a staged install) by publish_tree. Only the files that differ from
+what is already at the destination are copied, which is usually a small part of a new
+casarundata version.
+
+These functions are intended for internal casaconfig use.
+"""
+
+WORK_PREFIX = 'casaconfig-'
+
+# bytes copied by each copy_file_range call or read from the source by the fallback copy
+_COPY_CHUNK = 16*1024*1024
+
+def resolve_staging_dir(staging_dir=None):
+    """
+    The staging directory to use : staging_dir if it is set, otherwise config.staging_dir.
+    Returns None when there is no staging directory. A staging directory that does not
+    exist is created.
+    """
+    import os
+
+    from .. import config as _config
+
+    if staging_dir is None:
+        staging_dir = getattr(_config, 'staging_dir', None)
+    if not staging_dir:
+        return None
+    staging_dir = os.path.abspath(os.path.expanduser(staging_dir))
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+def make_work_dir(staging_dir, type):
+    """
+    Create and return a new, empty directory in staging_dir for extracting an archive of
+    type ('casarundata' or 'measures') in this process.
+    """
+    import os
+    import shutil
+
+    work = os.path.join(staging_dir, '%s%s-%d' % (WORK_PREFIX, type, os.getpid()))
+    if os.path.exists(work):
+        # left over from an earlier process with the same pid
+        shutil.rmtree(work)
+    os.makedirs(work)
+    return work
+
+def remove_staged_archive(archive, staging_dir):
+    """
+    Remove archive if it was downloaded into staging_dir (it is not kept in the archive cache).
+    """
+    import os
+
+    if staging_dir is not None and archive is not None and os.path.dirname(os.path.abspath(archive)) == staging_dir:
+        try:
+            os.remove(archive)
+        except FileNotFoundError:
+            pass
+
+def _same_metadata(path, st):
+    # the os.stat_result of path if it is a regular file with the size, modification time and mode in st, otherwise None
+    import os
+    import stat
+
+    try:
+        dst = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    if stat.S_ISREG(dst.st_mode) and dst.st_size == st.st_size and dst.st_mtime_ns == st.st_mtime_ns and \
+       stat.S_IMODE(dst.st_mode) == stat.S_IMODE(st.st_mode):
+        return dst
+    return None
+
+def _same_contents(path1, path2):
+    # true if the two files have the same bytes
+    with open(path1, 'rb') as f1, open(path2, 'rb') as f2:
+        while True:
+            b1 = f1.read(_COPY_CHUNK)
+            if b1 != f2.read(_COPY_CHUNK):
+                return False
+            if not b1:
+                return True
+
+def _same_file(src, st, sha, path, record):
+    # true if path is a regular file with the metadata in st (of src) and the same contents as src
+    # the contents are compared by checksum when the checksum of src (sha) is known and record shows that path
+    # is unchanged since it was installed, otherwise they are read and compared
+    dst = _same_metadata(path, st)
+    if dst is None:
+        return False
+    if sha is not None and record is not None and record[2] is not None and record[0] == dst.st_size and record[1] == dst.st_mtime:
+        return record[2] == sha
+    return _same_contents(src, path)
+
+def _copy_file(src, dst):
+    # copy src to dst in large chunks, in the kernel (and on the server for some network filesystems) when possible
+    import os
+    import shutil
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), _COPY_CHUNK) > 0:
+                    pass
+                return
+            except OSError:
+                # not supported between these filesystems, start again with an ordinary copy
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, _COPY_CHUNK)
+
+def publish_tree(source, dest, reference=None, logger=None, item=None, file_info=None, installed=None):
+    """
+    Publish the tree at source into dest, which is created if necessary.
+
+    A file in dest that has the same size, modification time, mode and contents as the file
+    in source is left as it is. Otherwise, when reference is given and the file there is
+    identical it is hard linked into dest (reference is the live tree when dest is a staging directory
+    in it). Everything else is copied by config.publish_workers threads, each file to a
+    temporary name in its directory which is then renamed into place so that a session
+    reading dest never sees a partially copied file. Symbolic links are recreated and the
+    modes and times of the directories are set once their contents are in place. Nothing
+    in dest that is not in source is changed.
+
+    The contents are compared only when the size, modification time and mode match. They are
+    compared by checksum when file_info has the checksum of the file in source and installed
+    has the checksum recorded for the same, unchanged, file in the installed tree (reference
+    when it is given, otherwise dest). Otherwise both files are read and compared.
+
+    Parameters
+       - source (str) - the extracted tree (in the staging directory)
+       - dest (str) - where the tree is published
+       - reference (str=None) - a tree whose identical files may be hard linked into dest
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages.
+       - item (str=None) - what is being published, used when reporting progress in the lock file
+       - file_info (dict=None) - the (size, mtime, sha256) of the files in source keyed by the path relative to source (as recorded by extract_archive)
+       - installed (dict=None) - the (size, mtime, sha256) recorded for the files in the installed tree keyed by the path relative to it (see install_state.file_records)
+
+    Returns
+       - dict with the number of 'files', those 'copied', 'linked' and 'skipped', the 'bytes' copied and the 'seconds' taken
+
+    """
+
+    import os
+    import shutil
+    import time
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from .print_log_messages import print_log_messages
+    from .lock_info import report_progress
+    from .. import config as _config
+
+    start = time.perf_counter()
+
+    dirs = []
+    files = []
+    links = []
+    for (dirpath, dirnames, filenames) in os.walk(source):
+        reldir = os.path.relpath(dirpath, source)
+        if reldir == '.':
+            reldir = ''
+        dirs.append(reldir)
+        for name in dirnames + filenames:
+            relpath = os.path.join(reldir, name)
+            if os.path.islink(os.path.join(source, relpath)):
+                links.append(relpath)
+            elif name in filenames:
+                files.append(relpath)
+
+    for reldir in dirs:
+        os.makedirs(os.path.join(dest, reldir), exist_ok=True)
+
+    def publish(relpath):
+        # returns ('skipped'|'linked'|'copied', bytes copied)
+        src = os.path.join(source, relpath)
+        dst = os.path.join(dest, relpath)
+        st = os.stat(src)
+        sha = file_info.get(relpath, (None, None, None))[2] if file_info is not None else None
+        record = installed.get(relpath) if installed is not None else None
+        if _same_file(src, st, sha, dst, None if reference is not None else record):
+            return ('skipped', 0)
+        if reference is not None and _same_file(src, st, sha, os.path.join(reference, relpath), record):
+            try:
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                os.link(os.path.join(reference, relpath), dst)
+                return ('linked', 0)
+            except OSError:
+                pass
+        (dstdir, name) = os.path.split(dst)
+        tmp = os.path.join(dstdir, '.%s.casaconfig-%d' % (name, os.getpid()))
+        try:
+            _copy_file(src, tmp)
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+        except:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return ('copied', st.st_size)
+
+    counts = {'copied':0, 'linked':0, 'skipped':0}
+    nbytes = 0
+    report_progress('publish', 0, len(files), item)
+    with ThreadPoolExecutor(max_workers=max(1, _config.publish_workers)) as pool:
+        futures = [pool.submit(publish, f) for f in files]
+        for (done, future) in enumerate(as_completed(futures), 1):
+            (what, size) = future.result()
+            counts[what] += 1
+            nbytes += size
+            report_progress('publish', done, len(files), item)
+
+    for relpath in links:
+        dst = os.path.join(dest, relpath)
+        target = os.readlink(os.path.join(source, relpath))
+        if os.path.islink(dst) and os.readlink(dst) == target:
+            continue
+        if os.path.lexists(dst):
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+            else:
+                os.remove(dst)
+        os.symlink(target, dst)
+
+    # deepest first so that setting the times of a directory is not undone by a change inside it
+    # dest itself is left as it is (it may be measurespath)
+    for reldir in sorted([d for d in dirs if d], key=lambda d: d.count(os.sep), reverse=True):
+        shutil.copystat(os.path.join(source, reldir), os.path.join(dest, reldir))
+
+    stats = dict(counts, files=len(files), bytes=nbytes, seconds=time.perf_counter()-start)
+    print_log_messages('  published %d files to %s in %.1fs : %d copied (%.1f MB), %d linked, %d already there' %
+                       (stats['files'], dest, stats['seconds'], stats['copied'], nbytes/(1024*1024), stats['linked'], stats['skipped']), logger, verbose=1)
+    return stats
@@ -15,7 +15,7 @@
 this module will be included in the api
 """
 
-def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
+def pull_data(path=None, version=None, force=False, logger=None, verbose=None, staging_dir=None):
     """
     Pull the casarundata contents from the CASA host and install it in path.
 
@@ -61,6 +61,13 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
     that files not present in the version being installed are removed in moving to the
     other version.
 
+    The casarundata tarball is downloaded before any of the previously installed files
+    are removed. If that download is interrupted then the previously installed version is
+    left as it was and the partially downloaded tarball is kept in the archive cache
+    directory (config.archive_cachedir). The next pull_data (or data_update) of that version resumes the
+    download from where it stopped instead of starting again. A tarball that is already
+    in the archive cache is used without downloading it again.
+
     A file lock is used to prevent more than one data update (pull_data, measures_update,
     or data_update) from updating any files in path at the same time. When locked, the
     lock file (data_update.lock in path) contains information about the process that
@@ -75,6 +82,9 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
     to remove path completely or use a different path and run pull_data to install
     a fresh copy of the desired version.
 
+    A lock file left by an update that was killed is recovered automatically and the wait
+    for a lock held by another update is bounded, see get_data_lock and config.data_lock_policy.
+
     Some of the tables installed by pull_data are only read when casatools starts. Use of
     pull_data should typically be followed by a restart of CASA so that
     any changes are seen by the tools and tasks that use this data.
@@ -89,16 +99,18 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
        - force (bool=False) - If True, re-download and install the data even when the requested version matches what is already installed. Default False will not download data if the installed version matches the requested version.
        - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages. Messages are always written to the terminal. Default None does not write any messages to a logger.
        - verbose (int) - Level of output, 0 is none, 1 is to logger, 2 is to logger and terminal, defaults to casaconfig_verbose in the config dictionary.
+       - staging_dir (str=None) - A directory on fast local storage (e.g. local NVMe or /dev/shm) where the tarball is downloaded and extracted before it is published to path, copying only the files that are not already identical there. Default None uses config.staging_dir (when that is also None the tarball is extracted directly into path).
 
     Returns
        None
 
     Raises
-       - casaconfig.BadLock - raised when the lock file is not empty when a lock is requested
+       - casaconfig.BadLock - raised when the lock file is not empty when a lock is requested and it can not be recovered
+       - casaconfig.LockTimeout - raised when the lock on path is held by another update for longer than config.data_lock_wait seconds and config.data_lock_policy is 'wait'
        - casaconfig.BadReadme - raised when the readme.txt file found at path does not contain the expected list of installed files or there was an unexpected change while the data lock is on
        - casaconfig.NoNetwork - raised where this is no network
        - casaconfig.NotWritable - raised when the user does not have write permission to path
-       - casaconfig.RemoteError - raised by data_available when the list of available data versions could not be fetched for some reason other than no network
+       - casaconfig.RemoteError - raised by data_available when the list of available data versions could not be fetched for some reason other than no network or when the casarundata tarball could not be downloaded
        - casaconfig.UnsetMeasurespath - raised when path is None and and measurespath has not been set in config.
 
     """
@@ -107,11 +119,15 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
 
     from casaconfig import data_available
     from casaconfig import get_data_info
-    from casaconfig import UnsetMeasurespath, BadLock, BadReadme, NotWritable
+    from casaconfig import UnsetMeasurespath, BadLock, BadReadme, NotWritable, NoNetwork, LockTimeout
 
     from .print_log_messages import print_log_messages
-    from .get_data_lock import get_data_lock
+    from .get_data_lock import get_data_lock, release_data_lock
     from .do_pull_data import do_pull_data
+    from .fetch_archive import fetch_archive
+    from .publish import resolve_staging_dir
+    from .data_available import same_version, preferred_archive
+    from .data_urls import casarundata_urls
 
     if path is None:
         from .. import config as _config
@@ -173,7 +189,7 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
             available_data = data_available()
             version = available_data[-1]
 
-        do_pull = (version!=currentVersion) or force
+        do_pull = (not same_version(version, currentVersion)) or force
 
         if not do_pull:
             # it's already at the expected version and force is False, nothing to do
@@ -226,7 +242,7 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
         print_log_messages('pull_data using version %s, acquiring the lock ... ' % version, logger)
 
         # attempting to get the lock will raise NoNetwork if there is no network and the lock will not be set, catch and reemit that in this try block
-        lock_fd = get_data_lock(path, 'pull_data')
+        lock_fd = get_data_lock(path, 'pull_data', logger, type='casarundata')
         # the BadLock exception that may happen here is caught below
 
         do_pull = True
@@ -237,7 +253,7 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
             if readmeInfo is not None:
                 currentVersion = readmeInfo['version']
                 currentDate = readmeInfo['date']
-                if ((currentVersion == version) and (not force)):
+                if (same_version(currentVersion, version) and (not force)):
                     if expectedMeasuresVersion is not None:
                         # this is a release pull and the measures version must also match
                         # start off assuming a pull is necessary
@@ -272,9 +288,13 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
                         raise BadReadme('pull_data : the readme.txt file at path did not contain the expected list of installed files after the lock was obtained, this should never happen.')
 
         if do_pull:
+            # fetch the tarball first, nothing at path has changed yet so the lock can be cleaned if this fails
+            # an interrupted download is resumed by the next attempt
+            staging_dir = resolve_staging_dir(staging_dir)
+            archive = fetch_archive(casarundata_urls(), preferred_archive(version, available_data), logger, download_dir=staging_dir)
             # do not clean the lock file contents at this point unless do_pull_data returns normally
             clean_lock = False
-            do_pull_data(path, version, installed_files, currentVersion, currentDate, logger)
+            do_pull_data(path, version, installed_files, currentVersion, currentDate, logger, archive, staging_dir=staging_dir)
             clean_lock = True
             if namedVersion:
                 # a specific version has been requested, set the times on the measures readme.txt to now to avoid
@@ -292,6 +312,14 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
         print_log_messages(msgs, logger, True)
         # reraise this
         raise
+    except LockTimeout as exc:
+        # nothing at path has changed, the lock was never obtained
+        from .. import config as _config
+        if _config.data_lock_policy == 'skip' and currentVersion is not None:
+            print_log_messages('pull_data skipped : %s' % str(exc), logger)
+            return
+        print_log_messages(str(exc), logger, True)
+        raise
     except BadReadme as exc:
         # something is wrong in the readme after an update was triggered and locked, this shouldn't happen, print more context and reraise this
         msgs = [str(exc)]
@@ -313,9 +341,8 @@ def pull_data(path=None, version=None, force=False, logger=None, verbose=None):
 
     finally:
         # make sure the lock file is closed and also clean the lock file if safe to do so, this is always executed
+        # a lock file that is not cleaned is marked as failed and it will not be recovered automatically
         if lock_fd is not None and not lock_fd.closed:
-            if clean_lock:
-                lock_fd.truncate(0)
-            lock_fd.close()
+            release_data_lock(lock_fd, clean_lock)
 
     return
@@ -0,0 +1,106 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+def recover_install(path, info, logger=None):
+    """
+    Recover path after an update that held the lock did not finish (its process was
+    killed or its host went away). The lock must be held by the caller.
+
+    The info dictionary is what that update last wrote to the lock file (see lock_info.py).
+
+    Any staged install that was interrupted is cleaned up first (see recover_staging),
+    an interrupted swap is undone so that the previously installed directories are back
+    in place.
+
+    If that update had started to change path (info['install'] is set) then that install
+    is done again from the beginning : the archive is fetched (normally it is still in the
+    archive cache) and installed using do_pull_data (casarundata) or do_measures_update
+    (measures). For casarundata the files to be removed first are those from the last
+    install recorded in the install state database, which is only changed when an install
+    finishes, or from the readme.txt file when that describes a different version (a staged
+    install records its state just before it swaps its directories and readme.txt file into
+    place, an interrupted swap has been undone by then). Anything that had not yet been
+    changed is left as it is.
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - path (str) - the location of the installed data (measurespath)
+       - info (dict) - the lock information left by the update that did not finish
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages.
+
+    Returns
+       None
+
+    Raises
+       - casaconfig.RemoteError - raised when the archive could not be fetched
+       - Exception - raised when something unexpected happened during the recovery
+
+    """
+
+    import os
+
+    from .print_log_messages import print_log_messages
+    from .read_readme import read_readme
+    from .staged_install import recover_staging
+    from .install_state import installed_state
+    from .get_data_info import get_data_info
+    from .fetch_archive import fetch_archive
+    from .data_available import preferred_archive
+    from .data_urls import casarundata_urls, measures_urls
+    from .do_pull_data import do_pull_data
+    from .do_measures_update import do_measures_update
+
+    if recover_staging(path):
+        print_log_messages('  ... removed what was left by an interrupted staged install in %s' % path, logger)
+
+    install = info.get('install')
+    if install is None:
+        # nothing in path had been changed
+        return
+
+    type = install.get('type')
+    version = install.get('version')
+    print_log_messages('  ... finishing the install of %s version %s in %s' % (type, version, path), logger)
+
+    if type == 'casarundata':
+        state = installed_state(path, 'casarundata', manifest=True, check_readme=False)
+        readme = read_readme(os.path.join(path, 'readme.txt'))
+        if state is not None and readme is not None and readme['version'] != state['version']:
+            # the state of a staged install whose swap did not finish, the readme describes what is installed
+            state = None
+        if state is not None:
+            files = state['manifest']
+            prevVersion = state['version']
+            prevDate = state['date']
+        else:
+            # an install from before the install state database was used, the readme may already be gone
+            dataInfo = get_data_info(path, logger, type='casarundata')
+            if dataInfo is not None and dataInfo['version'] not in ('invalid', 'unknown', 'error'):
+                files = dataInfo['manifest']
+                prevVersion = dataInfo['version']
+                prevDate = dataInfo['date']
+            else:
+                files = []
+                prevVersion = ''
+                prevDate = ''
+        archive = fetch_archive(casarundata_urls(), preferred_archive(version), logger)
+        do_pull_data(path, version, files, prevVersion, prevDate, logger, archive)
+    elif type == 'measures':
+        archive = fetch_archive(measures_urls(), version, logger)
+        do_measures_update(path, version, archive, logger, install.get('use_astron_obs_table', False))
+    else:
+        raise ValueError('unknown install type in the lock file : %s' % type)
+
+    print_log_messages('  ... recovered the install of %s version %s in %s' % (type, version, path), logger)
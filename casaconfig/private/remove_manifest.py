@@ -0,0 +1,90 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+def remove_manifest(path, manifest):
+    """
+    Remove the files in manifest (paths relative to path) and then remove any of the
+    directories containing those files that are left empty.
+
+    The manifest is grouped by directory. Each directory is scanned once (using os.scandir)
+    and the manifest files found there are removed, with the directories handled concurrently
+    by a pool of config.remove_workers threads. Manifest entries that are not found are
+    silently ignored, as are directories in the manifest that are not files or links.
+
+    Only the directories that contained manifest files, and the directories above them up
+    to path, are candidates for removal. These are removed deepest first and only if they
+    are empty. Nothing else in path is examined.
+
+    This function is intended for internal casaconfig use.
+
+    Parameters
+       - path (str) - the location of the installed files
+       - manifest (str list) - the installed files, relative to path
+
+    Returns
+       - the number of files removed
+
+    """
+
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .. import config as _config
+
+    # the names in each directory that are to be removed
+    by_dir = {}
+    for relpath in manifest:
+        (dirname, name) = os.path.split(os.path.normpath(relpath))
+        if len(name) == 0 or name == '..' or dirname.startswith('..') or os.path.isabs(dirname):
+            # never remove anything outside of path
+            continue
+        by_dir.setdefault(dirname, set()).add(name)
+
+    def remove_in_dir(dirname):
+        names = by_dir[dirname]
+        dirpath = os.path.join(path, dirname)
+        removed = 0
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if entry.name in names and not entry.is_dir(follow_symlinks=False):
+                        try:
+                            os.unlink(entry.path)
+                            removed += 1
+                        except FileNotFoundError:
+                            pass
+        except (FileNotFoundError, NotADirectoryError):
+            # nothing to remove here
+            pass
+        return removed
+
+    nworkers = max(1, _config.remove_workers)
+    with ThreadPoolExecutor(max_workers=nworkers) as pool:
+        nremoved = sum(pool.map(remove_in_dir, list(by_dir)))
+
+    # the affected directories and everything above them, up to but not including path
+    candidates = set()
+    for dirname in by_dir:
+        while len(dirname) > 0 and dirname not in candidates:
+            candidates.add(dirname)
+            dirname = os.path.dirname(dirname)
+
+    # deepest first, rmdir fails if the directory is not empty
+    for dirname in sorted(candidates, key=lambda d: d.count(os.sep), reverse=True):
+        try:
+            os.rmdir(os.path.join(path, dirname))
+        except OSError:
+            pass
+
+    return nremoved
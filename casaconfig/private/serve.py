@@ -0,0 +1,455 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+A mirror of the casarundata and measures tarballs for a cluster of casaconfig clients
+(python -m casaconfig --serve).
+
+The mirror serves :
+
+   - /casarundata/ and /measures/ : directory listings of the available versions (as used by data_available and measures_available)
+   - /casarundata/<version> and /measures/<version> : the tarballs (as used by pull_data, data_update and measures_update), with Range requests
+   - / : a short text response, used by the clients as their network probe
+
+The listings are fetched from the upstream servers (config.casarundata_mirrors and
+config.measures_mirrors, by default go.nrao.edu and astron.nl) and
+saved in the catalogs directory in config.cachedir (see fetch_catalog). A tarball is
+fetched from upstream the first time it is requested and kept in the mirror directory.
+While a tarball is being fetched, every request for it is answered from what has
+arrived so far so that one upstream download is shared by all clients. When an upstream
+location fails the fetch moves on to the next one (continuing from where it stopped) so
+that the waiting clients are only sent an error when none of them can provide it.
+
+Clients use the mirror by setting config.data_mirror_url to its url
+(e.g. http://mirrorhost:8080).
+
+These functions are intended for internal casaconfig use.
+"""
+
+import threading
+
+# the types served and their upstream locations and version filters, set by serve
+_sources = {}
+
+# fills in progress by tarball path
+_fills = {}
+_fills_lock = threading.Lock()
+
+# size of each read from upstream and each write to a client
+_CHUNK_SIZE = 1024*1024
+
+class _Fill:
+    """
+    A tarball being fetched from upstream into the mirror. The tarball is written in order
+    to path + '.part' which is renamed to path once it is complete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.part_path = path + '.part'
+        self.total = None
+        self.etag = None
+        self.last_modified = None
+        self.written = 0
+        self.started = False
+        self.done = False
+        self.error = None
+        self.last_error = None
+        self.cond = threading.Condition()
+
+    def run(self, roots, name, logger):
+        """
+        Fetch name from the first of the upstream locations in roots that can provide it. A
+        fetch that fails part way through continues from the next location.
+        """
+        import os
+        import json
+
+        from .transport import resolve
+        from .print_log_messages import print_log_messages
+
+        try:
+            url = None
+            for root in roots:
+                url = None
+                try:
+                    url = resolve(root).rstrip('/') + '/' + name
+                    self.fetch(url)
+                    break
+                except Exception as exc:
+                    print_log_messages('mirror : failed to fetch %s : %s' % (url or root, str(exc)), logger, is_err=True)
+                    self.last_error = exc
+            else:
+                raise IOError('no upstream location provided %s : %s' % (name, str(self.last_error)))
+            with open(self.path + '.meta', 'w') as fid:
+                json.dump({'etag':self.etag, 'last_modified':self.last_modified}, fid)
+            with self.cond:
+                os.rename(self.part_path, self.path)
+                self.total = self.written
+                self.done = True
+                self.cond.notify_all()
+            print_log_messages('mirror : fetched %s (%d bytes)' % (url, self.written), logger)
+        except Exception as exc:
+            print_log_messages('mirror : failed to fetch %s : %s' % (name, str(exc)), logger, is_err=True)
+            with self.cond:
+                self.error = exc
+                self.cond.notify_all()
+            try:
+                os.remove(self.part_path)
+            except OSError:
+                pass
+        finally:
+            with _fills_lock:
+                _fills.pop(self.path, None)
+
+    def fetch(self, url):
+        """
+        Fetch url into part_path, continuing after what has already been written (the
+        clients may already have been sent those bytes, they are not fetched again).
+        """
+        import re
+
+        from .transport import urlopen
+
+        headers = {}
+        if self.written > 0:
+            headers['Range'] = 'bytes=%d-' % self.written
+        with urlopen(url, headers=headers, timeout=400) as stream:
+            length = int(stream.headers.get('content-length', 0)) or None
+            skip = 0
+            if self.written > 0:
+                # the rest of the same tarball is expected from this location
+                total = length
+                if stream.status == 206:
+                    match = re.match(r'bytes (\d+)-(\d+)/(\d+)', stream.headers.get('content-range', ''))
+                    if match is None or int(match.group(1)) != self.written:
+                        raise IOError('unexpected range from %s : %s' % (url, stream.headers.get('content-range')))
+                    total = int(match.group(3))
+                else:
+                    skip = self.written
+                if self.total is not None and total != self.total:
+                    raise IOError('%s is not the same size as the tarball being fetched' % url)
+            with open(self.part_path, 'ab' if self.written > 0 else 'wb') as fid:
+                with self.cond:
+                    if not self.started:
+                        self.total = length
+                        self.etag = stream.headers.get('etag')
+                        self.last_modified = stream.headers.get('last-modified')
+                        self.started = True
+                        self.cond.notify_all()
+                while True:
+                    data = stream.read(_CHUNK_SIZE)
+                    if not data:
+                        break
+                    if skip > 0:
+                        # already written from the previous location
+                        dropped = min(skip, len(data))
+                        data = data[dropped:]
+                        skip -= dropped
+                        if not data:
+                            continue
+                    fid.write(data)
+                    fid.flush()
+                    with self.cond:
+                        self.written += len(data)
+                        self.cond.notify_all()
+        if self.total is not None and self.written != self.total:
+            raise IOError('expected %d bytes from %s, got %d' % (self.total, url, self.written))
+
+    def wait_headers(self):
+        """Wait until the upstream response has started, returns False if the fetch failed."""
+        with self.cond:
+            while not self.started and self.error is None:
+                self.cond.wait()
+            return self.error is None
+
+    def wait_for(self, pos):
+        """Wait until more than pos bytes have arrived, returns the number available (or raises the fetch error)."""
+        with self.cond:
+            while self.written <= pos and not self.done and self.error is None:
+                self.cond.wait()
+            if self.error is not None:
+                raise IOError('upstream fetch failed : %s' % str(self.error))
+            return self.written
+
+def _open_tarball(type, name, logger):
+    """
+    Return (fid, size or None, fill or None, etag, last_modified) for the tarball, starting
+    the fetch from upstream if necessary. Returns None if name is not a known version.
+    """
+    import os
+    import json
+
+    (url_roots, catalog, is_version, mirrordir) = _sources[type]
+    if '/' in name or name.startswith('.') or name.endswith(('.part', '.meta')) or not is_version(name):
+        return None
+    path = os.path.join(mirrordir, name)
+
+    def validators():
+        try:
+            with open(path + '.meta', 'r') as fid:
+                meta = json.load(fid)
+        except (OSError, ValueError):
+            meta = {}
+        st = os.stat(path)
+        return (meta.get('etag') or '"%x-%x"' % (st.st_size, int(st.st_mtime)), meta.get('last_modified'))
+
+    def opened():
+        # the complete tarball or the fill in progress, if either exists, must be called holding _fills_lock
+        fill = _fills.get(path)
+        if fill is None and os.path.exists(path):
+            (etag, last_modified) = validators()
+            fid = open(path, 'rb')
+            return ((fid, os.fstat(fid.fileno()).st_size, None, etag, last_modified), None)
+        return (None, fill)
+
+    with _fills_lock:
+        (result, fill) = opened()
+    if result is not None:
+        return result
+
+    if fill is None:
+        # only versions found upstream are fetched, the network is not used while holding the lock
+        if name not in _listing(type):
+            return None
+        roots = url_roots()
+        with _fills_lock:
+            (result, fill) = opened()
+            if result is not None:
+                return result
+            if fill is None:
+                fill = _Fill(path)
+                _fills[path] = fill
+                threading.Thread(target=fill.run, args=(roots, name, logger), name='casaconfig-mirror-fill', daemon=True).start()
+
+    if not fill.wait_headers():
+        raise IOError('upstream fetch of %s failed : %s' % (name, str(fill.error)))
+    with fill.cond:
+        # the fill may have finished (and renamed the file) in the mean time
+        fid = open(fill.path if fill.done else fill.part_path, 'rb')
+        return (fid, fill.total, None if fill.done else fill, fill.etag, fill.last_modified)
+
+def _listing(type):
+    """The versions of type available upstream, from the first upstream location that lists them."""
+    from casaconfig import RemoteError
+    from .fetch_catalog import fetch_catalog
+
+    (url_roots, catalog, is_version, mirrordir) = _sources[type]
+    roots = url_roots()
+    for root in roots[:-1]:
+        try:
+            return fetch_catalog(catalog, root, is_version, '%s versions' % type, use_mirror=False)
+        except RemoteError:
+            # try the next location
+            pass
+    return fetch_catalog(catalog, roots[-1], is_version, '%s versions' % type, use_mirror=False)
+
+def _make_handler(logger):
+    import http.server
+
+    from .print_log_messages import print_log_messages
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        server_version = 'casaconfig-mirror'
+
+        def log_message(self, format, *args):
+            print_log_messages('mirror : %s %s' % (self.address_string(), format % args), logger, verbose=1)
+
+        def do_HEAD(self):
+            self.handle_request(send_body=False)
+
+        def do_GET(self):
+            self.handle_request(send_body=True)
+
+        def send_text(self, status, text, send_body, content_type='text/plain', headers=None):
+            body = text.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for (key, value) in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def handle_request(self, send_body):
+            import urllib.parse
+
+            parts = urllib.parse.urlsplit(self.path).path.split('/')
+            # ['', ''] for '/', ['', type] or ['', type, ''] for a listing, ['', type, name] for a tarball
+            if len(parts) == 2 and parts[1] == '':
+                self.send_text(200, 'casaconfig mirror\n', send_body)
+            elif len(parts) == 2 and parts[1] in _sources:
+                self.send_text(301, '', send_body, headers={'Location':'/%s/' % parts[1]})
+            elif len(parts) == 3 and parts[1] in _sources:
+                if parts[2] == '':
+                    self.send_listing(parts[1], send_body)
+                else:
+                    self.send_tarball(parts[1], urllib.parse.unquote(parts[2]), send_body)
+            else:
+                self.send_text(404, 'not found\n', send_body)
+
+        def send_listing(self, type, send_body):
+            import hashlib
+            import html
+
+            from casaconfig import NoNetwork, RemoteError
+
+            try:
+                versions = _listing(type)
+            except (NoNetwork, RemoteError) as exc:
+                self.send_text(502, '%s\n' % str(exc), send_body)
+                return
+            body = '<html><body>\n' + ''.join('<a href="%s">%s</a>\n' % (html.escape(v), html.escape(v)) for v in versions) + '</body></html>\n'
+            etag = '"%s"' % hashlib.sha256(body.encode()).hexdigest()[:32]
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_text(200, body, send_body, content_type='text/html', headers={'ETag':etag})
+
+        def send_tarball(self, type, name, send_body):
+            import os
+            import re
+
+            try:
+                opened = _open_tarball(type, name, logger)
+            except Exception as exc:
+                self.send_text(502, 'unable to fetch %s : %s\n' % (name, str(exc)), send_body)
+                return
+            if opened is None:
+                self.send_text(404, 'not found\n', send_body)
+                return
+            (fid, total, fill, etag, last_modified) = opened
+            try:
+                start = 0
+                end = None if total is None else total - 1
+                status = 200
+                rangeHeader = self.headers.get('Range')
+                ifRange = self.headers.get('If-Range')
+                match = None if rangeHeader is None else re.match(r'bytes=(\d+)-(\d*)$', rangeHeader.strip())
+                if match is not None and total is not None and (ifRange is None or ifRange in (etag, last_modified)):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(end, int(match.group(2)))
+                    if start > end:
+                        self.send_text(416, '', send_body, headers={'Content-Range':'bytes */%d' % total})
+                        return
+                    status = 206
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Accept-Ranges', 'bytes')
+                if etag is not None:
+                    self.send_header('ETag', etag)
+                if last_modified is not None:
+                    self.send_header('Last-Modified', last_modified)
+                if status == 206:
+                    self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, total))
+                if end is not None:
+                    self.send_header('Content-Length', str(end - start + 1))
+                else:
+                    # the size is not known until the fetch is done
+                    self.send_header('Connection', 'close')
+                    self.close_connection = True
+                self.end_headers()
+                if not send_body:
+                    return
+                pos = start
+                while end is None or pos <= end:
+                    available = fill.wait_for(pos) if fill is not None else total
+                    if fill is not None and fill.done and end is None:
+                        end = fill.total - 1
+                    if pos >= available:
+                        break
+                    nbytes = min(_CHUNK_SIZE, available - pos) if end is None else min(_CHUNK_SIZE, available - pos, end + 1 - pos)
+                    data = os.pread(fid.fileno(), nbytes, pos)
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    pos += len(data)
+            except (OSError, IOError):
+                # the client went away or the fetch failed, the client can resume
+                self.close_connection = True
+            finally:
+                fid.close()
+
+    return Handler
+
+def make_server(mirrordir=None, host='', port=8080, logger=None):
+    """
+    Set up the casarundata and measures mirror in mirrordir and return its server (an
+    http.server.ThreadingHTTPServer listening on host and port that has not started
+    serving yet). See serve for the parameters.
+    """
+    import os
+    import functools
+    import http.server
+
+    from .data_urls import select_urls
+    from .data_available import is_version as is_casarundata_version
+    from .measures_available import is_version as is_measures_version
+    from .. import config as _config
+
+    if mirrordir is None:
+        mirrordir = os.path.join(os.path.abspath(os.path.expanduser(_config.cachedir)), 'mirror')
+    mirrordir = os.path.abspath(os.path.expanduser(mirrordir))
+
+    _sources.clear()
+    for (type, is_version) in (('casarundata', is_casarundata_version), ('measures', is_measures_version)):
+        # this is the source for the clients, it does not use a mirror itself
+        url_roots = functools.partial(select_urls, type, use_mirror=False)
+        typedir = os.path.join(mirrordir, type)
+        os.makedirs(typedir, exist_ok=True)
+        # anything left by a fetch that was interrupted is fetched again when it's requested
+        for f in os.listdir(typedir):
+            if f.endswith('.part'):
+                os.remove(os.path.join(typedir, f))
+        _sources[type] = (url_roots, 'mirror-' + type, is_version, typedir)
+
+    server = http.server.ThreadingHTTPServer((host, port), _make_handler(logger))
+    server.daemon_threads = True
+    server.mirrordir = mirrordir
+    return server
+
+def serve(mirrordir=None, host='', port=8080, logger=None):
+    """
+    Run the casarundata and measures mirror until interrupted.
+
+    The mirror always fetches from the upstream servers (config.casarundata_mirrors and
+    config.measures_mirrors, in the order chosen as described in data_urls.py, moving on to
+    the next one when a fetch fails). config.data_mirror_url is not used here. See the module
+    documentation for what is served.
+
+    Parameters
+       - mirrordir (str=None) - where the tarballs are kept, defaults to the 'mirror' directory in config.cachedir
+       - host (str='') - the address to listen on, '' listens on all interfaces
+       - port (int=8080) - the port to listen on
+       - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages.
+
+    Returns
+       None
+
+    """
+    from .print_log_messages import print_log_messages
+
+    server = make_server(mirrordir, host, port, logger)
+    print_log_messages('casaconfig mirror of %s and %s in %s serving on port %d' % (', '.join(_sources['casarundata'][0]()), ', '.join(_sources['measures'][0]()), server.mirrordir, server.server_address[1]), logger)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
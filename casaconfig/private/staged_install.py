@@ -0,0 +1,208 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Functions used to install casarundata and measures in a staging directory and then
+swap the staged directories into place.
+
+The staging directory is a hidden directory inside path (and so it is on the same
+filesystem as the installed data) named with the STAGING_PREFIX followed by the pid
+of the installing process. Once a new version has been completely extracted there,
+each top-level entry in the staging directory is swapped with the entry of the same
+name in path using two renames. The entries being replaced are moved to a hidden
+directory named with the RETIRED_PREFIX and the pid that is removed once the swap
+is complete. Readers of path therefore see either the old or the new version of
+each top-level directory and never a partially extracted one.
+
+These functions are intended for internal casaconfig use.
+"""
+
+STAGING_PREFIX = '.casaconfig-staging-'
+RETIRED_PREFIX = '.casaconfig-retired-'
+
+def make_staging_dir(path):
+    """
+    Create and return a new, empty staging directory in path for use by this process.
+
+    Parameters
+       - path (str) - the location of the installed data
+
+    Returns
+       - the path to the staging directory
+    """
+
+    import os
+    import shutil
+
+    staging = os.path.join(path, STAGING_PREFIX + str(os.getpid()))
+    if os.path.exists(staging):
+        # left over from an earlier process with the same pid
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+    return staging
+
+def carry_over(live, staged, exclude=None, relpath=''):
+    """
+    Make sure that everything in the live directory that is not in the staged directory
+    will still be there after the staged directory replaces the live one.
+
+    Each entry in live that does not exist in staged is hard linked (copied if a hard link
+    is not possible) into staged, recursively for directories. Directories found in both
+    are descended into. Files found in both are left as staged.
+
+    Parameters
+       - live (str) - the directory that is going to be replaced
+       - staged (str) - the directory that is going to replace it
+       - exclude (set=None) - paths that should not be carried over (e.g. files from the manifest of the version being replaced). Each entry in live is relpath joined with the path of that entry relative to live when compared with exclude.
+       - relpath (str='') - the path that entries in live are relative to when compared with exclude
+
+    Returns
+       None
+    """
+
+    import os
+    import shutil
+
+    if exclude is None:
+        exclude = set()
+
+    def link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    for entry in os.scandir(live):
+        entryRel = os.path.join(relpath, entry.name)
+        if entryRel in exclude:
+            continue
+        target = os.path.join(staged, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            if os.path.isdir(target) and not os.path.islink(target):
+                carry_over(entry.path, target, exclude, entryRel)
+            elif not os.path.lexists(target):
+                os.makedirs(target)
+                carry_over(entry.path, target, exclude, entryRel)
+                shutil.copystat(entry.path, target)
+        elif not os.path.lexists(target):
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            else:
+                link_or_copy(entry.path, target)
+
+def swap_into_place(path, staging):
+    """
+    Swap each top-level entry in staging into path, replacing any entry of the same name
+    already in path. The staging directory is removed when it's done.
+
+    The replaced entries are moved out of the way into a retired directory in path first and
+    that directory is removed after all of the entries have been swapped. A readme.txt file
+    in staging is swapped after everything else so that it only describes the new version
+    once all of it is in place.
+
+    Parameters
+       - path (str) - the location of the installed data
+       - staging (str) - the staging directory, in path, containing the new entries
+
+    Returns
+       - the list of the names of the entries that were swapped into path
+    """
+
+    import os
+    import shutil
+
+    retired = os.path.join(path, RETIRED_PREFIX + str(os.getpid()))
+    os.makedirs(retired, exist_ok=True)
+
+    swapped = []
+    for name in sorted(os.listdir(staging), key=lambda name: (name == 'readme.txt', name)):
+        livePath = os.path.join(path, name)
+        if os.path.lexists(livePath):
+            os.rename(livePath, os.path.join(retired, name))
+        os.rename(os.path.join(staging, name), livePath)
+        swapped.append(name)
+
+    os.rmdir(staging)
+    shutil.rmtree(retired)
+    return swapped
+
+def recover_staging(path):
+    """
+    Clean up after staged installs in path that were interrupted (the installing process
+    was killed). Only use this while holding the lock on path.
+
+    A swap that was interrupted (its staging directory still has entries that were not
+    swapped in) is undone by moving the retired entries back into place. A retired
+    directory left after a swap that completed is removed, as are all staging directories.
+
+    Parameters
+       - path (str) - the location of the installed data
+
+    Returns
+       - True if anything was found and cleaned up
+    """
+
+    import os
+    import shutil
+
+    def remove(entryPath):
+        if os.path.isdir(entryPath) and not os.path.islink(entryPath):
+            shutil.rmtree(entryPath)
+        else:
+            os.unlink(entryPath)
+
+    found = False
+    for name in os.listdir(path):
+        if not name.startswith(RETIRED_PREFIX):
+            continue
+        found = True
+        retired = os.path.join(path, name)
+        staging = os.path.join(path, STAGING_PREFIX + name[len(RETIRED_PREFIX):])
+        if os.path.isdir(staging) and len(os.listdir(staging)) > 0:
+            # the swap did not finish, put back what it replaced
+            for entry in os.listdir(retired):
+                livePath = os.path.join(path, entry)
+                if os.path.lexists(livePath):
+                    remove(livePath)
+                os.rename(os.path.join(retired, entry), livePath)
+        shutil.rmtree(retired)
+
+    for name in os.listdir(path):
+        if name.startswith(STAGING_PREFIX):
+            found = True
+            shutil.rmtree(os.path.join(path, name))
+
+    return found
+
+def write_atomic(filepath, text):
+    """
+    Write text to filepath so that readers see either the previous contents or all of the
+    new contents. The text is written to a temporary file in the same directory which is
+    then renamed to filepath.
+
+    Parameters
+       - filepath (str) - the file to write
+       - text (str) - the new contents
+
+    Returns
+       None
+    """
+
+    import os
+
+    tmp_path = os.path.join(os.path.dirname(filepath), '.%s.%s.tmp' % (os.path.basename(filepath), os.getpid()))
+    with open(tmp_path, 'w') as fid:
+        fid.write(text)
+        fid.flush()
+        os.fsync(fid.fileno())
+    os.replace(tmp_path, filepath)
@@ -0,0 +1,459 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The transport used by all casaconfig remote operations.
+
+This replaces the use of urllib.request.urlopen with one that shares state
+across all of the remote operations in a process:
+
+   - one SSL context (using the certifi CA bundle) is created and reused
+   - connections are kept open after each response and reused by later requests to the same host (several may be open to a host at once, e.g. for a segmented download)
+   - permanent redirects (301 and 308) are remembered (for REDIRECT_TTL seconds) so that later requests for a url that redirected go directly to where it redirected to, temporary redirects are followed again each time
+
+file:// urls (e.g. a copy of the tarballs on a shared filesystem) are also opened
+here, with responses that look like those of a web server for the same files.
+
+The responses and exceptions mimic urllib.request.urlopen : HTTPError is raised for
+any final status that is not 2xx (including 304) and URLError is raised when the
+server can not be reached. The proxies in the environment (e.g. https_proxy) are used
+as urllib would use them.
+
+These functions are intended for internal casaconfig use.
+"""
+
+import threading
+
+# seconds that a permanent redirect is remembered
+REDIRECT_TTL = 3600
+
+# most idle connections kept open to each host
+MAX_IDLE = 8
+
+# redirects remembered by url as (location, time.monotonic() when seen)
+_redirects = {}
+
+# idle connections by (scheme, host, port)
+_idle = {}
+
+_ssl_context = None
+_lock = threading.Lock()
+
+def ssl_context():
+    """
+    Return the SSL context used by all casaconfig https connections, creating it the first time.
+    """
+
+    global _ssl_context
+
+    import ssl
+    import certifi
+
+    with _lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context(cafile=certifi.where())
+        return _ssl_context
+
+def _proxy_for(scheme, host):
+    # the (host, port, authorization header) of the proxy to use for scheme and host, or None
+    import base64
+    import urllib.request
+    import urllib.parse
+
+    proxy = urllib.request.getproxies().get(scheme)
+    if proxy is None or urllib.request.proxy_bypass(host):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    parsed = urllib.parse.urlsplit(proxy)
+    auth = None
+    if parsed.username is not None:
+        credentials = '%s:%s' % (urllib.parse.unquote(parsed.username), urllib.parse.unquote(parsed.password or ''))
+        auth = 'Basic ' + base64.b64encode(credentials.encode()).decode('ascii')
+    return (parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80), auth)
+
+def _new_connection(scheme, host, port, timeout):
+    import http.client
+
+    proxy = _proxy_for(scheme, host)
+    if proxy is None:
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=ssl_context())
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    (proxyHost, proxyPort, auth) = proxy
+    proxyHeaders = {} if auth is None else {'Proxy-Authorization':auth}
+    if scheme == 'https':
+        conn = http.client.HTTPSConnection(proxyHost, proxyPort, timeout=timeout, context=ssl_context())
+        conn.set_tunnel(host, port, headers=proxyHeaders)
+    else:
+        conn = http.client.HTTPConnection(proxyHost, proxyPort, timeout=timeout)
+    # requests through a plain http proxy use the full url, remember that here
+    conn._casaconfig_proxied = (scheme == 'http')
+    conn._casaconfig_proxy_headers = proxyHeaders
+    return conn
+
+def _get_connection(key, timeout):
+    # an idle connection to key if there is one (reused is True), otherwise a new one
+    with _lock:
+        conns = _idle.get(key)
+        if conns:
+            conn = conns.pop()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return (conn, True)
+    return (_new_connection(key[0], key[1], key[2], timeout), False)
+
+def _put_connection(key, conn):
+    with _lock:
+        conns = _idle.setdefault(key, [])
+        if len(conns) < MAX_IDLE:
+            conns.append(conn)
+            return
+    conn.close()
+
+def close_connections():
+    """
+    Close all idle connections.
+    """
+    with _lock:
+        conns = [c for cl in _idle.values() for c in cl]
+        _idle.clear()
+    for conn in conns:
+        conn.close()
+
+class Response:
+    """
+    A response from urlopen. This is a file-like object (read, readline, iteration over
+    lines) with the status, headers, and final url. Use it as a context manager (or call
+    close) so that the connection can be reused.
+    """
+
+    def __init__(self, url, key, conn, response, sock=None):
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._sock = sock
+        self._aborted = False
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def readline(self, limit=-1):
+        return self._response.readline(limit)
+
+    def __iter__(self):
+        return iter(self._response)
+
+    def getcode(self):
+        return self.status
+
+    def abort(self):
+        """
+        Stop this response from another thread, a read waiting for data returns (or raises)
+        at once. The connection is not reused.
+        """
+        import socket
+
+        self._aborted = True
+        if self._conn is not None and self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._conn is None:
+            return
+        response = self._response
+        # a short remaining body is read so that the connection can be reused
+        try:
+            if not self._aborted and not response.isclosed() and response.length is not None and response.length <= 65536:
+                response.read()
+        except Exception:
+            pass
+        if response.isclosed() and not response.will_close and not self._aborted:
+            _put_connection(self._key, self._conn)
+        else:
+            response.close()
+            self._conn.close()
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+class FileResponse:
+    """
+    A response from urlopen for a file:// url. A directory is returned as an html listing
+    of the names it contains (like a web server's directory listing). A file is returned
+    with an ETag (from its size and modification time) and Last-Modified header and a
+    single Range request (bytes=start-end) is honored (206) as a web server would.
+    """
+
+    def __init__(self, url, status, headers, fid, length):
+        self.url = url
+        self.status = status
+        self.reason = 'Partial Content' if status == 206 else 'OK'
+        self.headers = headers
+        self._fid = fid
+        self._remaining = length
+
+    def read(self, amt=None):
+        if self._fid is None or self._remaining <= 0:
+            return b''
+        if amt is None or amt < 0 or amt > self._remaining:
+            amt = self._remaining
+        data = self._fid.read(amt)
+        self._remaining -= len(data)
+        return data
+
+    def readline(self, limit=-1):
+        if self._fid is None or self._remaining <= 0:
+            return b''
+        if limit is None or limit < 0 or limit > self._remaining:
+            limit = self._remaining
+        data = self._fid.readline(limit)
+        self._remaining -= len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def getcode(self):
+        return self.status
+
+    def abort(self):
+        # a read of a local file does not wait for data, the next check for a cancel stops it
+        pass
+
+    def close(self):
+        if self._fid is not None:
+            self._fid.close()
+            self._fid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+def _open_file(url, method, headers):
+    # open a file:// url, returns a FileResponse
+    import io
+    import os
+    import re
+    import html
+    import hashlib
+    import email.message
+    import email.utils
+    import urllib.parse
+    import urllib.request
+    import urllib.error
+
+    path = urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+    responseHeaders = email.message.Message()
+
+    def error(code, reason):
+        return urllib.error.HTTPError(url, code, reason, responseHeaders, io.BytesIO(b''))
+
+    if os.path.isdir(path):
+        try:
+            names = sorted(os.listdir(path))
+        except OSError as exc:
+            raise urllib.error.URLError(exc)
+        body = ('<html><body>\n' + ''.join('<a href="%s">%s</a>\n' % (html.escape(urllib.parse.quote(n)), html.escape(n)) for n in names) + '</body></html>\n').encode()
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        responseHeaders['Content-Type'] = 'text/html; charset=utf-8'
+        responseHeaders['ETag'] = etag
+        if headers.get('If-None-Match') == etag:
+            raise error(304, 'Not Modified')
+        responseHeaders['Content-Length'] = str(len(body))
+        return FileResponse(url, 200, responseHeaders, None if method == 'HEAD' else io.BytesIO(body), len(body))
+
+    try:
+        fid = open(path, 'rb')
+    except FileNotFoundError:
+        raise error(404, 'Not Found')
+    except OSError as exc:
+        raise urllib.error.URLError(exc)
+    st = os.fstat(fid.fileno())
+    etag = '"%x-%x"' % (st.st_size, st.st_mtime_ns)
+    lastModified = email.utils.formatdate(st.st_mtime, usegmt=True)
+    responseHeaders['Content-Type'] = 'application/octet-stream'
+    responseHeaders['Accept-Ranges'] = 'bytes'
+    responseHeaders['ETag'] = etag
+    responseHeaders['Last-Modified'] = lastModified
+
+    status = 200
+    start = 0
+    end = st.st_size - 1
+    match = re.match(r'bytes=(\d+)-(\d*)$', headers.get('Range', '').strip())
+    ifRange = headers.get('If-Range')
+    if match is not None and (ifRange is None or ifRange in (etag, lastModified)):
+        start = int(match.group(1))
+        if match.group(2):
+            end = min(end, int(match.group(2)))
+        if start > end:
+            fid.close()
+            raise error(416, 'Range Not Satisfiable')
+        status = 206
+        responseHeaders['Content-Range'] = 'bytes %d-%d/%d' % (start, end, st.st_size)
+    responseHeaders['Content-Length'] = str(end + 1 - start)
+    if method == 'HEAD':
+        fid.close()
+        fid = None
+    else:
+        fid.seek(start)
+    return FileResponse(url, status, responseHeaders, fid, end + 1 - start)
+
+def _request_once(url, method, headers, timeout):
+    # send one request to url, returns a Response, reusing a connection if possible
+    import http.client
+    import urllib.parse
+    import urllib.error
+
+    parsed = urllib.parse.urlsplit(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in ('http', 'https'):
+        raise urllib.error.URLError('unsupported url scheme : %s' % url)
+    host = parsed.hostname
+    port = parsed.port or (443 if scheme == 'https' else 80)
+    key = (scheme, host, port)
+
+    target = parsed.path or '/'
+    if parsed.query:
+        target += '?' + parsed.query
+
+    while True:
+        (conn, reused) = _get_connection(key, timeout)
+        reqHeaders = dict(headers)
+        reqPath = target
+        if getattr(conn, '_casaconfig_proxied', False):
+            reqPath = urllib.parse.urlunsplit((scheme, parsed.netloc, parsed.path or '/', parsed.query, ''))
+            reqHeaders.update(conn._casaconfig_proxy_headers)
+        try:
+            conn.request(method, reqPath, headers=reqHeaders)
+            # the connection lets go of its socket when the response is the last one on it
+            sock = conn.sock
+            response = conn.getresponse()
+            return Response(url, key, conn, response, sock)
+        except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError) as exc:
+            conn.close()
+            if reused:
+                # the server closed the idle connection, try again on a new one
+                continue
+            raise urllib.error.URLError(exc)
+        except (OSError, http.client.HTTPException) as exc:
+            conn.close()
+            raise urllib.error.URLError(exc)
+
+def urlopen(url, headers=None, method='GET', timeout=400):
+    """
+    Open url, following any redirects, and return a Response. A file:// url returns a
+    FileResponse that behaves as a web server's response for that file or directory would.
+
+    Parameters
+       - url (str) - the http, https or file url to open
+       - headers (dict=None) - any additional request headers (e.g. Range)
+       - method (str='GET') - the request method
+       - timeout (float=400) - seconds to wait for the connection and for each read
+
+    Returns
+       - a Response
+
+    Raises
+       - urllib.error.HTTPError - the final response status was not 2xx
+       - urllib.error.URLError - the server could not be reached
+    """
+
+    import io
+    import time
+    import urllib.parse
+    import urllib.request
+    import urllib.error
+
+    reqHeaders = {'User-Agent':'Python-urllib/%s' % urllib.request.__version__}
+    if headers is not None:
+        reqHeaders.update(headers)
+
+    if urllib.parse.urlsplit(url).scheme.lower() == 'file':
+        # a local (or shared filesystem) source, nothing to connect to
+        return _open_file(url, method, reqHeaders)
+
+    # go directly to where this url redirected to last time
+    seen = 0
+    with _lock:
+        while url in _redirects and seen < 10:
+            (location, when) = _redirects[url]
+            if (time.monotonic() - when) > REDIRECT_TTL:
+                del _redirects[url]
+                break
+            url = location
+            seen += 1
+
+    for redirect in range(10):
+        response = _request_once(url, method, reqHeaders, timeout)
+        location = response.headers.get('location')
+        if response.status in (301, 302, 303, 307, 308) and location is not None:
+            response.close()
+            newurl = urllib.parse.urljoin(url, location)
+            if response.status in (301, 308):
+                # only a permanent redirect is remembered
+                with _lock:
+                    _redirects[url] = (newurl, time.monotonic())
+            url = newurl
+            if response.status == 303:
+                method = 'GET'
+            continue
+        if (response.status // 100) != 2:
+            status = response.status
+            reason = response.reason
+            headers = response.headers
+            response.close()
+            raise urllib.error.HTTPError(url, status, reason, headers, io.BytesIO(b''))
+        return response
+
+    raise urllib.error.URLError('too many redirects for %s' % url)
+
+def resolve(url, timeout=400):
+    """
+    Return the url that url redirects to (or url if it does not redirect). A permanent
+    redirect is remembered for later calls and for later requests to url.
+
+    Raises
+       - urllib.error.URLError - the server could not be reached or the final status was an error
+    """
+
+    import urllib.error
+
+    try:
+        with urlopen(url, method='HEAD', timeout=timeout) as response:
+            return response.url
+    except urllib.error.HTTPError as httperr:
+        if httperr.code not in (405, 501):
+            raise
+    # HEAD is not supported, use GET without reading the body
+    with urlopen(url, timeout=timeout) as response:
+        return response.url
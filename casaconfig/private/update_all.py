@@ -15,7 +15,7 @@
 this module will be included in the api
 """
 
-def update_all(path=None, logger=None, force=False, verbose=None):
+def update_all(path=None, logger=None, force=False, verbose=None, staging_dir=None):
     """
     Update the data contants at path to the most recently released versions
     of casarundata and measures data. 
@@ -43,6 +43,21 @@ def update_all(path=None, logger=None, force=False, verbose=None):
     This uses pull_data, data_update and measures_update. See the
     documentation for those functions for additional details (e.g. verbose argument).
 
+    Before data_update and measures_update are used, the lists of available casarundata
+    and measures versions are fetched and the most recent casarundata and measures
+    tarballs are downloaded at the same time into the archive cache, when the same
+    checks that data_update and measures_update use show that they would be installed
+    (see update_target.py). data_update and measures_update then find those tarballs
+    in the archive cache and only need the lock on path while they install them, in
+    that order (measures must be installed after casarundata). Any tarball that was
+    downloaded but not installed is only kept if the archive cache has room for it.
+    casaconfig.aio.update_all does this download itself and turns it off here (see
+    call_controls.py).
+
+    The staging_dir argument is passed to pull_data, data_update and measures_update. When
+    the archive cache does not keep archives (config.archive_cache_size is 0) the tarballs
+    are downloaded into staging_dir and any that were not installed are removed from there.
+
     Some of the data updated by this function is only read when casatools starts.
     Use of update_all after CASA has started should typically be followed by a restart 
     so that any changes are seen by the tools and tasks that use this data.
@@ -51,6 +66,7 @@ def update_all(path=None, logger=None, force=False, verbose=None):
        - path (str=None) - Folder path to place casarundata contents. It must not exist, or be empty, or contain a valid, previously installed version. If it exists, it must be owned by the user. Default None uses the value of measurespath set by importing config.py.
        - logger (casatools.logsink=None) - Instance of the casalogger to use for writing messages. Messages are always written to the terminal. Default None does not write any messages to a logger.
        - verbose (int) - Level of output, 0 is none, 1 is to logger, 2 is to logger and terminal, defaults to casaconfig_verbose in the config dictionary.
+       - staging_dir (str=None) - A directory on fast local storage where the tarballs are downloaded and extracted before they are published to path. Default None uses config.staging_dir (when that is also None the tarballs are extracted directly into path).
 
     Returns
        None
@@ -58,12 +74,19 @@ def update_all(path=None, logger=None, force=False, verbose=None):
     """
 
     import os
+    from concurrent.futures import ThreadPoolExecutor
 
     from .print_log_messages import print_log_messages
+    from .fetch_archive import fetch_archive
+    from .update_target import update_target
+    from .data_urls import casarundata_urls, measures_urls
+    from .archive_cache import release_archive
+    from .publish import resolve_staging_dir, remove_staged_archive
     from .get_data_info import get_data_info
     from .pull_data import pull_data
     from .data_update import data_update
     from .measures_update import measures_update
+    from .call_controls import prefetch as prefetch_allowed
 
     if path is None:
         from casaconfig import config
@@ -90,9 +113,11 @@ def update_all(path=None, logger=None, force=False, verbose=None):
         print_log_messages(msgs, logger, False)
         return
 
+    staging_dir = resolve_staging_dir(staging_dir)
+
     # if path is empty, first use pull_data
     if len(os.listdir(path))==0:
-        pull_data(path, logger, verbose=verbose)
+        pull_data(path, logger=logger, verbose=verbose, staging_dir=staging_dir)
         # double check that it's not empty
         if len(os.listdir(path))==0:
             print_log_messages("pull_data failed, see the error messages for more details. update_all can not continue")
@@ -116,8 +141,38 @@ def update_all(path=None, logger=None, force=False, verbose=None):
         print_log_messages('contents at path appear to be casarundata but no readme.txt was found, casaconfig did not populate this data and update_all can not continue, path = %s', path, logger)
         return
 
-    # the updates should work now
-    data_update(path, logger, force=force, verbose=verbose)
-    measures_update(path, logger, force=force, verbose=verbose)
+    # fetch what is likely to be installed, the casarundata and measures come from different hosts
+    # this uses the same decision as data_update and measures_update (called as they are below)
+    # failures here are ignored, data_update and measures_update will try again and report any problems
+    def prefetch(type, url_roots):
+        # the locations are found once, the message for a failure must not fail itself
+        roots = None
+        try:
+            target = update_target(path, type, force=force)
+            if target is None:
+                return None
+            roots = url_roots()
+            return fetch_archive(roots, target, logger, download_dir=staging_dir)
+        except Exception as exc:
+            print_log_messages('unable to prefetch %s from %s : %s' % (type, 'its locations' if not roots else roots[0], str(exc)), logger, verbose=1)
+            return None
+
+    prefetched = []
+    if prefetch_allowed():
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            dataFuture = pool.submit(prefetch, 'casarundata', casarundata_urls)
+            measuresFuture = pool.submit(prefetch, 'measures', measures_urls)
+            prefetched = [f.result() for f in [dataFuture, measuresFuture]]
+
+    # the updates should work now, each one takes the lock while it changes path
+    try:
+        data_update(path, logger=logger, force=force, verbose=verbose, staging_dir=staging_dir)
+        measures_update(path, logger=logger, force=force, verbose=verbose, staging_dir=staging_dir)
+    finally:
+        # anything fetched but not installed is subject to the archive cache size or is removed from staging_dir
+        for archive in prefetched:
+            if archive is not None and os.path.exists(archive):
+                release_archive(archive)
+                remove_staged_archive(archive, staging_dir)
 
     return
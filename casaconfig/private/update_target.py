@@ -0,0 +1,189 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+The tarball that pull_data, data_update or measures_update would install, used to
+decide what to download before those functions are used (see update_all and aio).
+
+These make the same decisions, in the same order, as the functions they describe but
+they never change anything at path and they never print anything. Whenever one of
+those functions would return or raise an exception without installing anything then
+None is returned here. The exceptions raised while fetching the list of available
+versions (NoNetwork, RemoteError) are not caught here.
+"""
+
+def pull_target(path=None, version=None, force=False):
+    """
+    The name of the casarundata tarball that pull_data would install at path with these
+    arguments, or None if pull_data would not install anything.
+
+    Parameters
+       - path (str=None) - as for pull_data. If not set then config.measurespath is used.
+       - version (str=None) - as for pull_data.
+       - force (bool=False) - as for pull_data.
+
+    Returns
+       str or None
+    """
+
+    import os
+
+    from .get_data_info import get_data_info
+    from .data_available import data_available, same_version, preferred_archive
+
+    if path is None:
+        from .. import config as _config
+        path = _config.measurespath
+
+    if path is None:
+        return None
+
+    path = os.path.expanduser(path)
+
+    available = None
+    readmeInfo = get_data_info(path, None, type='casarundata')
+    if readmeInfo is not None:
+        if readmeInfo['version'] in ['invalid', 'unknown', 'error']:
+            return None
+        if readmeInfo['manifest'] is None or len(readmeInfo['manifest']) == 0:
+            return None
+        if version is None:
+            available = data_available()
+            version = available[-1]
+        if same_version(version, readmeInfo['version']) and not force:
+            return None
+
+    if version is None:
+        if available is None:
+            available = data_available()
+        version = available[-1]
+
+    if version == 'release':
+        releaseInfo = get_data_info()['release']
+        if releaseInfo is None:
+            return None
+        version = releaseInfo['casarundata']
+    else:
+        if available is None:
+            available = data_available()
+        if version not in available:
+            return None
+
+    if os.path.exists(path) and not os.access(path, os.W_OK | os.X_OK):
+        return None
+
+    return preferred_archive(version, available)
+
+def update_target(path=None, type='casarundata', version=None, force=False, auto_update_rules=False):
+    """
+    The name of the tarball that data_update (type 'casarundata') or measures_update (type
+    'measures') would install at path with these arguments, or None if that update would
+    not install anything (including when auto_update_rules is True and the update is not
+    allowed, or when the installed version was checked less than a day ago or is already
+    the requested version).
+
+    Parameters
+       - path (str=None) - as for data_update and measures_update. If not set then config.measurespath is used.
+       - type (str='casarundata') - the type of update, 'casarundata' for data_update or 'measures' for measures_update.
+       - version (str=None) - as for data_update and measures_update.
+       - force (bool=False) - as for data_update and measures_update.
+       - auto_update_rules (bool=False) - as for data_update and measures_update.
+
+    Returns
+       str or None
+    """
+
+    import os
+
+    from .get_data_info import get_data_info
+    from .data_available import data_available, same_version, preferred_archive
+    from .measures_available import measures_available
+
+    if path is None:
+        from .. import config as _config
+        path = _config.measurespath
+
+    if path is None:
+        return None
+
+    path = os.path.expanduser(path)
+
+    if auto_update_rules:
+        if version is not None or force:
+            return None
+        if (not os.path.isdir(path)) or (os.stat(path).st_uid != os.getuid()):
+            return None
+
+    if type == 'measures':
+        readmeInfo = get_data_info(path, None, type='measures')
+        current = None
+        ageRecent = False
+        if readmeInfo is not None:
+            current = readmeInfo['version']
+            if readmeInfo['age'] is not None:
+                ageRecent = readmeInfo['age'] < 1.0
+
+        if not force:
+            if version is None and ageRecent:
+                return None
+            if current in ['invalid', 'error', 'unknown']:
+                return None
+            if version is None:
+                version = measures_available()[-1]
+            if version == current:
+                return None
+            if not os.path.isdir(os.path.join(path, 'geodetic/Observatories')):
+                return None
+
+        if os.path.exists(path) and not os.access(path, os.W_OK | os.X_OK):
+            return None
+
+        if version is None:
+            version = measures_available()[-1]
+        return version
+
+    if not os.path.exists(os.path.join(path, 'readme.txt')):
+        # data_update only installs into an empty path, with pull_data
+        if not os.path.isdir(path) or len(os.listdir(path)) > 0:
+            return None
+        return pull_target(path, version, force)
+
+    if not os.access(path, os.W_OK | os.X_OK):
+        return None
+
+    readmeInfo = get_data_info(path, None, type='casarundata')
+    if readmeInfo is None or readmeInfo['version'] in ['invalid', 'unknown', 'error']:
+        return None
+    if readmeInfo['manifest'] is None or len(readmeInfo['manifest']) == 0:
+        return None
+
+    if version is None and not force and readmeInfo['age'] is not None and readmeInfo['age'] < 1.0:
+        return None
+
+    available = data_available()
+    if version is None:
+        version = available[-1]
+
+    if version == 'release':
+        releaseInfo = get_data_info()['release']
+        if releaseInfo is None:
+            return None
+        version = releaseInfo['casarundata']
+
+    if version not in available:
+        return None
+
+    if not force and same_version(readmeInfo['version'], version):
+        return None
+
+    return preferred_archive(version, available)
@@ -0,0 +1,128 @@
+# Copyright 2026 AUI, Inc. Washington DC, USA
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""
+Benchmark of the extraction engines used to install casarundata and measures.
+
+A synthetic archive shaped like casarundata (a top-level version directory holding
+a few trees of casacore tables, each table a directory of several small files, plus
+a few larger files) is written to a temporary directory and then extracted with each
+engine. The members per second and the time taken by each stage are printed.
+
+   python tests/benchmark_extraction.py [--tables 2000] [--engines pipeline,batched] [--writers 4] [--repeat 3] [--compression gz]
+
+This is not run as part of the tests.
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import tarfile
+import argparse
+import tempfile
+
+def make_archive(archive, ntables, compression):
+    """
+    Write a casarundata shaped archive with ntables tables and return the number of members.
+    """
+    import random
+
+    rng = random.Random(12345)
+
+    def payload(size):
+        # between half and all of size bytes of random data
+        n = rng.randint(size//2, size)
+        return rng.randbytes(n) if hasattr(rng, 'randbytes') else os.urandom(n)
+    top = 'casarundata-0.0.0'
+    trees = ['geodetic', 'ephemerides/JPL-Horizons', 'alma/catalogs', 'nrao/VLA', 'gui', 'dish']
+    # the files of a casacore table and their typical sizes in bytes
+    table_files = [('table.dat', 2000), ('table.f0', 8000), ('table.f0i', 200), ('table.info', 100), ('table.lock', 325), ('table.f1', 30000)]
+
+    nmembers = 0
+    with tarfile.open(archive, 'w:' + compression if compression else 'w') as tar:
+        def add(name, data=None, mode=0o644):
+            # a directory when data is None
+            nonlocal nmembers
+            info = tarfile.TarInfo(name)
+            info.mtime = 1700000000
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                info.mode = mode
+                tar.addfile(info, fileobj=io.BytesIO(data))
+            nmembers += 1
+
+        add(top)
+        made = set()
+        for i in range(ntables):
+            tree = trees[i % len(trees)]
+            parts = (top + '/' + tree).split('/')
+            for j in range(2, len(parts)+1):
+                d = '/'.join(parts[:j])
+                if d not in made:
+                    add(d)
+                    made.add(d)
+            table = '%s/%s/Table%05d' % (top, tree, i)
+            add(table)
+            for (name, size) in table_files:
+                add(table + '/' + name, payload(size))
+        # a few larger files
+        for i in range(4):
+            add('%s/large%d.bin' % (top, i), os.urandom(8*1024*1024))
+    return nmembers
+
+def main():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from casaconfig import config
+    from casaconfig.private.extract_archive import extract_archive
+    from casaconfig.private.extraction_engines import ENGINES
+
+    parser = argparse.ArgumentParser(description='benchmark the casaconfig extraction engines')
+    parser.add_argument('--tables', type=int, default=2000, help='the number of tables in the synthetic archive (6 files each)')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='comma separated list of the engines to benchmark')
+    parser.add_argument('--writers', type=int, default=config.extract_writers, help='the number of writer threads (config.extract_writers, 0 chooses from the filesystem type)')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of extractions with each engine, the best is reported')
+    parser.add_argument('--compression', default='', choices=['', 'gz', 'bz2', 'xz'], help='the compression of the synthetic archive')
+    parser.add_argument('--dir', default=None, help='the directory to use for the archive and the extractions (a temporary directory by default)')
+    args = parser.parse_args()
+
+    config.extract_writers = args.writers
+    workdir = tempfile.mkdtemp(prefix='casaconfig-bench-', dir=args.dir)
+    try:
+        archive = os.path.join(workdir, 'casarundata-0.0.0.tar' + ('.' + args.compression if args.compression else ''))
+        t0 = time.perf_counter()
+        nmembers = make_archive(archive, args.tables, args.compression)
+        print('wrote %s : %d members, %.1f MB in %.1fs' % (os.path.basename(archive), nmembers, os.path.getsize(archive)/(1024*1024), time.perf_counter()-t0))
+
+        data_filter = getattr(tarfile, 'data_filter', (lambda member, path: member))
+        for engine in args.engines.split(','):
+            best = None
+            for i in range(args.repeat):
+                dest = os.path.join(workdir, 'extract')
+                shutil.rmtree(dest, ignore_errors=True)
+                os.makedirs(dest)
+                stats = extract_archive(archive, dest, data_filter, logger=None, file_info={}, engine=engine)
+                if best is None or stats['total'] < best['total']:
+                    best = stats
+            print('%-10s %8.0f members/s  total %.2fs  parse %.2fs  parse wait %.2fs  write wait %.2fs  write %.2fs (over %d writers)' %
+                  (engine, best['members']/best['total'], best['total'], best['parse'], best['parse_wait'], best['write_wait'], best['write'], best['writers']))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import unittest
+import os, functools, http.server, shutil, tempfile, threading, time
+
+from casaconfig import config
+from casaconfig.private.archive_cache import add_archive, cached_archive, evict_archives, release_archive
+from casaconfig.private.fetch_archive import fetch_archive
+
+class archive_cache_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['cachedir', 'archive_cachedir', 'archive_cache_size', 'download_segments']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-cache-')
+        self.serveDir = os.path.join(self.testDir, 'srv')
+        os.makedirs(self.serveDir)
+        config.cachedir = self.testDir
+        config.archive_cachedir = 'archives'
+        config.archive_cache_size = 1024*1024
+        config.download_segments = 1
+        self.cacheDir = os.path.join(self.testDir, 'archives')
+
+        # the archives are served from a local http server
+        handler = functools.partial(quiet_handler, directory=self.serveDir)
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.requests = []
+        self.serverThread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.serverThread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def cache(self, name, content, used=None):
+        # put an archive with this content into the cache, last used at used (seconds since the epoch)
+        os.makedirs(self.cacheDir, exist_ok=True)
+        archive = os.path.join(self.cacheDir, name)
+        with open(archive, 'wb') as fid:
+            fid.write(content)
+        add_archive(archive)
+        if used is not None:
+            os.utime(archive + '.sha256', (used, used))
+        return archive
+
+    def test_cached_archive(self):
+        '''Test that an archive that matches its record is used from the cache'''
+        archive = self.cache('a.tar.gz', b'a'*1000)
+        self.assertTrue(cached_archive('a.tar.gz') == archive, "the cached archive was not found")
+        self.assertTrue(cached_archive('b.tar.gz') is None, "an archive that is not in the cache was found")
+
+    def test_corrupt_archive(self):
+        '''Test that a cached archive that no longer matches its record is removed and downloaded again'''
+        content = b'good archive content'*100
+        with open(os.path.join(self.serveDir, 'a.tar.gz'), 'wb') as fid:
+            fid.write(content)
+        archive = self.cache('a.tar.gz', content)
+
+        # same size, different content and modification time
+        with open(archive, 'r+b') as fid:
+            fid.write(b'bad')
+        st = os.stat(archive)
+        os.utime(archive, (st.st_atime, st.st_mtime + 10))
+
+        self.assertTrue(cached_archive('a.tar.gz') is None, "a changed archive was used from the cache")
+        self.assertTrue(not os.path.exists(archive), "a changed archive was not removed from the cache")
+        self.assertTrue(not os.path.exists(archive + '.sha256'), "the record of a changed archive was not removed")
+
+        # corrupt it again, fetch_archive must download it rather than use the bad copy
+        self.cache('a.tar.gz', content)
+        with open(archive, 'r+b') as fid:
+            fid.write(b'bad')
+        os.utime(archive, (st.st_atime, st.st_mtime + 20))
+        fetched = fetch_archive(self.url, 'a.tar.gz')
+        with open(fetched, 'rb') as fid:
+            self.assertTrue(fid.read() == content, "the archive was not downloaded again")
+
+        # an unreadable record is treated the same way
+        with open(fetched + '.sha256', 'w') as fid:
+            fid.write('{not json')
+        self.assertTrue(cached_archive('a.tar.gz') is None, "an archive with an unreadable record was used from the cache")
+        self.assertTrue(not os.path.exists(fetched), "an archive with an unreadable record was not removed")
+
+    def test_upstream_changed(self):
+        '''Test that a cached archive is only used while the data host reports the validators it was downloaded with'''
+        import json
+        served = os.path.join(self.serveDir, 'a.tar.gz')
+        with open(served, 'wb') as fid:
+            fid.write(b'first'*100)
+        os.utime(served, (time.time()-1000, time.time()-1000))
+        fetched = fetch_archive(self.url, 'a.tar.gz')
+        with open(fetched + '.sha256') as fid:
+            record = json.load(fid)
+        self.assertTrue(record['url'] == self.url + '/a.tar.gz' and record['last_modified'] is not None, "the validators of the download were not recorded : %s" % record)
+
+        # unchanged upstream, only checked
+        self.server.requests.clear()
+        self.assertTrue(fetch_archive(self.url, 'a.tar.gz') == fetched, "the cached archive was not used")
+        self.assertTrue(self.server.requests == ['HEAD'], "unexpected requests for an unchanged archive : %s" % self.server.requests)
+
+        # replaced upstream under the same name
+        with open(served, 'wb') as fid:
+            fid.write(b'second'*100)
+        self.server.requests.clear()
+        fetched = fetch_archive(self.url, 'a.tar.gz')
+        with open(fetched, 'rb') as fid:
+            self.assertTrue(fid.read() == b'second'*100, "the changed archive was not downloaded again")
+        self.assertTrue('GET' in self.server.requests, "the changed archive was not downloaded again : %s" % self.server.requests)
+
+        # the cached copy is used when the data host can not be reached
+        self.server.server_close()
+        self.assertTrue(fetch_archive(self.url, 'a.tar.gz') == fetched, "the cached archive was not used without the data host")
+
+    def test_eviction(self):
+        '''Test that the least recently used archives are evicted first'''
+        now = time.time()
+        old = self.cache('old.tar.gz', b'o'*400, used=now-300)
+        mid = self.cache('mid.tar.gz', b'm'*400, used=now-200)
+        new = self.cache('new.tar.gz', b'n'*400, used=now-100)
+
+        evict_archives(800)
+        self.assertTrue(not os.path.exists(old) and not os.path.exists(old + '.sha256'), "the least recently used archive was not evicted")
+        self.assertTrue(os.path.exists(mid) and os.path.exists(new), "more archives than necessary were evicted")
+
+        # using an archive makes it the most recently used
+        self.assertTrue(cached_archive('mid.tar.gz') == mid, "the cached archive was not found")
+        evict_archives(400)
+        self.assertTrue(not os.path.exists(new), "the least recently used archive was not evicted")
+        self.assertTrue(os.path.exists(mid), "the most recently used archive was evicted")
+
+        # the archive being released is kept even when it is over budget
+        config.archive_cache_size = 100
+        release_archive(mid)
+        self.assertTrue(os.path.exists(mid), "the released archive was evicted")
+
+        # with no budget nothing is kept
+        config.archive_cache_size = 0
+        release_archive(mid)
+        self.assertTrue(not os.path.exists(mid) and not os.path.exists(mid + '.sha256'), "the released archive was kept with no budget")
+
+class quiet_handler(http.server.SimpleHTTPRequestHandler):
+    # server.requests records the method of each request
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.server.requests.append('HEAD')
+        super().do_HEAD()
+
+    def do_GET(self):
+        self.server.requests.append('GET')
+        super().do_GET()
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,260 @@
+import unittest
+import os, io, shutil, sys, subprocess, tarfile, tempfile, threading, time
+
+from casaconfig import config, BadLock, LockTimeout, pull_data, data_update
+from casaconfig.private.get_data_lock import get_data_lock, release_data_lock
+from casaconfig.private.call_controls import controls
+from casaconfig.private.do_pull_data import do_pull_data
+from casaconfig.private.lock_info import LOCK_NAME, lock_text, read_lock_info
+
+# tries to get the lock on argv[1] with the backend (argv[2]) in another process without waiting, prints 'locked' or 'timeout'
+# the lock information in the lock file is not looked at, only the exclusion provided by the backend
+contender = """
+import os, sys
+from casaconfig import config
+from casaconfig.private.lock_info import LOCK_NAME
+from casaconfig.private.lock_backends import lock_backend
+config.data_lock_backend = sys.argv[2]
+with open(os.path.join(sys.argv[1], LOCK_NAME), 'a+') as fd:
+    backend = lock_backend(sys.argv[1], fd)
+    print('locked' if backend.acquire() else 'timeout')
+    backend.release()
+"""
+
+class data_lock_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['data_mirror_url', 'casarundata_mirrors', 'measures_mirrors', 'data_lock_backend', 'data_lock_wait', 'data_lock_policy', 'data_install_mode', 'cachedir', 'data_lock_lease']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-lock-')
+        self.path = os.path.join(self.testDir, 'data')
+        self.mirror = os.path.join(self.testDir, 'mirror')
+        os.makedirs(self.path)
+        os.makedirs(self.mirror)
+        # everything is local so no network is needed to get the lock
+        config.data_mirror_url = None
+        config.casarundata_mirrors = [self.mirror]
+        config.measures_mirrors = [self.mirror]
+        config.data_lock_policy = 'wait'
+        config.cachedir = os.path.join(self.testDir, 'cache')
+
+    def tearDown(self):
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def other_process(self, backend):
+        # the result of trying to get the lock from another process
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(config.__file__))) + os.pathsep + env.get('PYTHONPATH', '')
+        proc = subprocess.run([sys.executable, '-c', contender, self.path, backend], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, timeout=120)
+        return proc.stdout.decode().strip().split('\n')[-1]
+
+    def contend(self, backend):
+        config.data_lock_backend = backend
+        config.data_lock_wait = None
+        holder = get_data_lock(self.path, 'holder')
+        try:
+            # another thread of this process waits and gives up while this thread holds the lock
+            results = []
+            def waiter():
+                # this thread waits for at most 0.3 seconds (as a casaconfig.aio caller would)
+                try:
+                    with controls(lock_timeout=0.3):
+                        fd = get_data_lock(self.path, 'waiter')
+                    release_data_lock(fd)
+                    results.append('locked')
+                except LockTimeout:
+                    results.append('timeout')
+            threads = [threading.Thread(target=waiter) for i in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertTrue(results == ['timeout', 'timeout'], "%s : threads waiting for the lock did not time out : %s" % (backend, results))
+
+            # the lock must still exclude other processes after the waiting threads gave up
+            self.assertTrue(self.other_process(backend) == 'timeout', "%s : another process got the lock while it was held" % backend)
+        finally:
+            release_data_lock(holder)
+
+        # a thread waiting as long as necessary gets the lock once it is released, and then excludes other processes
+        holder = get_data_lock(self.path, 'holder')
+        got = threading.Event()
+        done = threading.Event()
+        def blocked():
+            fd = get_data_lock(self.path, 'blocked')
+            got.set()
+            done.wait(60)
+            release_data_lock(fd)
+        t = threading.Thread(target=blocked)
+        t.start()
+        try:
+            time.sleep(0.3)
+            self.assertTrue(not got.is_set(), "%s : a waiting thread got the lock while it was held" % backend)
+            release_data_lock(holder)
+            self.assertTrue(got.wait(30), "%s : the waiting thread did not get the lock after it was released" % backend)
+            self.assertTrue(self.other_process(backend) == 'timeout', "%s : another process got the lock held by the waiting thread" % backend)
+        finally:
+            done.set()
+            t.join()
+
+        # nothing holds it now
+        self.assertTrue(self.other_process(backend) == 'locked', "%s : the lock was not released" % backend)
+
+    def tarball(self, tarPath, version):
+        # a casarundata tarball for version at tarPath
+        with tarfile.open(tarPath, 'w:gz') as tar:
+            info = tarfile.TarInfo('%s/geodetic/%s' % (version, version))
+            info.size = 1
+            tar.addfile(info, io.BytesIO(b'a'))
+
+    def install(self, version):
+        # install version at path
+        tarPath = os.path.join(self.testDir, version + '.tar.gz')
+        self.tarball(tarPath, version)
+        config.data_install_mode = 'inplace'
+        do_pull_data(self.path, version + '.tar.gz', [], '', '', None, tarPath)
+
+    def left_by(self, **kwargs):
+        # a lock file left by an update that did not finish, kwargs replace the defaults
+        now = time.time()
+        info = {'fn':'pull_data', 'user':'someone', 'host':os.uname().nodename, 'pid':os.getpid(), 'started':now, 'updated':now,
+                'lease':60, 'stage':'extract', 'item':None, 'done':None, 'total':None, 'install':None}
+        info.update(kwargs)
+        with open(os.path.join(self.path, LOCK_NAME), 'w') as fid:
+            fid.write(lock_text(info))
+
+    def dead_pid(self):
+        # the pid of a process on this host that has exited
+        proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+        proc.wait()
+        return proc.pid
+
+    def other_thread(self, fn, *args, **kwargs):
+        # (what fn returned or raised, seconds taken) when called in another thread
+        result = []
+        def call():
+            started = time.monotonic()
+            try:
+                result.append(fn(*args, **kwargs))
+            except Exception as exc:
+                result.append(exc)
+            result.append(time.monotonic() - started)
+        t = threading.Thread(target=call)
+        t.start()
+        t.join(60)
+        return tuple(result)
+
+    def test_lock_policy(self):
+        '''Test that the wait for a held lock ends after data_lock_wait seconds and what the callers do then with each data_lock_policy'''
+        # two casarundata versions in the local mirror
+        for version in ['casarundata-1.2.3.tar.gz', 'casarundata-1.2.4.tar.gz']:
+            open(os.path.join(self.mirror, version), 'wb').close()
+        config.data_lock_wait = 0.5
+        holder = get_data_lock(self.path, 'holder')
+        try:
+            (result, elapsed) = self.other_thread(get_data_lock, self.path, 'waiter')
+            self.assertTrue(isinstance(result, LockTimeout) and 0.4 < elapsed < 10., "the wait did not end after data_lock_wait : %s after %.1fs" % (result, elapsed))
+            self.assertTrue('holder' in str(result), "the holder is not reported : %s" % result)
+
+            # with 'skip' there is no wait by default, pull_data still raises when nothing is installed yet
+            config.data_lock_wait = None
+            config.data_lock_policy = 'skip'
+            (result, elapsed) = self.other_thread(pull_data, self.path)
+            self.assertTrue(isinstance(result, LockTimeout) and elapsed < 5., "pull_data into an empty path did not raise : %s after %.1fs" % (result, elapsed))
+        finally:
+            release_data_lock(holder)
+
+        # casarundata-1.2.3 installed at path
+        self.install('casarundata-1.2.3')
+
+        holder = get_data_lock(self.path, 'holder')
+        try:
+            for fn in [pull_data, data_update]:
+                config.data_lock_policy = 'skip'
+                (result, elapsed) = self.other_thread(fn, self.path, version='casarundata-1.2.4.tar.gz')
+                self.assertTrue(result is None and elapsed < 5., "%s did not skip the update : %s after %.1fs" % (fn.__name__, result, elapsed))
+                config.data_lock_policy = 'wait'
+                config.data_lock_wait = 0.5
+                (result, elapsed) = self.other_thread(fn, self.path, version='casarundata-1.2.4.tar.gz')
+                self.assertTrue(isinstance(result, LockTimeout), "%s did not raise LockTimeout : %s" % (fn.__name__, result))
+                config.data_lock_wait = None
+        finally:
+            release_data_lock(holder)
+        with open(os.path.join(self.path, 'readme.txt')) as fid:
+            self.assertTrue('casarundata-1.2.3.tar.gz' in fid.read(), "the installed version was changed")
+
+    def test_lease(self):
+        '''Test that a lock file whose lease has expired, or whose process is gone, is recovered and a current lease is waited for'''
+        config.data_lock_wait = 0.5
+        for (what, kwargs) in [('an expired lease', {'updated':time.time() - 120}), ('a process that is gone', {'pid':self.dead_pid()})]:
+            self.left_by(**kwargs)
+            fd = get_data_lock(self.path, 'recovered')
+            (text, info) = read_lock_info(self.path)
+            self.assertTrue(info['fn'] == 'recovered' and info['stage'] == 'locked', "the lock file left by %s was not replaced : %s" % (what, text))
+            release_data_lock(fd)
+
+        # a failed update, or a lock file from an older casaconfig, is left for someone to examine
+        for (what, text) in [('a failed update', None), ('an older casaconfig', 'locked using pull_data by someone on somewhere : pid = 1 at 2024-01-01:00:00:00\n')]:
+            if text is None:
+                self.left_by(stage='failed', updated=time.time() - 1000)
+            else:
+                with open(os.path.join(self.path, LOCK_NAME), 'w') as fid:
+                    fid.write(text)
+            self.assertRaises(BadLock, get_data_lock, self.path, 'bad')
+            self.assertTrue(os.path.getsize(os.path.join(self.path, LOCK_NAME)) > 0, "the lock file left by %s was changed" % what)
+
+        # an update on another host that is still renewing its lease
+        self.left_by(host='elsewhere', pid=1, lease=2)
+        started = time.monotonic()
+        self.assertRaises(LockTimeout, get_data_lock, self.path, 'waiter')
+        self.assertTrue(time.monotonic() - started >= 0.4, "a current lease was not waited for")
+        # until it expires
+        config.data_lock_wait = 10
+        fd = get_data_lock(self.path, 'waiter')
+        release_data_lock(fd)
+        self.assertTrue(time.monotonic() - started < 10., "the expired lease was not recovered")
+
+    def test_heartbeat(self):
+        '''Test that the lease is renewed while the lock is held and a failed update leaves the lock file'''
+        config.data_lock_lease = 4
+        fd = get_data_lock(self.path, 'holder')
+        (text, first) = read_lock_info(self.path)
+        time.sleep(2.5)
+        (text, renewed) = read_lock_info(self.path)
+        self.assertTrue(renewed['updated'] > first['updated'] and renewed['lease'] == 4, "the lease was not renewed : %s" % text)
+        release_data_lock(fd, clean=False)
+        (text, info) = read_lock_info(self.path)
+        self.assertTrue(info is not None and info['stage'] == 'failed', "the failed update did not leave the lock file : %s" % text)
+
+    def test_recover(self):
+        '''Test that an install that was interrupted is done again by the next update to get the lock'''
+        self.install('casarundata-1.2.3')
+        self.tarball(os.path.join(self.mirror, 'casarundata-1.2.4.tar.gz'), 'casarundata-1.2.4')
+        # killed while it was installing casarundata-1.2.4
+        os.remove(os.path.join(self.path, 'geodetic', 'casarundata-1.2.3'))
+        self.left_by(pid=self.dead_pid(), install={'type':'casarundata', 'version':'casarundata-1.2.4.tar.gz'})
+        config.data_lock_wait = 10
+
+        fd = get_data_lock(self.path, 'recovered')
+        release_data_lock(fd)
+        with open(os.path.join(self.path, 'readme.txt')) as fid:
+            self.assertTrue('casarundata-1.2.4.tar.gz' in fid.read(), "the interrupted install was not done again")
+        self.assertTrue(os.listdir(os.path.join(self.path, 'geodetic')) == ['casarundata-1.2.4'], "unexpected files : %s" % os.listdir(os.path.join(self.path, 'geodetic')))
+        self.assertTrue(os.path.getsize(os.path.join(self.path, LOCK_NAME)) == 0, "the lock file was not cleaned")
+
+    def test_fcntl_lock(self):
+        '''Test that two threads and another process contending for the fcntl lock are excluded'''
+        self.contend('fcntl')
+
+    def test_link_lock(self):
+        '''Test that two threads and another process contending for the link lock are excluded'''
+        self.contend('link')
+
+    def test_rename_lock(self):
+        '''Test that two threads and another process contending for the rename lock are excluded'''
+        self.contend('rename')
+
+if __name__ == '__main__':
+
+    unittest.main()
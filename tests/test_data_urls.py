@@ -0,0 +1,108 @@
+import unittest
+import os, shutil, tempfile, urllib.error
+
+from casaconfig import config
+from casaconfig.private import data_urls, have_network, transport
+from casaconfig.private.fetch_archive import fetch_archive
+from casaconfig.private.data_available import data_available
+from casaconfig.private.archive_cache import archive_cache_dir
+
+class data_urls_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['data_mirror_url', 'casarundata_mirrors', 'measures_mirrors', 'cachedir', 'network_probe_url']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-urls-')
+        # a location that answers (an existing directory) and two that do not
+        self.present = os.path.join(self.testDir, 'present')
+        os.makedirs(os.path.join(self.present, 'casarundata'))
+        self.missing = os.path.join(self.testDir, 'missing')
+        self.mirror = os.path.join(self.testDir, 'mirror')
+        config.cachedir = os.path.join(self.testDir, 'cache')
+        data_urls._selected.clear()
+
+    def tearDown(self):
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        data_urls._selected.clear()
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def test_fallback_order(self):
+        '''Test that the locations that answer are used first'''
+        config.data_mirror_url = None
+        config.casarundata_mirrors = [self.missing, self.present]
+        urls = data_urls.select_urls('casarundata')
+        self.assertTrue(urls == [data_urls._as_url(self.present), data_urls._as_url(self.missing)], "unexpected order : %s" % urls)
+
+    def test_mirror_pinned(self):
+        '''Test that the configured mirror is always used first and only the fallbacks are ordered'''
+        config.data_mirror_url = self.mirror
+        config.casarundata_mirrors = [self.missing, self.present]
+        # the mirror does not answer the probe (and it would be slower than the others if it did), it is still first
+        urls = data_urls.select_urls('casarundata')
+        mirror = data_urls._as_url(self.mirror) + '/casarundata'
+        self.assertTrue(urls == [mirror, data_urls._as_url(self.present), data_urls._as_url(self.missing)], "unexpected order : %s" % urls)
+        self.assertTrue(data_urls.casarundata_url() == mirror, "the mirror is not used for the directory listing")
+
+        # with a single fallback there is nothing to probe
+        data_urls._selected.clear()
+        config.casarundata_mirrors = [self.present]
+        urls = data_urls.select_urls('casarundata')
+        self.assertTrue(urls == [mirror, data_urls._as_url(self.present)], "unexpected order : %s" % urls)
+
+    def test_local_sources(self):
+        '''Test that a copy on a local filesystem is used without the network'''
+        casarundata = os.path.join(self.present, 'casarundata')
+        for version in ['casarundata-1.2.3.tar.gz', 'casarundata-1.2.4.tar.gz']:
+            with open(os.path.join(casarundata, version), 'wb') as fid:
+                fid.write(b'0123456789')
+        config.data_mirror_url = None
+        config.casarundata_mirrors = [casarundata]
+        config.measures_mirrors = ['file://' + os.path.join(self.present, 'measures')]
+        self.assertTrue(data_urls.sources_are_local(), "the local locations are not local")
+        self.assertTrue(data_urls.local_path(data_urls.casarundata_url()) == casarundata, "unexpected local path : %s" % data_urls.casarundata_url())
+
+        # the directory listing and the archives are read without the network
+        config.network_probe_url = 'http://127.0.0.1:9/'
+        have_network._probe = None
+        try:
+            self.assertTrue(data_available() == ['casarundata-1.2.3.tar.gz', 'casarundata-1.2.4.tar.gz'], "unexpected versions : %s" % data_available())
+            archive = fetch_archive(data_urls.casarundata_urls(), 'casarundata-1.2.4.tar.gz')
+        finally:
+            have_network._probe = None
+        self.assertTrue(archive == os.path.join(casarundata, 'casarundata-1.2.4.tar.gz'), "the archive was not used where it is : %s" % archive)
+        self.assertTrue(not os.path.exists(archive_cache_dir()) or len(os.listdir(archive_cache_dir())) == 0, "the archive was copied into the archive cache")
+
+        config.measures_mirrors = ['https://casa.nrao.edu/measures']
+        self.assertTrue(data_urls.sources_are_local('casarundata') and not data_urls.sources_are_local(), "a remote location is local")
+
+    def test_file_response(self):
+        '''Test that a file:// url is answered as a web server would'''
+        casarundata = os.path.join(self.present, 'casarundata')
+        with open(os.path.join(casarundata, 'casarundata-1.2.3.tar.gz'), 'wb') as fid:
+            fid.write(b'0123456789')
+        url = data_urls._as_url(casarundata)
+
+        with transport.urlopen(url + '/') as response:
+            listing = response.read().decode()
+            etag = response.headers['ETag']
+        self.assertTrue('href="casarundata-1.2.3.tar.gz"' in listing, "unexpected listing : %s" % listing)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            transport.urlopen(url + '/', headers={'If-None-Match':etag})
+        self.assertTrue(context.exception.code == 304, "an unchanged listing was not 304 : %s" % context.exception.code)
+
+        with transport.urlopen(url + '/casarundata-1.2.3.tar.gz', method='HEAD') as response:
+            etag = response.headers['ETag']
+            self.assertTrue(response.status == 200 and response.read() == b'' and response.headers['Content-Length'] == '10', "unexpected HEAD response")
+        with transport.urlopen(url + '/casarundata-1.2.3.tar.gz', headers={'Range':'bytes=4-', 'If-Range':etag}) as response:
+            self.assertTrue(response.status == 206 and response.read() == b'456789' and response.headers['Content-Range'] == 'bytes 4-9/10', "unexpected Range response")
+        # the file changed, all of it is returned
+        with transport.urlopen(url + '/casarundata-1.2.3.tar.gz', headers={'Range':'bytes=4-', 'If-Range':'"changed"'}) as response:
+            self.assertTrue(response.status == 200 and response.read() == b'0123456789', "a Range was honored for a changed file")
+        for (name, headers, code) in [('missing.tar.gz', {}, 404), ('casarundata-1.2.3.tar.gz', {'Range':'bytes=20-'}, 416)]:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                transport.urlopen(url + '/' + name, headers=headers)
+            self.assertTrue(context.exception.code == code, "%s : unexpected status %s" % (name, context.exception.code))
+
+if __name__ == '__main__':
+
+    unittest.main()
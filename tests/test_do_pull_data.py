@@ -0,0 +1,139 @@
+import unittest
+import os, io, shutil, tarfile, tempfile
+
+from casaconfig import config, RemoteError
+from casaconfig.private.do_pull_data import do_pull_data
+from casaconfig.private.read_readme import read_readme
+
+class do_pull_data_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['cachedir', 'data_install_mode']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-install-')
+        config.cachedir = self.testDir
+        self.version = 'casarundata-1.2.3.tar.gz'
+
+    def tearDown(self):
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def tarball(self, names, name=None):
+        # a tarball with a small file (or a directory for a name ending in /) at each of names, written to the test directory
+        tarPath = os.path.join(self.testDir, name if name is not None else self.version)
+        with tarfile.open(tarPath, 'w:gz') as tar:
+            for fname in names:
+                content = fname.encode()
+                info = tarfile.TarInfo(fname)
+                if fname.endswith('/'):
+                    info.type = tarfile.DIRTYPE
+                else:
+                    info.size = len(content)
+                tar.addfile(info, io.BytesIO(content) if not fname.endswith('/') else None)
+        return tarPath
+
+    def install(self, mode, archive, staging_dir=None):
+        # install archive in mode into a new directory, returns that directory
+        config.data_install_mode = mode
+        path = os.path.join(self.testDir, 'data-%s%s' % (mode, '-staging' if staging_dir is not None else ''))
+        os.makedirs(path, exist_ok=True)
+        do_pull_data(path, self.version, [], '', '', None, archive, staging_dir=staging_dir)
+        return path
+
+    def readme(self, path):
+        # the contents of the casarundata readme in path, None if there is none
+        return read_readme(os.path.join(path, 'readme.txt'))
+
+    def modes(self):
+        # each install mode, with and without a staging directory
+        staging = os.path.join(self.testDir, 'staging')
+        for mode in ['inplace', 'copy', 'staged', 'differential']:
+            yield (mode, None)
+            if mode != 'copy':
+                yield (mode, staging)
+
+    def test_install(self):
+        '''Test that a tarball is installed by each install mode'''
+        archive = self.tarball(['casarundata-1.2.3/', 'casarundata-1.2.3/geodetic/a', 'casarundata-1.2.3/ephemerides/b'])
+        for (mode, staging_dir) in self.modes():
+            path = self.install(mode, archive, staging_dir)
+            self.assertTrue(os.path.isfile(os.path.join(path, 'geodetic', 'a')) and os.path.isfile(os.path.join(path, 'ephemerides', 'b')), "%s : files were not installed" % mode)
+            readme = self.readme(path)
+            self.assertTrue(readme is not None and readme['version'] == self.version, "%s : the readme was not written" % mode)
+            self.assertTrue(sorted(readme['extra']) == sorted(['geodetic/a', 'ephemerides/b']), "%s : unexpected manifest : %s" % (mode, readme['extra']))
+
+    def test_no_members(self):
+        '''Test that a tarball with no files in the version directory is not installed'''
+        for names in [['casarundata-1.2.3/'], ['casarundata-1.2.3/', 'casarundata-1.2.3/geodetic/']]:
+            archive = self.tarball(names)
+            for (mode, staging_dir) in self.modes():
+                with self.assertRaises(RemoteError, msg="%s : a tarball with no files was installed" % mode):
+                    self.install(mode, archive, staging_dir)
+                path = os.path.join(self.testDir, 'data-%s%s' % (mode, '-staging' if staging_dir is not None else ''))
+                self.assertTrue(self.readme(path) is None, "%s : a readme was written for a tarball with no files" % mode)
+                shutil.rmtree(path)
+
+    def test_mismatched_prefix(self):
+        '''Test that a tarball with members outside of the version directory is not installed'''
+        for names in [['casarundata-9.9.9/', 'casarundata-9.9.9/geodetic/a'], ['casarundata-1.2.3/', 'casarundata-1.2.3/geodetic/a', 'other/b'], ['casarundata-1.2.3.extra/a']]:
+            archive = self.tarball(names)
+            for (mode, staging_dir) in self.modes():
+                with self.assertRaises(RemoteError, msg="%s : a tarball with members outside of the version directory was installed" % mode):
+                    self.install(mode, archive, staging_dir)
+                path = os.path.join(self.testDir, 'data-%s%s' % (mode, '-staging' if staging_dir is not None else ''))
+                self.assertTrue(self.readme(path) is None, "%s : a readme was written for a mismatched tarball" % mode)
+                self.assertTrue(not os.path.exists(os.path.join(path, 'other')), "%s : a member outside of the version directory was extracted" % mode)
+                shutil.rmtree(path)
+
+    def test_interrupted_swap(self):
+        '''Test that the readme of a staged install describes the installed version before, during and after its swap'''
+        from casaconfig.private import staged_install
+        from casaconfig.private.get_data_info import get_data_info
+
+        archive = self.tarball(['casarundata-1.2.3/', 'casarundata-1.2.3/alma/a', 'casarundata-1.2.3/zzz/z'])
+        path = self.install('staged', archive)
+
+        # the next version is interrupted after the first directory has been swapped into place
+        self.version = 'casarundata-1.2.4.tar.gz'
+        archive = self.tarball(['casarundata-1.2.4/', 'casarundata-1.2.4/alma/a', 'casarundata-1.2.4/zzz/z2'])
+        swap_into_place = staged_install.swap_into_place
+        def interrupted_swap(path, staging):
+            name = sorted(os.listdir(staging))[0]
+            retired = os.path.join(path, staged_install.RETIRED_PREFIX + str(os.getpid()))
+            os.makedirs(retired)
+            os.rename(os.path.join(path, name), os.path.join(retired, name))
+            os.rename(os.path.join(staging, name), os.path.join(path, name))
+            raise KeyboardInterrupt('interrupted')
+        staged_install.swap_into_place = interrupted_swap
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                do_pull_data(path, self.version, ['alma/a', 'zzz/z'], 'casarundata-1.2.3.tar.gz', '', None, archive)
+        finally:
+            staged_install.swap_into_place = swap_into_place
+        self.assertTrue(self.readme(path)['version'] == 'casarundata-1.2.3.tar.gz', "the readme described the new version before it was swapped into place")
+
+        # undoing the swap leaves the previous version, as described by the readme
+        staged_install.recover_staging(path)
+        self.assertTrue(os.path.isfile(os.path.join(path, 'zzz', 'z')) and not os.path.exists(os.path.join(path, 'zzz', 'z2')), "the interrupted swap was not undone")
+        dataInfo = get_data_info(path, None, type='casarundata')
+        self.assertTrue(dataInfo['version'] == 'casarundata-1.2.3.tar.gz' and sorted(dataInfo['manifest']) == ['alma/a', 'zzz/z'], "the previous version is not described after recovery : %s" % dataInfo)
+
+        # the new readme is in place as soon as the swap is complete, even if nothing more is done
+        def stopped_swap(path, staging):
+            swap_into_place(path, staging)
+            raise KeyboardInterrupt('interrupted')
+        staged_install.swap_into_place = stopped_swap
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                do_pull_data(path, self.version, dataInfo['manifest'], dataInfo['version'], dataInfo['date'], None, archive)
+        finally:
+            staged_install.swap_into_place = swap_into_place
+        self.assertTrue(self.readme(path)['version'] == self.version, "the readme was not swapped into place with the new version")
+        dataInfo = get_data_info(path, None, type='casarundata')
+        self.assertTrue(dataInfo['version'] == self.version, "the new version is not described after its swap : %s" % dataInfo)
+        self.assertTrue(sorted(self.readme(path)['extra']) == ['alma/a', 'zzz/z2'], "unexpected manifest after a staged install")
+        self.assertTrue(not os.path.exists(os.path.join(path, 'zzz', 'z')), "a file from the previous version was kept")
+
+if __name__ == '__main__':
+
+    unittest.main()
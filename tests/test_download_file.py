@@ -0,0 +1,229 @@
+import unittest
+import os, asyncio, hashlib, http.server, re, shutil, tempfile, threading, time
+
+from casaconfig import config, RemoteError
+from casaconfig.private.download_file import download_file
+
+class range_handler(http.server.BaseHTTPRequestHandler):
+    # serves server.files (name -> bytes) with Range and If-Range support
+    # server.drop_after cuts the next response after that many bytes and server.delay slows each chunk
+    # server.ranges False ignores any Range header
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(False)
+
+    def do_GET(self):
+        self.respond(True)
+
+    def respond(self, body):
+        content = self.server.files.get(self.path.lstrip('/'))
+        if content is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.sha256(content).hexdigest()[:16]
+        self.server.requests.append((self.path, self.headers.get('Range'), self.headers.get('If-Range')))
+        (start, end) = (0, len(content)-1)
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        ifRange = self.headers.get('If-Range')
+        partial = self.server.ranges and match is not None and (ifRange is None or ifRange == etag or not self.server.honor_if_range)
+        if partial:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), len(content)-1)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end+1-start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if not body:
+            return
+        offset = start
+        while offset <= end:
+            chunk = content[offset:min(end+1, offset+65536)]
+            if self.server.drop_after is not None and (offset-start+len(chunk)) > self.server.drop_after:
+                # cut this response short, once
+                self.wfile.write(chunk[:self.server.drop_after-(offset-start)])
+                self.server.drop_after = None
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            offset += len(chunk)
+            if self.server.delay > 0:
+                time.sleep(self.server.delay)
+
+class download_file_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['download_segments', 'download_min_rate']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-download-')
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), range_handler)
+        self.server.daemon_threads = True
+        self.server.files = {}
+        self.server.requests = []
+        self.server.drop_after = None
+        self.server.delay = 0.
+        self.server.honor_if_range = True
+        self.server.ranges = True
+        self.serverThread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.serverThread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def content(self, nbytes, seed=0):
+        # nbytes of content that differs with seed
+        block = hashlib.sha256(str(seed).encode()).digest()
+        return (block * (nbytes // len(block) + 1))[:nbytes]
+
+    def read(self, fpath):
+        with open(fpath, 'rb') as fid:
+            return fid.read()
+
+    def test_concurrent_threads(self):
+        '''Test that threads downloading the same file to the same place wait for each other'''
+        content = self.content(3*1024*1024)
+        self.server.files['a.tar.gz'] = content
+        self.server.delay = 0.01
+        dest = os.path.join(self.testDir, 'a.tar.gz')
+        for segments in [1, 4]:
+            results = []
+            def fetch():
+                results.append(download_file(self.url + 'a.tar.gz', dest, segments=segments))
+            threads = [threading.Thread(target=fetch) for i in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertTrue(results == [dest]*3, "segments %d : unexpected results %s" % (segments, results))
+            self.assertTrue(self.read(dest) == content, "segments %d : the downloaded file is not the served file" % segments)
+            self.assertTrue(not os.path.exists(dest + '.part') and not os.path.exists(dest + '.part.journal'), "segments %d : the partial download was left behind" % segments)
+            os.remove(dest)
+
+    def test_aio_cancel_resume(self):
+        '''Test that casaconfig.aio downloads with download_file, stopping at once when cancelled and resuming later'''
+        from casaconfig import aio
+
+        content = self.content(4*1024*1024)
+        self.server.files['b.tar.gz'] = content
+        self.server.delay = 0.02
+        dest = os.path.join(self.testDir, 'b.tar.gz')
+        config.download_segments = 1
+
+        async def cancelled():
+            task = asyncio.ensure_future(aio._run(download_file, self.url + 'b.tar.gz', dest))
+            await asyncio.sleep(0.5)
+            # the server stalls, the download is waiting for data when it is cancelled
+            self.server.delay = 30.
+            await asyncio.sleep(0.5)
+            started = time.monotonic()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return time.monotonic() - started
+            return None
+        elapsed = asyncio.run(cancelled())
+        self.assertTrue(elapsed is not None, "the download was not cancelled")
+        self.assertTrue(elapsed < 5., "the cancelled download waited %.1f seconds for data" % elapsed)
+        self.assertTrue(not os.path.exists(dest) and os.path.getsize(dest + '.part') > 0, "the partial download was not kept")
+
+        # two concurrent fetches resume the partial download once
+        self.server.delay = 0.
+        self.server.requests.clear()
+        async def fetch_twice():
+            return await asyncio.gather(aio._run(download_file, self.url + 'b.tar.gz', dest),
+                                        aio._run(download_file, self.url + 'b.tar.gz', dest))
+        self.assertTrue(asyncio.run(fetch_twice()) == [dest, dest], "the concurrent downloads did not finish")
+        self.assertTrue(self.read(dest) == content, "the resumed download is not the served file")
+        gets = [r for r in self.server.requests if r[1] is None or not r[1].startswith('bytes=0-')]
+        self.assertTrue(len(gets) == 1 and gets[0][1] is not None, "the partial download was not resumed exactly once : %s" % self.server.requests)
+
+    def interrupted(self, name, dest, segments, drop_after):
+        # start a download of name that is cut short after drop_after bytes, leaving a partial download
+        self.server.drop_after = drop_after
+        with self.assertRaises(RemoteError):
+            download_file(self.url + name, dest, retries=0, segments=segments)
+        self.assertTrue(not os.path.exists(dest) and os.path.exists(dest + '.part') and os.path.exists(dest + '.part.journal'), "the partial download was not kept")
+        self.server.requests.clear()
+
+    def test_segments(self):
+        '''Test that a large file is downloaded in concurrent byte ranges and a small file or a server without ranges uses one stream'''
+        # each segment is at least 8 MB
+        content = self.content(34*1024*1024)
+        self.server.files['s.tar.gz'] = content
+        dest = os.path.join(self.testDir, 's.tar.gz')
+        self.assertTrue(download_file(self.url + 's.tar.gz', dest, segments=4) == dest, "the segmented download did not finish")
+        self.assertTrue(self.read(dest) == content, "the segmented download is not the served file")
+        self.assertTrue(not os.path.exists(dest + '.part') and not os.path.exists(dest + '.part.journal'), "the partial download was left behind")
+        ranges = sorted([tuple(map(int, r[1][len('bytes='):].split('-'))) for r in self.server.requests if r[1] != 'bytes=0-0'])
+        self.assertTrue(len(ranges) == 4 and ranges[0][0] == 0 and ranges[-1][1] == len(content)-1 and all([ranges[i][1]+1 == ranges[i+1][0] for i in range(3)]),
+                        "the file was not fetched in 4 contiguous ranges : %s" % ranges)
+        os.remove(dest)
+
+        # a server that ignores Range requests
+        self.server.ranges = False
+        self.server.requests.clear()
+        download_file(self.url + 's.tar.gz', dest, segments=4)
+        self.assertTrue(self.read(dest) == content, "the single stream download is not the served file")
+        self.assertTrue([r[1] for r in self.server.requests] == ['bytes=0-0', None], "unexpected requests without Range support : %s" % self.server.requests)
+        os.remove(dest)
+
+        # a file too small to split
+        self.server.ranges = True
+        self.server.files['t.tar.gz'] = content[:1024*1024]
+        self.server.requests.clear()
+        download_file(self.url + 't.tar.gz', dest, segments=4)
+        self.assertTrue(self.read(dest) == content[:1024*1024], "the small download is not the served file")
+        self.assertTrue([r[1] for r in self.server.requests] == ['bytes=0-0', None], "a small file was split : %s" % self.server.requests)
+
+    def test_resume(self):
+        '''Test that an interrupted download is resumed from where it stopped'''
+        content = self.content(17*1024*1024)
+        self.server.files['c.tar.gz'] = content
+        for segments in [1, 4]:
+            dest = os.path.join(self.testDir, 'c-%d.tar.gz' % segments)
+            self.interrupted('c.tar.gz', dest, segments, 5*1024*1024)
+            self.assertTrue(download_file(self.url + 'c.tar.gz', dest, segments=segments) == dest, "segments %d : the download did not finish" % segments)
+            self.assertTrue(self.read(dest) == content, "segments %d : the resumed download is not the served file" % segments)
+            # nothing is fetched again from the start, every request is a range with the validator of the partial download
+            gets = [r for r in self.server.requests if r[1] != 'bytes=0-0']
+            self.assertTrue(len(gets) > 0 and all([r[1] is not None and not r[1].startswith('bytes=0-') and r[2] is not None for r in gets]), "segments %d : the download was not resumed : %s" % (segments, gets))
+
+    def test_resume_changed_upstream(self):
+        '''Test that a download that is resumed after the file changed upstream gets the new file'''
+        for segments in [1, 4]:
+            # the same size, a server that honors If-Range sends the whole new file
+            self.server.files['d.tar.gz'] = self.content(17*1024*1024)
+            dest = os.path.join(self.testDir, 'd-%d.tar.gz' % segments)
+            self.interrupted('d.tar.gz', dest, segments, 5*1024*1024)
+            changed = self.content(17*1024*1024, seed=1)
+            self.server.files['d.tar.gz'] = changed
+            download_file(self.url + 'd.tar.gz', dest, segments=segments)
+            self.assertTrue(self.read(dest) == changed, "segments %d : the resumed download is not the changed file" % segments)
+            os.remove(dest)
+
+            # a different size from a server that ignores If-Range, the total in the Content-Range shows the change
+            self.server.honor_if_range = False
+            self.server.files['d.tar.gz'] = self.content(17*1024*1024)
+            self.interrupted('d.tar.gz', dest, segments, 5*1024*1024)
+            changed = self.content(18*1024*1024, seed=2)
+            self.server.files['d.tar.gz'] = changed
+            download_file(self.url + 'd.tar.gz', dest, segments=segments)
+            self.assertTrue(self.read(dest) == changed, "segments %d : the resumed download is not the changed file of a different size" % segments)
+            self.assertTrue(not os.path.exists(dest + '.part') and not os.path.exists(dest + '.part.journal'), "segments %d : the partial download was left behind" % segments)
+            self.server.honor_if_range = True
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,259 @@
+import unittest
+import os, io, hashlib, lzma, shutil, stat, sys, tarfile, tempfile, threading, time
+
+from casaconfig import config
+from casaconfig.private import extraction_engines
+from casaconfig.private.extract_archive import extract_archive
+
+# a stand in for xz that reads all of its input, writes a complete tar archive (argv[1]) and then fails
+failing_xz = """#!%s
+import sys
+sys.stdin.buffer.read()
+with open(%r, 'rb') as fid:
+    sys.stdout.buffer.write(fid.read())
+sys.stdout.flush()
+sys.stderr.write('simulated failure')
+sys.exit(3)
+"""
+
+class extract_archive_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['extract_decompressor', 'extract_engine', 'extract_inflight_bytes', 'extract_writers']}
+        self.savedPath = os.environ.get('PATH', '')
+        self.savedBudget = extraction_engines.ByteBudget
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-extract-')
+        self.dest = os.path.join(self.testDir, 'dest')
+        os.makedirs(self.dest)
+
+        # a small tar archive, uncompressed and xz compressed
+        self.tarPath = os.path.join(self.testDir, 'data.tar')
+        with tarfile.open(self.tarPath, 'w') as tar:
+            for i in range(20):
+                content = ('file %d\n' % i).encode()*100
+                info = tarfile.TarInfo('data/dir%d/file%d' % (i % 3, i))
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        with open(self.tarPath, 'rb') as fid:
+            self.xzData = lzma.compress(fid.read())
+        self.xzPath = os.path.join(self.testDir, 'data.tar.xz')
+        with open(self.xzPath, 'wb') as fid:
+            fid.write(self.xzData)
+
+    def tearDown(self):
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        os.environ['PATH'] = self.savedPath
+        extraction_engines.ByteBudget = self.savedBudget
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def test_extract(self):
+        '''Test that a tarball is extracted by each engine and decompressor with sensible statistics'''
+        for decompressor in ['python', 'auto']:
+            for engine in ['pipeline', 'batched']:
+                config.extract_decompressor = decompressor
+                dest = os.path.join(self.testDir, '%s-%s' % (decompressor, engine))
+                os.makedirs(dest)
+                stats = extract_archive(self.xzPath, dest, tarfile.data_filter, engine=engine)
+                self.assertTrue(stats['members'] == 20, "%s %s : unexpected number of members extracted : %d" % (decompressor, engine, stats['members']))
+                self.assertTrue(os.path.isfile(os.path.join(dest, 'data', 'dir1', 'file4')), "%s %s : a file was not extracted" % (decompressor, engine))
+                for key in ['read', 'read_wait', 'decompress', 'decompress_wait', 'parse', 'parse_wait', 'write_wait', 'write', 'total']:
+                    self.assertTrue(stats[key] >= 0., "%s %s : the %s time is negative : %f" % (decompressor, engine, key, stats[key]))
+
+    def tree(self, root, members):
+        # (type, mode, mtime, contents or link target) of everything under root by relative path,
+        # the time of a directory that is not one of members is when it was created
+        found = {}
+        for (dirpath, dirnames, filenames) in os.walk(root):
+            for name in dirnames + filenames:
+                fpath = os.path.join(dirpath, name)
+                st = os.lstat(fpath)
+                if stat.S_ISLNK(st.st_mode):
+                    found[os.path.relpath(fpath, root)] = ('link', None, None, os.readlink(fpath))
+                elif stat.S_ISDIR(st.st_mode):
+                    relpath = os.path.relpath(fpath, root)
+                    found[relpath] = ('dir', stat.S_IMODE(st.st_mode), st.st_mtime if relpath in members else None, None)
+                else:
+                    with open(fpath, 'rb') as fid:
+                        found[os.path.relpath(fpath, root)] = ('file', stat.S_IMODE(st.st_mode), st.st_mtime, fid.read())
+        return found
+
+    def test_engines_match_tarfile(self):
+        '''Test that each engine extracts files, directories and links as tarfile does, over several batches'''
+        tarPath = os.path.join(self.testDir, 'many.tar')
+        with tarfile.open(tarPath, 'w') as tar:
+            for (name, mode) in [('data', 0o755), ('data/geodetic', 0o750), ('data/ephemerides', 0o700)]:
+                info = tarfile.TarInfo(name)
+                info.type = tarfile.DIRTYPE
+                info.mode = mode
+                info.mtime = 1600000000
+                tar.addfile(info)
+            # more files than fit in a batch, with modes the umask may change
+            for i in range(600):
+                content = ('table %d\n' % i).encode()*(i % 7)
+                info = tarfile.TarInfo('data/%s/t%d/table.f%d' % (['geodetic', 'ephemerides'][i % 2], i // 50, i))
+                info.size = len(content)
+                info.mode = [0o644, 0o666, 0o755, 0o600][i % 4]
+                info.mtime = 1600000000 + i
+                tar.addfile(info, io.BytesIO(content))
+            # links refer to files found before them, a file after them is still written
+            info = tarfile.TarInfo('data/geodetic/latest')
+            info.type = tarfile.SYMTYPE
+            info.linkname = 't0/table.f0'
+            tar.addfile(info)
+            info = tarfile.TarInfo('data/ephemerides/hard')
+            info.type = tarfile.LNKTYPE
+            info.linkname = 'data/ephemerides/t0/table.f1'
+            tar.addfile(info)
+            info = tarfile.TarInfo('data/after')
+            info.size = 5
+            info.mtime = 1600000000
+            tar.addfile(info, io.BytesIO(b'after'))
+
+        # with data_filter the umask usually removes the same bits as the filter, fully_trusted_filter keeps them
+        for member_filter in [tarfile.data_filter, tarfile.fully_trusted_filter]:
+            reference = os.path.join(self.testDir, 'reference-%s' % member_filter.__name__)
+            with tarfile.open(tarPath) as tar:
+                members = tar.getnames()
+                tar.extractall(reference, filter=member_filter)
+            expected = self.tree(reference, members)
+            for engine in ['pipeline', 'batched']:
+                what = '%s %s' % (engine, member_filter.__name__)
+                dest = os.path.join(self.testDir, 'many-%s-%s' % (engine, member_filter.__name__))
+                os.makedirs(dest)
+                file_info = {}
+                stats = extract_archive(tarPath, dest, member_filter, file_info=file_info, engine=engine)
+                self.assertTrue(stats['engine'] == engine and stats['members'] == 606, "%s : unexpected statistics : %s" % (what, stats))
+                found = self.tree(dest, members)
+                differ = sorted(k for k in set(expected) | set(found) if expected.get(k) != found.get(k))
+                self.assertTrue(len(differ) == 0, "%s : differs from tarfile for %s" % (what, differ[:5]))
+                self.assertTrue(os.path.samefile(os.path.join(dest, 'data/ephemerides/hard'), os.path.join(dest, 'data/ephemerides/t0/table.f1')), "%s : the hard link was not extracted" % what)
+                self.assertTrue(file_info['data/geodetic/t0/table.f0'] == (0, 1600000000, hashlib.sha256(b'').hexdigest()), "%s : unexpected file info : %s" % (what, file_info['data/geodetic/t0/table.f0']))
+
+    def test_byte_budget(self):
+        '''Test that acquiring bytes waits while they would go over the budget unless nothing else is in flight'''
+        budget = extraction_engines.ByteBudget(100)
+        budget.acquire(250)
+        self.assertTrue(budget.inflight == 250 and not budget.available(1), "more than the budget was not acquired when nothing was in flight")
+        budget.release(250)
+        budget.acquire(60)
+        self.assertTrue(budget.available(40) and not budget.available(41), "unexpected bytes available")
+        acquired = threading.Event()
+        def waiter():
+            budget.acquire(50)
+            acquired.set()
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.2)
+        self.assertTrue(not acquired.is_set(), "bytes over the budget were acquired")
+        budget.release(60)
+        self.assertTrue(acquired.wait(10) and budget.inflight == 50, "the waiting bytes were not acquired once there was room")
+        t.join()
+
+    def test_writers(self):
+        '''Test that the files are the same for any number of writers and the data waiting for them stays within the budget'''
+        tarPath = os.path.join(self.testDir, 'sizes.tar')
+        with tarfile.open(tarPath, 'w') as tar:
+            for i in range(200):
+                # mostly small files with a few larger than the budget
+                content = os.urandom(120000 if i % 50 == 7 else (i*97) % 5000)
+                info = tarfile.TarInfo('data/d%d/f%d' % (i % 5, i))
+                info.size = len(content)
+                info.mtime = 1600000000
+                tar.addfile(info, io.BytesIO(content))
+
+        # the most bytes in flight for each budget
+        most = []
+        class RecordingBudget(self.savedBudget):
+            def acquire(budget, nbytes):
+                super().acquire(nbytes)
+                most[-1] = max(most[-1], budget.inflight)
+        extraction_engines.ByteBudget = RecordingBudget
+
+        config.extract_inflight_bytes = 50000
+        expected = None
+        for engine in ['pipeline', 'batched']:
+            for nwriters in [1, 3, 8, 0]:
+                config.extract_writers = nwriters
+                dest = os.path.join(self.testDir, 'sizes-%s-%d' % (engine, nwriters))
+                os.makedirs(dest)
+                most.append(0)
+                stats = extract_archive(tarPath, dest, tarfile.data_filter, engine=engine)
+                self.assertTrue(stats['writers'] == (nwriters if nwriters > 0 else 4), "%s : unexpected number of writers : %d" % (engine, stats['writers']))
+                self.assertTrue(0 < most[-1] <= 50000, "%s %d writers : the data in flight went over the budget : %d" % (engine, nwriters, most[-1]))
+                found = self.tree(dest, [])
+                if expected is None:
+                    expected = found
+                self.assertTrue(found == expected and len(found) == 206, "%s %d writers : the files differ" % (engine, nwriters))
+
+    def test_external_decompressor_failure(self):
+        '''Test that an external decompressor that fails is reported even when its output was a complete tar archive'''
+        shim = os.path.join(self.testDir, 'bin')
+        os.makedirs(shim)
+        xz = os.path.join(shim, 'xz')
+        with open(xz, 'w') as fid:
+            fid.write(failing_xz % (sys.executable, self.tarPath))
+        os.chmod(xz, 0o755)
+        os.environ['PATH'] = shim + os.pathsep + self.savedPath
+        config.extract_decompressor = 'external'
+
+        for engine in ['pipeline', 'batched']:
+            failed = False
+            try:
+                extract_archive(self.xzPath, self.dest, tarfile.data_filter, engine=engine)
+            except RuntimeError as exc:
+                failed = 'exit status 3' in str(exc)
+            self.assertTrue(failed, "%s : the failure of the external decompressor was not raised" % engine)
+
+    def test_truncated_compressed_data(self):
+        '''Test that compressed data that end early are reported even when a complete tar archive was decompressed'''
+        config.extract_decompressor = 'python'
+        # the end of the xz stream (the index and footer) is missing but all of the tar data are there
+        with open(self.xzPath, 'wb') as fid:
+            fid.write(self.xzData[:-32])
+        for engine in ['pipeline', 'batched']:
+            failed = False
+            try:
+                extract_archive(self.xzPath, self.dest, tarfile.data_filter, engine=engine)
+            except EOFError:
+                failed = True
+            self.assertTrue(failed, "%s : truncated compressed data were not reported" % engine)
+
+    def test_differential(self):
+        '''Test that only installed files with different contents are written when the installed files are given'''
+        mtime = 1700000000
+        members = {'data/same':b'same contents', 'data/changed':b'new contents', 'data/large':b'L'*200000, 'data/largechanged':b'N'*200000}
+        installed_contents = {'data/same':b'same contents', 'data/changed':b'old contents', 'data/large':b'L'*200000, 'data/largechanged':b'N'*199999+b'O'}
+        tarPath = os.path.join(self.testDir, 'diff.tar')
+        with tarfile.open(tarPath, 'w') as tar:
+            for (name, content) in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mtime = mtime
+                tar.addfile(info, io.BytesIO(content))
+
+        # files larger than the in flight budget are compared as they are streamed
+        config.extract_inflight_bytes = 100000
+        for engine in ['pipeline', 'batched']:
+            dest = os.path.join(self.testDir, 'diff-%s' % engine)
+            installed = {}
+            for (name, content) in installed_contents.items():
+                fpath = os.path.join(dest, name)
+                os.makedirs(os.path.dirname(fpath), exist_ok=True)
+                with open(fpath, 'wb') as fid:
+                    fid.write(content)
+                # the changed files have the same size and modification time as their new members
+                os.utime(fpath, (mtime, mtime))
+                installed[name] = (len(content), os.stat(fpath).st_mtime, hashlib.sha256(content).hexdigest())
+
+            file_info = {}
+            stats = extract_archive(tarPath, dest, tarfile.data_filter, file_info=file_info, engine=engine, installed=installed)
+            for (name, content) in members.items():
+                with open(os.path.join(dest, name), 'rb') as fid:
+                    self.assertTrue(fid.read() == content, "%s : %s does not have the contents of its member" % (engine, name))
+                self.assertTrue(file_info[name][2] == hashlib.sha256(content).hexdigest(), "%s : wrong checksum recorded for %s" % (engine, name))
+            self.assertTrue(stats['unchanged'] == 2, "%s : unexpected number of unchanged files : %d" % (engine, stats['unchanged']))
+
+if __name__ == '__main__':
+
+    unittest.main()
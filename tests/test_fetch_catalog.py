@@ -0,0 +1,117 @@
+import unittest
+import os, http.server, json, shutil, tempfile, threading, time
+
+from casaconfig import config, RemoteError
+from casaconfig.private import have_network
+from casaconfig.private.fetch_catalog import fetch_catalog
+
+class listing_handler(http.server.BaseHTTPRequestHandler):
+    # serves a directory listing of server.names with an ETag, honoring If-None-Match
+    # server.fail answers every request with a 500
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.server.fail:
+            self.send_error(500)
+            return
+        body = ('<html><body>' + ''.join(['<a href="%s">%s</a>' % (n, n) for n in self.server.names]) + '</body></html>').encode()
+        etag = '"%d-%d"' % (self.server.server_address[1], len(self.server.names))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+class fetch_catalog_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['cachedir', 'catalog_ttl', 'network_probe_url', 'data_mirror_url']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-catalog-')
+        config.cachedir = self.testDir
+        config.catalog_ttl = 0
+        config.data_mirror_url = None
+        # two mirrors with the same listing
+        self.servers = []
+        for i in range(2):
+            server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), listing_handler)
+            server.daemon_threads = True
+            server.names = ['casarundata-1.2.3.tar.gz', 'casarundata-1.2.4.tar.gz', 'other.txt']
+            server.requests = []
+            server.fail = False
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        self.urls = ['http://127.0.0.1:%d/casarundata/' % s.server_address[1] for s in self.servers]
+        config.network_probe_url = self.urls[0]
+        have_network._probe = None
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        have_network._probe = None
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def fetch(self, url):
+        return fetch_catalog('casarundata', url, lambda name: name.startswith('casarundata'), 'casarundata versions')
+
+    def test_conditional(self):
+        '''Test that a saved catalog is revalidated and used when the listing has not changed'''
+        expected = ['casarundata-1.2.3.tar.gz', 'casarundata-1.2.4.tar.gz']
+        server = self.servers[0]
+        self.assertTrue(self.fetch(self.urls[0]) == expected, "unexpected versions")
+        self.assertTrue(self.fetch(self.urls[0]) == expected, "unexpected versions from the saved catalog")
+        self.assertTrue(server.requests[0] is None and server.requests[1] is not None, "the saved catalog was not revalidated : %s" % server.requests)
+
+        # a new version changes the listing
+        server.names.append('casarundata-1.2.5.tar.gz')
+        self.assertTrue(self.fetch(self.urls[0])[-1] == 'casarundata-1.2.5.tar.gz', "the changed listing was not used")
+
+        # a catalog checked recently is used without a request
+        config.catalog_ttl = 3600
+        nrequests = len(server.requests)
+        self.assertTrue(self.fetch(self.urls[0])[-1] == 'casarundata-1.2.5.tar.gz' and len(server.requests) == nrequests, "the recent catalog was not used as is")
+
+    def test_fallback(self):
+        '''Test that the saved catalog is used when the listing can not be fetched'''
+        expected = ['casarundata-1.2.3.tar.gz', 'casarundata-1.2.4.tar.gz']
+        self.fetch(self.urls[0])
+        self.servers[0].fail = True
+        self.assertTrue(self.fetch(self.urls[0]) == expected, "the saved catalog was not used after an error")
+
+        # no network at all
+        have_network._probe = (config.network_probe_url, time.monotonic(), False)
+        self.assertTrue(self.fetch(self.urls[0]) == expected, "the saved catalog was not used without a network")
+
+        # without a saved catalog the error is raised
+        os.remove(os.path.join(self.testDir, 'catalogs', 'casarundata.json'))
+        have_network._probe = None
+        with self.assertRaises(RemoteError):
+            self.fetch(self.urls[0])
+
+    def test_locations_swap(self):
+        '''Test that the saved catalog is revalidated at each location when the order of the locations changes'''
+        for url in self.urls + self.urls:
+            self.fetch(url)
+        for server in self.servers:
+            self.assertTrue(len(server.requests) == 2 and server.requests[0] is None and server.requests[1] is not None, "the listing was fetched again after the locations swapped : %s" % server.requests)
+        with open(os.path.join(self.testDir, 'catalogs', 'casarundata.json')) as fid:
+            self.assertTrue(sorted(json.load(fid)['urls'].keys()) == sorted(self.urls), "the catalog was not saved for each location")
+
+if __name__ == '__main__':
+
+    unittest.main()
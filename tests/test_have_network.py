@@ -0,0 +1,80 @@
+import unittest
+import http.server, threading, time
+
+from casaconfig import config
+from casaconfig.private import have_network
+
+class probe_handler(http.server.BaseHTTPRequestHandler):
+    # counts the probes in server.probes, waits server.delay seconds before answering with server.status
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.server.probes.append(self.path)
+        time.sleep(self.server.delay)
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+class have_network_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['network_probe_url', 'network_probe_ttl', 'network_probe_timeout', 'data_mirror_url']}
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), probe_handler)
+        self.server.daemon_threads = True
+        self.server.probes = []
+        self.server.delay = 0.
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/casarundata/' % self.server.server_address[1]
+        config.network_probe_url = self.url
+        config.network_probe_ttl = 60
+        config.network_probe_timeout = 1
+        config.data_mirror_url = None
+        have_network._probe = None
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        have_network._probe = None
+
+    def test_ttl(self):
+        '''Test that the probe result is shared until it is older than network_probe_ttl'''
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(have_network.have_network())) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(results == [True]*8 and len(self.server.probes) == 1, "the network was probed more than once : %s" % self.server.probes)
+
+        # a failure is remembered too
+        have_network._probe = None
+        self.server.status = 500
+        self.assertTrue(not have_network.have_network() and not have_network.have_network() and len(self.server.probes) == 2, "the failed probe was not remembered")
+
+        # an old result is not used
+        self.server.status = 200
+        config.network_probe_ttl = 0
+        self.assertTrue(have_network.have_network() and len(self.server.probes) == 3, "an expired result was used")
+
+    def test_url(self):
+        '''Test that a different probe target (the mirror) is probed again'''
+        self.assertTrue(have_network.have_network() and len(self.server.probes) == 1, "the network was not probed")
+        config.data_mirror_url = self.url + 'mirror/'
+        self.assertTrue(have_network.have_network() and self.server.probes[-1].startswith('/casarundata/mirror'), "the mirror was not probed : %s" % self.server.probes)
+        self.assertTrue(have_network.have_network(use_mirror=False) and self.server.probes[-1] == '/casarundata/', "the mirror was probed with use_mirror False : %s" % self.server.probes)
+
+    def test_timeout(self):
+        '''Test that a probe that does not answer within network_probe_timeout fails'''
+        self.server.delay = 5.
+        started = time.monotonic()
+        self.assertTrue(not have_network.have_network(), "a probe that timed out succeeded")
+        self.assertTrue(time.monotonic() - started < 4., "the probe did not time out")
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import os, shutil, tempfile, time
+
+from casaconfig.private.install_state import STATE_DB_NAME, record_install, installed_state, is_managed, file_records, install_history
+from casaconfig.private.read_readme import read_readme
+
+class install_state_test(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-state-')
+        self.path = os.path.join(self.testDir, 'data')
+        os.makedirs(self.path)
+        self.files = {'geodetic/a':(1, 100., 'aa'), 'ephemerides/b':(2, 200., 'bb')}
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def test_record(self):
+        '''Test that an install is recorded and the readme is generated from it'''
+        started = time.time()
+        record_install(self.path, 'casarundata', 'casarundata-1.2.3.tar.gz', '2025-01-01', self.files, started, stats={'files':2})
+        record_install(self.path, 'measures', 'WSRT_Measures_20250101-160001.ztar', '2025-01-02', {'geodetic/m':(3, 300., 'mm')}, started)
+
+        state = installed_state(self.path, 'casarundata', manifest=True)
+        self.assertTrue(state == {'version':'casarundata-1.2.3.tar.gz', 'date':'2025-01-01', 'manifest':['geodetic/a', 'ephemerides/b']}, "unexpected state : %s" % state)
+        readme = read_readme(os.path.join(self.path, 'readme.txt'))
+        self.assertTrue(readme['version'] == 'casarundata-1.2.3.tar.gz' and readme['extra'] == ['geodetic/a', 'ephemerides/b'], "the readme does not match the state : %s" % readme)
+        self.assertTrue(installed_state(self.path, 'measures') == {'version':'WSRT_Measures_20250101-160001.ztar', 'date':'2025-01-02'}, "unexpected measures state")
+        self.assertTrue(os.path.isfile(os.path.join(self.path, 'geodetic', 'readme.txt')), "the measures readme was not written")
+
+        self.assertTrue(file_records(self.path, 'casarundata') == self.files, "unexpected file records : %s" % file_records(self.path, 'casarundata'))
+        self.assertTrue(is_managed(self.path, 'geodetic/a') is True and is_managed(self.path, 'geodetic/m') is False, "unexpected managed files")
+        history = install_history(self.path)
+        self.assertTrue([h['type'] for h in history] == ['casarundata', 'measures'] and history[0]['nfiles'] == 2 and history[0]['stats'] == {'files':2}, "unexpected history : %s" % history)
+
+        # a new install replaces the files of that type only
+        record_install(self.path, 'casarundata', 'casarundata-1.2.4.tar.gz', '2025-02-01', {'geodetic/c':(4, 400., 'cc')}, started)
+        self.assertTrue(installed_state(self.path, 'casarundata', manifest=True)['manifest'] == ['geodetic/c'], "the previous manifest was kept")
+        self.assertTrue(file_records(self.path, 'measures') == {'geodetic/m':(3, 300., 'mm')}, "the measures records were changed")
+        self.assertTrue(len(install_history(self.path, 'casarundata')) == 2, "the install history was not kept")
+
+    def test_readme_changed(self):
+        '''Test that the state is not used once the readme no longer matches it'''
+        record_install(self.path, 'casarundata', 'casarundata-1.2.3.tar.gz', '2025-01-01', self.files, time.time())
+        # an older casaconfig writes its own readme
+        with open(os.path.join(self.path, 'readme.txt'), 'w') as fid:
+            fid.write('# casarundata populated by casaconfig.pull_data\nversion : casarundata-1.2.4.tar.gz\ndate : 2025-02-01\n#\n# manifest\ngeodetic/x\n')
+        self.assertTrue(installed_state(self.path, 'casarundata') is None, "the state was used with a changed readme")
+        self.assertTrue(file_records(self.path, 'casarundata') is None and is_managed(self.path, 'geodetic/a') is None, "the file records were used with a changed readme")
+        self.assertTrue(installed_state(self.path, 'casarundata', check_readme=False)['version'] == 'casarundata-1.2.3.tar.gz', "the last recorded state was not returned")
+
+    def test_unusable_database(self):
+        '''Test that a database that can not be used is treated as no database and the readme is still written'''
+        self.assertTrue(installed_state(self.path, 'casarundata') is None and install_history(self.path) == [], "state was found without a database")
+        with open(os.path.join(self.path, STATE_DB_NAME), 'w') as fid:
+            fid.write('not a sqlite database' * 100)
+        record_install(self.path, 'casarundata', 'casarundata-1.2.3.tar.gz', '2025-01-01', self.files, time.time())
+        self.assertTrue(read_readme(os.path.join(self.path, 'readme.txt'))['version'] == 'casarundata-1.2.3.tar.gz', "the readme was not written")
+        self.assertTrue(installed_state(self.path, 'casarundata') is None and file_records(self.path, 'casarundata') is None, "state was found in an unusable database")
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os, hashlib, shutil, tempfile
+
+from casaconfig.private.publish import publish_tree
+
+class publish_test(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-publish-')
+        self.source = os.path.join(self.testDir, 'source')
+        self.dest = os.path.join(self.testDir, 'dest')
+        self.mtime = 1700000000
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def write(self, tree, relpath, content):
+        # write content to relpath in tree with the same modification time and mode every time
+        fpath = os.path.join(tree, relpath)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, 'wb') as fid:
+            fid.write(content)
+        os.chmod(fpath, 0o644)
+        os.utime(fpath, (self.mtime, self.mtime))
+        return (len(content), self.mtime, hashlib.sha256(content).hexdigest())
+
+    def read(self, tree, relpath):
+        with open(os.path.join(tree, relpath), 'rb') as fid:
+            return fid.read()
+
+    def test_publish(self):
+        '''Test that only the files that differ are published'''
+        self.write(self.source, 'a/same', b'same')
+        self.write(self.source, 'a/new', b'new')
+        self.write(self.dest, 'a/same', b'same')
+        self.write(self.dest, 'b/other', b'other')
+
+        stats = publish_tree(self.source, self.dest)
+        self.assertTrue(stats['skipped'] == 1 and stats['copied'] == 1, "unexpected publish counts : %s" % stats)
+        self.assertTrue(self.read(self.dest, 'a/new') == b'new', "a new file was not published")
+        self.assertTrue(self.read(self.dest, 'b/other') == b'other', "a file not in the source was changed")
+
+    def test_changed_content_same_metadata(self):
+        '''Test that a file with the same size, modification time and mode but different contents is published'''
+        self.write(self.source, 'a/file', b'new contents')
+        self.write(self.dest, 'a/file', b'old contents')
+
+        # the contents are read and compared
+        stats = publish_tree(self.source, self.dest)
+        self.assertTrue(stats['copied'] == 1 and stats['skipped'] == 0, "a changed file was skipped : %s" % stats)
+        self.assertTrue(self.read(self.dest, 'a/file') == b'new contents', "a changed file was not published")
+
+        # the checksums are compared
+        old = self.write(self.dest, 'a/file', b'old contents')
+        new = self.write(self.source, 'a/file', b'new contents')
+        stats = publish_tree(self.source, self.dest, file_info={'a/file':new}, installed={'a/file':old})
+        self.assertTrue(stats['copied'] == 1, "a changed file was skipped when its checksum differs : %s" % stats)
+        self.assertTrue(self.read(self.dest, 'a/file') == b'new contents', "a changed file was not published")
+
+        # an identical file with matching checksums is skipped
+        stats = publish_tree(self.source, self.dest, file_info={'a/file':new}, installed={'a/file':new})
+        self.assertTrue(stats['skipped'] == 1, "an identical file was published again : %s" % stats)
+
+    def test_changed_reference(self):
+        '''Test that a file in the reference tree with the same metadata but different contents is not linked'''
+        reference = os.path.join(self.testDir, 'reference')
+        self.write(self.source, 'a/file', b'new contents')
+        self.write(self.source, 'a/same', b'same')
+        self.write(reference, 'a/file', b'old contents')
+        self.write(reference, 'a/same', b'same')
+
+        stats = publish_tree(self.source, self.dest, reference=reference)
+        self.assertTrue(stats['copied'] == 1 and stats['linked'] == 1, "unexpected publish counts : %s" % stats)
+        self.assertTrue(self.read(self.dest, 'a/file') == b'new contents', "a changed file was linked from the reference tree")
+        self.assertTrue(os.path.samefile(os.path.join(self.dest, 'a/same'), os.path.join(reference, 'a/same')), "an identical file was not linked")
+
+if __name__ == '__main__':
+
+    unittest.main()
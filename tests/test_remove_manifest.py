@@ -0,0 +1,61 @@
+import unittest
+import os, shutil, tempfile
+
+from casaconfig import config
+from casaconfig.private.remove_manifest import remove_manifest
+
+class remove_manifest_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['remove_workers']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-remove-')
+        self.path = os.path.join(self.testDir, 'data')
+        os.makedirs(self.path)
+
+    def tearDown(self):
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def populate(self, names, root=None):
+        # an empty file at each of names (relative to root, which defaults to path)
+        for name in names:
+            fpath = os.path.join(self.path if root is None else root, name)
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+            open(fpath, 'w').close()
+
+    def remaining(self):
+        # everything left in path, directories end with /
+        found = []
+        for (dirpath, dirnames, filenames) in os.walk(self.path):
+            rel = os.path.relpath(dirpath, self.path)
+            found += [os.path.normpath(os.path.join(rel, d)) + '/' for d in dirnames]
+            found += [os.path.normpath(os.path.join(rel, f)) for f in filenames]
+        return sorted(found)
+
+    def test_remove(self):
+        '''Test that the manifest files are removed along with the directories they leave empty'''
+        manifest = ['geodetic/a', 'geodetic/IERS/b', 'geodetic/IERS/c', 'ephemerides/JPL/d', 'alma/e']
+        for workers in [1, 8]:
+            config.remove_workers = workers
+            self.populate(manifest + ['geodetic/IERS/kept', 'other/f'])
+            os.makedirs(os.path.join(self.path, 'empty'))
+            nremoved = remove_manifest(self.path, manifest + ['missing/g', 'geodetic/missing'])
+            self.assertTrue(nremoved == len(manifest), "%d workers : unexpected number removed : %d" % (workers, nremoved))
+            # a directory that is not affected by the manifest is left, even when it is empty
+            expected = ['empty/', 'geodetic/', 'geodetic/IERS/', 'geodetic/IERS/kept', 'other/', 'other/f']
+            self.assertTrue(self.remaining() == expected, "%d workers : unexpected files left : %s" % (workers, self.remaining()))
+            shutil.rmtree(self.path)
+            os.makedirs(self.path)
+
+    def test_outside_path(self):
+        '''Test that nothing outside of path, and no directory named in the manifest, is removed'''
+        self.populate(['outside'], self.testDir)
+        self.populate(['geodetic/a', 'geodetic/sub/b'])
+        nremoved = remove_manifest(self.path, ['../outside', os.path.join(self.testDir, 'outside'), 'geodetic/sub', 'geodetic/a'])
+        self.assertTrue(nremoved == 1 and os.path.exists(os.path.join(self.testDir, 'outside')), "a file outside of path was removed")
+        self.assertTrue(self.remaining() == ['geodetic/', 'geodetic/sub/', 'geodetic/sub/b'], "unexpected files left : %s" % self.remaining())
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import os, hashlib, http.server, re, shutil, tempfile, threading, time, urllib.error, urllib.request
+
+from casaconfig import config
+from casaconfig.private import data_urls, have_network, serve
+
+class upstream_handler(http.server.BaseHTTPRequestHandler):
+    # serves a listing of server.files at /casarundata/ and each file at /casarundata/<name>, with Range requests
+    # server.state is shared by the upstream servers : 'drop_after' cuts the next tarball response after
+    # that many bytes and 'fail_listing' fails the next listing request, whichever server gets them
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/casarundata':
+            self.send_listing()
+            return
+        name = path.split('/')[-1]
+        content = self.server.files.get(name)
+        if content is None:
+            self.send_error(404)
+            return
+        self.server.requests.append((name, self.headers.get('Range')))
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match is not None:
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(content)-1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content)-start))
+        self.send_header('ETag', '"%s"' % hashlib.sha256(content).hexdigest()[:16])
+        self.end_headers()
+        offset = start
+        while offset < len(content):
+            chunk = content[offset:offset+65536]
+            with self.server.lock:
+                drop_after = self.server.state.get('drop_after')
+                if drop_after is not None and (offset-start+len(chunk)) > drop_after:
+                    del self.server.state['drop_after']
+            if drop_after is not None and (offset-start+len(chunk)) > drop_after:
+                # cut this response short, once
+                self.wfile.write(chunk[:drop_after-(offset-start)])
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            offset += len(chunk)
+            time.sleep(self.server.delay)
+
+    def send_listing(self):
+        with self.server.lock:
+            fail = self.server.state.pop('fail_listing', False)
+        if fail:
+            self.send_error(500)
+            return
+        body = ('<html><body>' + ''.join(['<a href="%s">%s</a>' % (n, n) for n in sorted(self.server.files)]) + '</body></html>').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class serve_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['cachedir', 'casarundata_mirrors', 'measures_mirrors', 'data_mirror_url', 'network_probe_url', 'catalog_ttl']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-serve-')
+        config.cachedir = os.path.join(self.testDir, 'cache')
+        config.catalog_ttl = 0
+        self.name = 'casarundata-1.2.3.tar.gz'
+        block = hashlib.sha256(b'serve').digest()
+        self.content = (block * (6*1024*1024 // len(block)))
+
+        # two upstream locations with the same tarball
+        self.state = {}
+        lock = threading.Lock()
+        self.upstreams = []
+        for i in range(2):
+            upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), upstream_handler)
+            upstream.daemon_threads = True
+            upstream.files = {self.name:self.content}
+            upstream.requests = []
+            upstream.state = self.state
+            upstream.lock = lock
+            upstream.delay = 0.
+            threading.Thread(target=upstream.serve_forever, daemon=True).start()
+            self.upstreams.append(upstream)
+        roots = ['http://127.0.0.1:%d/casarundata' % u.server_address[1] for u in self.upstreams]
+        config.casarundata_mirrors = roots
+        config.measures_mirrors = [r.replace('casarundata', 'measures') for r in roots]
+        config.network_probe_url = roots[0]
+        # the mirror does not use the mirror its clients are configured with
+        config.data_mirror_url = 'http://127.0.0.1:9/unused'
+        data_urls._selected.clear()
+        have_network._probe = None
+
+        self.mirror = serve.make_server(os.path.join(self.testDir, 'mirror'), '127.0.0.1', 0)
+        threading.Thread(target=self.mirror.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/casarundata/' % self.mirror.server_address[1]
+
+    def tearDown(self):
+        self.mirror.shutdown()
+        self.mirror.server_close()
+        for upstream in self.upstreams:
+            upstream.shutdown()
+            upstream.server_close()
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        data_urls._selected.clear()
+        have_network._probe = None
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def get(self, name, headers={}):
+        # (status, headers, body) of a request to the mirror
+        request = urllib.request.Request(self.url + name, headers=headers)
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return (response.status, response.headers, response.read())
+
+    def tarball_requests(self):
+        return [r for u in self.upstreams for r in u.requests]
+
+    def test_listing(self):
+        '''Test that the mirror lists the upstream versions, using the next upstream location when one fails'''
+        self.state['fail_listing'] = True
+        (status, headers, body) = self.get('')
+        self.assertTrue(status == 200 and self.name.encode() in body, "unexpected listing : %s %s" % (status, body))
+        self.assertTrue(config.data_mirror_url == 'http://127.0.0.1:9/unused', "the configured mirror was changed")
+        with self.assertRaises(urllib.error.HTTPError):
+            self.get('casarundata-9.9.9.tar.gz')
+
+    def test_fill_in_progress(self):
+        '''Test that requests for a tarball that is still being fetched share the one upstream fetch'''
+        for upstream in self.upstreams:
+            upstream.delay = 0.02
+        results = {}
+        def full():
+            results['full'] = self.get(self.name)
+        client = threading.Thread(target=full)
+        client.start()
+        # wait for the fill to start
+        part = os.path.join(self.mirror.mirrordir, 'casarundata', self.name + '.part')
+        for i in range(500):
+            if os.path.exists(part) and os.path.getsize(part) > 0:
+                break
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(part), "the fill did not start")
+
+        # a range with the validator of the fill is answered from the fill
+        (status, headers, body) = self.get(self.name, {'Range':'bytes=1000-1999'})
+        etag = headers['ETag']
+        self.assertTrue(status == 206 and body == self.content[1000:2000], "unexpected range response : %d" % status)
+        (status, headers, body) = self.get(self.name, {'Range':'bytes=4000000-', 'If-Range':etag})
+        self.assertTrue(status == 206 and body == self.content[4000000:], "unexpected range response with If-Range : %d" % status)
+
+        # a range with a different validator gets the whole tarball
+        (status, headers, body) = self.get(self.name, {'Range':'bytes=1000-1999', 'If-Range':'"other"'})
+        self.assertTrue(status == 200 and body == self.content, "unexpected response with a different If-Range : %d" % status)
+
+        client.join()
+        self.assertTrue(results['full'][0] == 200 and results['full'][2] == self.content, "the full response is not the tarball")
+        self.assertTrue(len(self.tarball_requests()) == 1, "the tarball was fetched from upstream more than once : %s" % self.tarball_requests())
+        with open(os.path.join(self.mirror.mirrordir, 'casarundata', self.name), 'rb') as fid:
+            self.assertTrue(fid.read() == self.content, "the tarball kept by the mirror is not the upstream tarball")
+
+        # the kept tarball is served without going upstream
+        self.assertTrue(self.get(self.name, {'Range':'bytes=10-19'})[2] == self.content[10:20], "unexpected range from the kept tarball")
+        self.assertTrue(len(self.tarball_requests()) == 1, "the kept tarball was fetched again")
+
+    def test_failover(self):
+        '''Test that a fill that fails part way through continues from the next upstream location'''
+        self.state['drop_after'] = 2*1024*1024 + 100
+        (status, headers, body) = self.get(self.name)
+        self.assertTrue(status == 200 and body == self.content, "the tarball was not served after the upstream failure")
+        requests = self.tarball_requests()
+        self.assertTrue(len(requests) == 2 and set([r[1] for r in requests]) == set([None, 'bytes=%d-' % (2*1024*1024 + 100)]), "the fetch did not continue from the next location : %s" % requests)
+        self.assertTrue(len(self.upstreams[0].requests) == 1 and len(self.upstreams[1].requests) == 1, "both locations were not used : %s" % requests)
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import os, shutil, tempfile
+
+from casaconfig.private import staged_install
+from casaconfig.private.staged_install import make_staging_dir, carry_over, swap_into_place, recover_staging
+
+class staged_install_test(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-staged-')
+        self.path = os.path.join(self.testDir, 'data')
+        os.makedirs(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def write(self, relpath, text, root=None):
+        # write text to relpath under root (defaults to path)
+        fpath = os.path.join(self.path if root is None else root, relpath)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, 'w') as fid:
+            fid.write(text)
+        return fpath
+
+    def read(self, relpath):
+        with open(os.path.join(self.path, relpath)) as fid:
+            return fid.read()
+
+    def hidden(self):
+        # the staging and retired directories in path
+        return [n for n in os.listdir(self.path) if n.startswith(staged_install.STAGING_PREFIX) or n.startswith(staged_install.RETIRED_PREFIX)]
+
+    def test_swap(self):
+        '''Test that the staged entries replace the installed entries of the same name, readme.txt last'''
+        self.write('alma/a', 'old a')
+        self.write('geodetic/g', 'old g')
+        self.write('readme.txt', 'old readme')
+        staging = make_staging_dir(self.path)
+        self.write('alma/a', 'new a', staging)
+        self.write('zzz/z', 'new z', staging)
+        self.write('readme.txt', 'new readme', staging)
+
+        swapped = swap_into_place(self.path, staging)
+        self.assertTrue(swapped == ['alma', 'zzz', 'readme.txt'], "unexpected swap order : %s" % swapped)
+        self.assertTrue(self.read('alma/a') == 'new a' and self.read('zzz/z') == 'new z' and self.read('readme.txt') == 'new readme', "the staged entries were not swapped into place")
+        self.assertTrue(self.read('geodetic/g') == 'old g', "an entry that was not staged was changed")
+        self.assertTrue(self.hidden() == [], "the staging or retired directory was left behind : %s" % self.hidden())
+
+    def test_rollback(self):
+        '''Test that an interrupted swap is undone and a completed swap is cleaned up'''
+        self.write('alma/a', 'old a')
+        self.write('zzz/z', 'old z')
+        self.write('readme.txt', 'old readme')
+        staging = make_staging_dir(self.path)
+        self.write('alma/a', 'new a', staging)
+        self.write('zzz/z', 'new z', staging)
+        self.write('readme.txt', 'new readme', staging)
+
+        # killed after the first entry was swapped
+        retired = os.path.join(self.path, staged_install.RETIRED_PREFIX + str(os.getpid()))
+        os.makedirs(retired)
+        os.rename(os.path.join(self.path, 'alma'), os.path.join(retired, 'alma'))
+        os.rename(os.path.join(staging, 'alma'), os.path.join(self.path, 'alma'))
+
+        self.assertTrue(recover_staging(self.path), "the interrupted swap was not found")
+        self.assertTrue(self.read('alma/a') == 'old a' and self.read('zzz/z') == 'old z' and self.read('readme.txt') == 'old readme', "the interrupted swap was not undone")
+        self.assertTrue(self.hidden() == [], "the staging or retired directory was left behind : %s" % self.hidden())
+        self.assertTrue(not recover_staging(self.path), "something was found to recover after recovery")
+
+        # killed after every entry was swapped, before the retired directory was removed
+        staging = make_staging_dir(self.path)
+        self.write('alma/a', 'new a', staging)
+        os.makedirs(retired)
+        os.rename(os.path.join(self.path, 'alma'), os.path.join(retired, 'alma'))
+        os.rename(os.path.join(staging, 'alma'), os.path.join(self.path, 'alma'))
+        self.assertTrue(recover_staging(self.path), "the completed swap was not found")
+        self.assertTrue(self.read('alma/a') == 'new a', "a completed swap was undone")
+        self.assertTrue(self.hidden() == [], "the staging or retired directory was left behind : %s" % self.hidden())
+
+    def test_carry_over(self):
+        '''Test that the installed files that are not in the previous manifest are carried over into the staged directory'''
+        updated = self.write('geodetic/IERSeop2000/table.dat', 'updated measures')
+        self.write('geodetic/a', 'old a')
+        self.write('geodetic/old', 'not in the new version')
+        staging = make_staging_dir(self.path)
+        self.write('geodetic/a', 'new a', staging)
+        self.write('geodetic/b', 'new b', staging)
+
+        carry_over(os.path.join(self.path, 'geodetic'), os.path.join(staging, 'geodetic'), exclude=set(['geodetic/a', 'geodetic/old']), relpath='geodetic')
+        carried = os.path.join(staging, 'geodetic', 'IERSeop2000', 'table.dat')
+        self.assertTrue(os.path.isfile(carried) and os.stat(carried).st_ino == os.stat(updated).st_ino, "the updated table was not hard linked into the staged directory")
+        swap_into_place(self.path, staging)
+        self.assertTrue(self.read('geodetic/a') == 'new a' and self.read('geodetic/b') == 'new b', "the staged files were not installed")
+        self.assertTrue(self.read('geodetic/IERSeop2000/table.dat') == 'updated measures', "the updated table was not kept")
+        self.assertTrue(not os.path.exists(os.path.join(self.path, 'geodetic', 'old')), "a file from the previous manifest was carried over")
+
+if __name__ == '__main__':
+
+    unittest.main()
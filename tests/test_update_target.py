@@ -0,0 +1,238 @@
+import unittest
+import os, io, shutil, tarfile, tempfile, time
+
+from casaconfig import config
+from casaconfig.private import data_urls
+from casaconfig.private.do_pull_data import do_pull_data
+from casaconfig.private.update_target import pull_target, update_target
+
+class update_target_test(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {k:getattr(config, k) for k in ['cachedir', 'data_mirror_url', 'data_install_mode']}
+        self.testDir = tempfile.mkdtemp(prefix='casaconfig-target-')
+        config.cachedir = os.path.join(self.testDir, 'cache')
+        data_urls._selected.clear()
+
+        # a local mirror with two casarundata versions and one measures version
+        self.mirror = os.path.join(self.testDir, 'mirror')
+        for name in ['casarundata/casarundata-1.2.3.tar.gz', 'casarundata/casarundata-1.2.4.tar.gz', 'measures/WSRT_Measures_20250101-160001.ztar']:
+            os.makedirs(os.path.dirname(os.path.join(self.mirror, name)), exist_ok=True)
+            open(os.path.join(self.mirror, name), 'wb').close()
+        config.data_mirror_url = self.mirror
+
+        # casarundata-1.2.3 installed at path, last checked two days ago
+        tarPath = os.path.join(self.testDir, 'casarundata-1.2.3.tar.gz')
+        with tarfile.open(tarPath, 'w:gz') as tar:
+            info = tarfile.TarInfo('casarundata-1.2.3/geodetic/a')
+            info.size = 1
+            tar.addfile(info, io.BytesIO(b'a'))
+        config.data_install_mode = 'inplace'
+        self.path = os.path.join(self.testDir, 'data')
+        os.makedirs(self.path)
+        do_pull_data(self.path, 'casarundata-1.2.3.tar.gz', [], '', '', None, tarPath)
+        self.age(2.)
+
+    def tearDown(self):
+        for (k, v) in self.saved.items():
+            setattr(config, k, v)
+        data_urls._selected.clear()
+        shutil.rmtree(self.testDir, ignore_errors=True)
+
+    def age(self, days, readme='readme.txt'):
+        # make the readme at path days old
+        then = time.time() - days*86400.
+        os.utime(os.path.join(self.path, readme), (then, then))
+
+    def measures(self, version, days=2.):
+        # a measures readme for version at path that is days old
+        with open(os.path.join(self.path, 'geodetic', 'readme.txt'), 'w') as fid:
+            fid.write('# measures data populated by casaconfig\nversion : %s\ndate : 2025-01-01\n' % version)
+        self.age(days, 'geodetic/readme.txt')
+
+    def test_data_update(self):
+        '''Test that the data_update target is only found when data_update would install it'''
+        self.assertTrue(update_target(self.path) == 'casarundata-1.2.4.tar.gz', "the latest version is not the target")
+
+        # the requested version is already installed
+        self.assertTrue(update_target(self.path, version='casarundata-1.2.3.tar.gz') is None, "the installed version is the target")
+        self.assertTrue(update_target(self.path, version='casarundata-1.2.3.tar.gz', force=True) == 'casarundata-1.2.3.tar.gz', "the installed version is not the target when forced")
+        self.assertTrue(update_target(self.path, version='casarundata-9.9.9.tar.gz') is None, "a version that is not available is the target")
+
+        # checked less than a day ago
+        self.age(0.5)
+        self.assertTrue(update_target(self.path) is None, "a target was found for a recently checked path")
+        self.assertTrue(update_target(self.path, force=True) == 'casarundata-1.2.4.tar.gz', "the latest version is not the target when forced")
+
+    def test_auto_update_rules(self):
+        '''Test that nothing is the target when auto_update_rules does not allow the update'''
+        self.assertTrue(update_target(self.path, auto_update_rules=True) == 'casarundata-1.2.4.tar.gz', "the latest version is not the target")
+        self.assertTrue(update_target(self.path, version='casarundata-1.2.4.tar.gz', auto_update_rules=True) is None, "a target was found for a version with auto_update_rules")
+        self.assertTrue(update_target(self.path, force=True, auto_update_rules=True) is None, "a target was found for force with auto_update_rules")
+        self.assertTrue(update_target(os.path.join(self.testDir, 'missing'), auto_update_rules=True) is None, "a target was found for a missing path with auto_update_rules")
+        if os.getuid() == 0:
+            # a path owned by someone else
+            os.chown(self.path, 12345, -1)
+            self.assertTrue(update_target(self.path, auto_update_rules=True) is None, "a target was found for a path owned by another user with auto_update_rules")
+            self.assertTrue(update_target(self.path) == 'casarundata-1.2.4.tar.gz', "the latest version is not the target without auto_update_rules")
+
+    def test_measures_update(self):
+        '''Test that the measures_update target is only found when measures_update would install it'''
+        # measures that were not installed by casaconfig are only replaced when forced
+        self.assertTrue(update_target(self.path, 'measures') is None, "a target was found for measures without a readme")
+        self.assertTrue(update_target(self.path, 'measures', force=True) == 'WSRT_Measures_20250101-160001.ztar', "the latest version is not the target when forced")
+
+        # an older version, nothing is installed without the Observatories table
+        self.measures('WSRT_Measures_20241201-160001.ztar')
+        self.assertTrue(update_target(self.path, 'measures') is None, "a target was found without the Observatories table")
+        os.makedirs(os.path.join(self.path, 'geodetic', 'Observatories'))
+        self.assertTrue(update_target(self.path, 'measures') == 'WSRT_Measures_20250101-160001.ztar', "the latest version is not the target")
+        self.assertTrue(update_target(self.path, 'measures', force=True, auto_update_rules=True) is None, "a target was found for force with auto_update_rules")
+
+        # the latest version is installed and then it is checked less than a day ago
+        self.measures('WSRT_Measures_20250101-160001.ztar')
+        self.assertTrue(update_target(self.path, 'measures') is None, "the installed version is the target")
+        self.measures('WSRT_Measures_20241201-160001.ztar', 0.5)
+        self.assertTrue(update_target(self.path, 'measures') is None, "a target was found for recently checked measures")
+        self.assertTrue(update_target(self.path, 'measures', version='WSRT_Measures_20240101-160001.ztar') == 'WSRT_Measures_20240101-160001.ztar', "a requested version is not the target")
+
+    def test_pull_data(self):
+        '''Test that the pull_data target ignores the age of the installed version'''
+        self.age(0.5)
+        self.assertTrue(pull_target(self.path) == 'casarundata-1.2.4.tar.gz', "the latest version is not the target")
+        self.assertTrue(pull_target(self.path, version='casarundata-1.2.3.tar.gz') is None, "the installed version is the target")
+        empty = os.path.join(self.testDir, 'empty')
+        os.makedirs(empty)
+        self.assertTrue(update_target(empty) == 'casarundata-1.2.4.tar.gz', "the latest version is not the target for an empty path")
+
+    def fetches(self, fn, *args, **kwargs):
+        # the names of the tarballs that fn(*args, **kwargs) tried to fetch (also in self.fetched), none of them are fetched
+        from casaconfig.private import fetch_archive
+        fetched = self.fetched = []
+        saved_fetch_archive = fetch_archive.fetch_archive
+        def record_fetch(url_roots, name, *args, **kwargs):
+            fetched.append(name)
+            raise RuntimeError('not fetched')
+        fetch_archive.fetch_archive = record_fetch
+        try:
+            fn(*args, **kwargs)
+        finally:
+            fetch_archive.fetch_archive = saved_fetch_archive
+        return fetched
+
+    def test_update_all(self):
+        '''Test that update_all only fetches the tarballs that data_update and measures_update would install'''
+        from casaconfig.private.update_all import update_all
+
+        # the casarundata was checked recently and the measures can not be updated without the Observatories table
+        self.age(0.5)
+        self.measures('WSRT_Measures_20241201-160001.ztar')
+        fetched = self.fetches(update_all, self.path, verbose=0)
+        self.assertTrue(fetched == [], "update_all fetched tarballs that would not be installed : %s" % fetched)
+
+    def test_prefetch_failure(self):
+        '''Test that a prefetch that fails is only logged, even when the locations can no longer be found'''
+        import threading
+        from casaconfig.private import fetch_archive
+        from casaconfig.private.update_all import update_all
+
+        # the casarundata download fails and then its locations can not be found by the prefetch thread
+        # the casarundata is then checked (by another process) so that data_update does nothing
+        self.measures('WSRT_Measures_20241201-160001.ztar')
+        failed = []
+        saved_urls = data_urls.casarundata_urls
+        saved_fetch_archive = fetch_archive.fetch_archive
+        def urls():
+            if failed and threading.current_thread() is not threading.main_thread():
+                raise RuntimeError('no locations')
+            return saved_urls()
+        def failed_fetch(url_roots, name, *args, **kwargs):
+            failed.append(name)
+            self.age(0.)
+            raise RuntimeError('download failed')
+        data_urls.casarundata_urls = urls
+        fetch_archive.fetch_archive = failed_fetch
+        try:
+            update_all(self.path, verbose=0)
+        finally:
+            data_urls.casarundata_urls = saved_urls
+            fetch_archive.fetch_archive = saved_fetch_archive
+        self.assertTrue(failed == ['casarundata-1.2.4.tar.gz'], "unexpected prefetch : %s" % failed)
+
+    def test_aio(self):
+        '''Test that casaconfig.aio only fetches the tarballs that the updates would install'''
+        import asyncio
+        from casaconfig import aio, AutoUpdatesNotAllowed
+
+        # auto_update_rules does not allow force, the update does nothing
+        fetched = self.fetches(asyncio.run, aio.data_update(self.path, force=True, auto_update_rules=True, verbose=0))
+        self.assertTrue(fetched == [], "data_update fetched a tarball that auto_update_rules does not allow : %s" % fetched)
+        fetched = self.fetches(asyncio.run, aio.measures_update(self.path, force=True, auto_update_rules=True, verbose=0))
+        self.assertTrue(fetched == [], "measures_update fetched a tarball that auto_update_rules does not allow : %s" % fetched)
+
+        # the measures can not be updated without the Observatories table
+        self.measures('WSRT_Measures_20241201-160001.ztar')
+        fetched = self.fetches(asyncio.run, aio.measures_update(self.path, verbose=0))
+        self.assertTrue(fetched == [], "measures_update fetched a tarball that would not be installed : %s" % fetched)
+
+        if os.getuid() == 0:
+            # a path owned by someone else
+            os.chown(self.path, 12345, -1)
+            with self.assertRaises(AutoUpdatesNotAllowed):
+                self.fetches(asyncio.run, aio.data_update(self.path, auto_update_rules=True, verbose=0))
+            self.assertTrue(self.fetched == [], "data_update fetched a tarball for a path owned by another user : %s" % self.fetched)
+
+    def test_aio_lock_wait(self):
+        '''Test that casaconfig.aio waits for a lock held by another update without a thread and stops waiting when cancelled'''
+        import asyncio, threading
+        from casaconfig import aio, LockTimeout
+        from casaconfig.private.get_data_lock import get_data_lock, release_data_lock
+
+        lock_fd = get_data_lock(self.path, 'test_aio_lock_wait')
+        before = set(threading.enumerate())
+        try:
+            async def cancelled():
+                task = asyncio.ensure_future(aio.data_update(self.path, lock_timeout=60, verbose=0))
+                await asyncio.sleep(1.)
+                waiting = [t.name for t in threading.enumerate() if t not in before]
+                started = time.monotonic()
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    return (waiting, time.monotonic() - started)
+                return (waiting, None)
+            (waiting, elapsed) = asyncio.run(cancelled())
+            self.assertTrue(waiting == [], "threads were used to wait for the lock : %s" % waiting)
+            self.assertTrue(elapsed is not None and elapsed < 1., "the wait for the lock was not cancelled at once")
+
+            with self.assertRaises(LockTimeout):
+                asyncio.run(aio.data_update(self.path, lock_timeout=0.5, verbose=0))
+        finally:
+            release_data_lock(lock_fd)
+
+        # nothing is waited for when the update would not take the lock
+        self.age(0.5)
+        lock_fd = get_data_lock(self.path, 'test_aio_lock_wait')
+        try:
+            started = time.monotonic()
+            asyncio.run(aio.data_update(self.path, lock_timeout=60, verbose=0))
+            self.assertTrue(time.monotonic() - started < 5., "an update that installs nothing waited for the lock")
+        finally:
+            release_data_lock(lock_fd)
+
+    def test_aio_update_all(self):
+        '''Test that casaconfig.aio.update_all does not prefetch again in update_all'''
+        import asyncio
+        from casaconfig import aio
+
+        # the measures can not be updated without the Observatories table, only the casarundata is fetched
+        # once by the aio prefetch and then once more by data_update (both fail)
+        self.measures('WSRT_Measures_20241201-160001.ztar')
+        with self.assertRaises(RuntimeError):
+            self.fetches(asyncio.run, aio.update_all(self.path, verbose=0))
+        self.assertTrue(self.fetched == ['casarundata-1.2.4.tar.gz']*2, "unexpected fetches : %s" % self.fetched)
+
+if __name__ == '__main__':
+
+    unittest.main()